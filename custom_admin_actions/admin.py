@@ -1,10 +1,18 @@
 """
 Abstract ModelAdmin class that extends admin pages with a line of extra actions
-provided by derived classes
+provided by derived classes. Actions listed in `background_actions` run as jobs
+(see jobs.py) and the change page shows their progress
 """
+
 import abc
-from django.contrib import admin
+from typing import Sequence
+from django.contrib import admin, messages
 from django.contrib.admin.models import LogEntry, ContentType, CHANGE
+from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.urls import path, reverse
+from . import jobs
 
 
 class CustomActionsModelAdmin(admin.ModelAdmin):
@@ -14,6 +22,9 @@ class CustomActionsModelAdmin(admin.ModelAdmin):
 
     SUBMIT_ACTION_PREFIX = "custom_admin_action_"
     change_form_template = "custom_admin_actions/custom_change_form.html"
+    # codes of the actions that are queued and run by `./manage.py run_admin_jobs`
+    # with run_custom_action, instead of custom_action_called in the request
+    background_actions: Sequence[str] = ()
 
     @abc.abstractmethod
     def get_custom_admin_actions(  # pylint: disable=too-many-arguments
@@ -33,6 +44,56 @@ class CustomActionsModelAdmin(admin.ModelAdmin):
         You can return None to proceed with the default action (go to the list page) or return an
         HttpResponse"""
 
+    def run_custom_action(self, job, obj, report):
+        """Runs one of the `background_actions` (`job.action`, queued by
+        `job.owner`) in a worker. `report(percent, message=None)` updates the
+        progress shown in the change page (and tells the job is alive: report at
+        least every CUSTOM_ADMIN_JOBS_TIMEOUT seconds). Returns a message for
+        the result, an exception marks the job as failed"""
+        raise NotImplementedError(f"No background action {job.action}")
+
+    def _jobs_url(self, obj):
+        opts = self.model._meta
+        return reverse(
+            f"admin:{opts.app_label}_{opts.model_name}_custom_admin_jobs",
+            args=(obj.pk,),
+            current_app=self.admin_site.name,
+        )
+
+    def jobs_view(self, request, object_id):
+        """JSON with the latest jobs of the object, polled by the change page"""
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied()
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            raise Http404()
+        return JsonResponse(
+            {
+                "jobs": [
+                    {
+                        "id": job.pk,
+                        "action": job.action,
+                        "status": job.status,
+                        "progress": job.progress,
+                        "message": job.message,
+                        "date_created": job.date_created.isoformat(),
+                    }
+                    for job in jobs.jobs_for(obj)
+                ]
+            }
+        )
+
+    # overrides
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                "<path:object_id>/custom_admin_jobs/",
+                self.admin_site.admin_view(self.jobs_view),
+                name=f"{opts.app_label}_{opts.model_name}_custom_admin_jobs",
+            ),
+        ] + super().get_urls()
+
     # overrides
     def render_change_form(  # pylint: disable=too-many-arguments
         self,
@@ -52,6 +113,13 @@ class CustomActionsModelAdmin(admin.ModelAdmin):
                 "custom_admin_actions_prefix": CustomActionsModelAdmin.SUBMIT_ACTION_PREFIX,
             }
         )
+        if obj is not None and self.background_actions:
+            context.update(
+                {
+                    "custom_admin_jobs": jobs.jobs_for(obj),
+                    "custom_admin_jobs_url": self._jobs_url(obj),
+                }
+            )
         return super().render_change_form(
             request,
             context,
@@ -75,6 +143,10 @@ class CustomActionsModelAdmin(admin.ModelAdmin):
                     action_flag=CHANGE,
                     change_message=action,
                 )
+                if action in self.background_actions:
+                    jobs.enqueue(obj, action, request.user)
+                    self.message_user(request, f"{action} queued", level=messages.INFO)
+                    return HttpResponseRedirect(request.path)
                 response = self.custom_action_called(request, action, obj)
                 if response:
                     return response
@@ -82,3 +154,4 @@ class CustomActionsModelAdmin(admin.ModelAdmin):
 
     class Media:
         css = {"all": ("custom_admin_actions/css/custom_admin_actions.css",)}
+        js = ("custom_admin_actions/js/custom_admin_jobs.js",)
@@ -0,0 +1,148 @@
+"""
+Background execution of custom admin actions.
+
+`CustomActionsModelAdmin.background_actions` are not run in the admin request:
+the request queues an AdminActionJob and returns, and a worker (`./manage.py
+run_admin_jobs`) runs it with the ModelAdmin's `run_custom_action`, which can
+report its progress. The change page shows the jobs of the object while they
+run.
+
+Jobs are claimed with a conditional update (queued -> running), so any number
+of workers can share the table. A running job whose worker hasn't reported for
+CUSTOM_ADMIN_JOBS_TIMEOUT seconds (killed by a deploy, out of memory...) is
+queued again, or failed after CUSTOM_ADMIN_JOBS_ATTEMPTS attempts: actions that
+take longer have to report their progress more often.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AdminActionJob, JobStatuses
+
+logger = logging.getLogger(__name__)
+
+# jobs looked at per claim attempt, in case other workers take some
+_CANDIDATES = 10
+
+Report = Callable[[int, Optional[str]], None]
+
+
+def enqueue(obj, action: str, user=None) -> AdminActionJob:
+    """Queues the action on the object"""
+    return AdminActionJob.objects.create(
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=str(obj.pk),
+        action=action,
+        owner=user,
+    )
+
+
+def jobs_for(obj, limit: int = 10):
+    """Latest jobs of the object"""
+    return AdminActionJob.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj), object_id=str(obj.pk)
+    ).order_by("-date_created")[:limit]
+
+
+def reclaim() -> int:
+    """Queues again the running jobs whose worker stopped reporting, or fails
+    them if they ran out of attempts. Returns how many there were"""
+    now = timezone.now()
+    abandoned = AdminActionJob.objects.filter(
+        status=JobStatuses.RUNNING,
+        date_heartbeat__lt=now
+        - timedelta(seconds=getattr(settings, "CUSTOM_ADMIN_JOBS_TIMEOUT", 600)),
+    )
+    count = abandoned.filter(
+        attempts__lt=getattr(settings, "CUSTOM_ADMIN_JOBS_ATTEMPTS", 2)
+    ).update(
+        status=JobStatuses.QUEUED,
+        progress=0,
+        message="",
+        date_started=None,
+        date_heartbeat=None,
+    )
+    count += abandoned.update(
+        status=JobStatuses.FAILED,
+        message="The worker running it stopped",
+        date_finished=now,
+    )
+    if count:
+        logger.warning("Reclaimed %s abandoned admin jobs", count)
+    return count
+
+
+def claim() -> Optional[AdminActionJob]:
+    """Oldest queued job, marked as running. None if there are none"""
+    reclaim()
+    queued = AdminActionJob.objects.filter(status=JobStatuses.QUEUED)
+    for job in queued.order_by("date_created", "id")[:_CANDIDATES]:
+        now = timezone.now()
+        if queued.filter(pk=job.pk).update(
+            status=JobStatuses.RUNNING,
+            date_started=now,
+            date_heartbeat=now,
+            attempts=F("attempts") + 1,
+        ):
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def _current(job: AdminActionJob):
+    """The job, unless it was reclaimed since this worker claimed it"""
+    return AdminActionJob.objects.filter(
+        pk=job.pk, status=JobStatuses.RUNNING, attempts=job.attempts
+    )
+
+
+def _reporter(job: AdminActionJob) -> Report:
+    def report(progress: int, message: Optional[str] = None):
+        job.progress = max(0, min(100, progress))
+        fields = {"progress": job.progress, "date_heartbeat": timezone.now()}
+        if message is not None:
+            job.message = fields["message"] = message
+        _current(job).update(**fields)
+
+    return report
+
+
+def run(job: AdminActionJob, site=admin.site):
+    """Runs a claimed job with the ModelAdmin registered for its model"""
+    try:
+        model = job.content_type.model_class()
+        model_admin = site._registry[model]  # pylint: disable=protected-access
+        obj = model._default_manager.get(pk=job.object_id)
+        message = model_admin.run_custom_action(job, obj, _reporter(job))
+        job.status, job.progress = JobStatuses.DONE, 100
+        job.message = message or ""
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Admin job %s failed", job.pk)
+        job.status, job.message = JobStatuses.FAILED, str(exc) or type(exc).__name__
+    job.date_finished = timezone.now()
+    _current(job).update(
+        status=job.status,
+        progress=job.progress,
+        message=job.message,
+        date_finished=job.date_finished,
+    )
+
+
+def run_pending(limit: Optional[int] = None, site=admin.site) -> int:
+    """Runs queued jobs until there are none left (or `limit` ran), returns how
+    many ran"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim()
+        if job is None:
+            break
+        run(job, site)
+        count += 1
+    return count
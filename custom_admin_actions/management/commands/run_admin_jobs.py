@@ -0,0 +1,35 @@
+"""
+Runs the custom admin actions queued as background jobs
+(custom_admin_actions/jobs.py). Keeps waiting for new ones unless `--once` is
+given, so it can run as a long-lived worker next to the web processes.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from custom_admin_actions import jobs
+
+# pylint: disable=missing-class-docstring
+
+
+class Command(BaseCommand):
+    help = "Runs queued custom admin actions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when the queue is empty"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = jobs.run_pending()
+            if count:
+                self.stdout.write(f"Ran {count} jobs")
+            if options["once"]:
+                return
+            time.sleep(options["sleep"])
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.6 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_admin_actions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="adminactionjob",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="adminactionjob",
+            name="date_heartbeat",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+"""
+Custom actions that run in the background, outside of the admin request
+"""
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class JobStatuses(models.TextChoices):
+    """Lifecycle status"""
+
+    QUEUED = "queued", "Queued"
+    RUNNING = "running", "Running"
+    DONE = "done", "Done"
+    FAILED = "failed", "Failed"
+
+
+class AdminActionJob(models.Model):
+    """A custom action on an object, queued by the admin and run by
+    `./manage.py run_admin_jobs` (custom_admin_actions/jobs.py)"""
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=255)
+    action = models.CharField(max_length=100)
+    owner = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True
+    )
+    status = models.CharField(
+        max_length=10, choices=JobStatuses.choices, default=JobStatuses.QUEUED
+    )
+    # percentage, reported by the action while it runs
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.TextField(blank=True, default="")
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(null=True)
+    date_finished = models.DateTimeField(null=True)
+    # when the worker running it last reported (jobs.reclaim)
+    date_heartbeat = models.DateTimeField(null=True)
+    # times a worker claimed it
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "date_created"], name="custom_admin_job_queue"
+            ),
+            models.Index(
+                fields=["content_type", "object_id"], name="custom_admin_job_object"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Job:{self.action}({self.object_id} {self.status})"
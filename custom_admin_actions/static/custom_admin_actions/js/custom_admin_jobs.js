@@ -0,0 +1,51 @@
+/*
+ * Refreshes the table of background actions of a change page while some of
+ * them are queued or running (CustomActionsModelAdmin.jobs_view)
+ */
+"use strict";
+{
+    const POLL_MS = 2000;
+    const UNFINISHED = ["queued", "running"];
+
+    function row(job) {
+        const tr = document.createElement("tr");
+        tr.dataset.status = job.status;
+        const progress = document.createElement("progress");
+        progress.max = 100;
+        progress.value = job.progress;
+        for (const value of [job.action, job.status, progress, job.message, job.date_created]) {
+            const td = document.createElement("td");
+            td.append(value);
+            tr.append(td);
+        }
+        return tr;
+    }
+
+    function unfinished(table) {
+        return [...table.tBodies[0].rows].some(
+            (tr) => UNFINISHED.includes(tr.dataset.status)
+        );
+    }
+
+    async function poll(table) {
+        const response = await fetch(table.dataset.jobsUrl, {
+            credentials: "same-origin",
+            headers: {Accept: "application/json"},
+        });
+        if (response.ok) {
+            const data = await response.json();
+            table.tBodies[0].replaceChildren(...data.jobs.map(row));
+        }
+        if (unfinished(table)) {
+            setTimeout(poll, POLL_MS, table);
+        }
+    }
+
+    window.addEventListener("load", () => {
+        for (const table of document.querySelectorAll("table[data-jobs-url]")) {
+            if (unfinished(table)) {
+                setTimeout(poll, POLL_MS, table);
+            }
+        }
+    });
+}
@@ -22,4 +22,7 @@ def custom_submit_line(context):
     }
     if context["original"]:
         ctx["original"] = context["original"]
+    if "custom_admin_jobs_url" in context:
+        ctx["custom_admin_jobs"] = context["custom_admin_jobs"]
+        ctx["custom_admin_jobs_url"] = context["custom_admin_jobs_url"]
     return ctx
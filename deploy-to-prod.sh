@@ -11,3 +11,4 @@ echo "Make sure all static data is deployed"
 
 echo "Make sure the database is populated"
 ./manage.py migrate
+./manage.py createcachetable
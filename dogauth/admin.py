@@ -4,6 +4,21 @@ Admin views for authentication and authorization
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import ApiKey, User
 
 admin.site.register(User, UserAdmin)
+
+
+@admin.register(ApiKey)
+class ApiKeyAdmin(admin.ModelAdmin):
+    """Keys are created with `./manage.py create_api_key`, here they can be
+    inspected and revoked"""
+
+    list_display = ["prefix", "user", "name", "scopes", "revoked", "expires", "last_used"]
+    list_filter = ["revoked"]
+    list_select_related = ["user"]
+    search_fields = ["prefix", "name", "user__username"]
+    readonly_fields = ["user", "prefix", "last_used", "date_created"]
+
+    def has_add_permission(self, request):
+        return False
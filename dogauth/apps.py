@@ -4,3 +4,8 @@ from django.apps import AppConfig
 
 class DogauthConfig(AppConfig):
     name = "dogauth"
+
+    def ready(self):
+        # connects the signals that invalidate cached roles and revoke tokens
+        # pylint: disable=import-outside-toplevel, unused-import
+        from . import authentication, roles
@@ -0,0 +1,326 @@
+"""
+Django-rest-framework authentication classes used by the service
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from hmac import compare_digest
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError
+from django.db.models import Case, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.timezone import now
+from rest_framework import authentication, exceptions, permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .models import ApiKey, User
+from .roles import (
+    Roles,
+    cached_roles,
+    changed_since,
+    roles_for_user,
+    shared_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _LastUsedTracker:
+    """Collects the keys that have been used, with the time of their last use,
+    and writes their last_used in one UPDATE every few seconds instead of one
+    write per request. Pending keys are written at the end of a request once the
+    interval has passed, and when the process exits"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, datetime] = {}
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _interval() -> float:
+        return getattr(settings, "DOGAUTH_API_KEY_LAST_USED_INTERVAL", 60)
+
+    def touch(self, api_key: ApiKey):
+        """Marks the key as used now. May trigger a flush"""
+        with self._lock:
+            self._pending[api_key.pk] = now()
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """Writes whatever is pending if the interval has passed since the last write"""
+        with self._lock:
+            elapsed = time.monotonic() - self._last_flush
+            if not self._pending or elapsed < self._interval():
+                return
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        self._write(pending)
+
+    def flush(self):
+        """Writes whatever is pending"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        self._write(pending)
+
+    @staticmethod
+    def _write(pending: Dict[int, datetime]):
+        if pending:
+            ApiKey.objects.filter(pk__in=pending).update(
+                last_used=Case(
+                    *[When(pk=pk, then=Value(used)) for pk, used in pending.items()]
+                )
+            )
+
+
+last_used_tracker = _LastUsedTracker()
+
+
+@receiver(request_finished)
+def flush_last_used(sender, **kwargs):  # pylint: disable=unused-argument
+    """Bots that stop after a burst still get their last_used written"""
+    last_used_tracker.flush_if_due()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        last_used_tracker.flush()
+    except DatabaseError:
+        logger.warning("Could not write last_used of api keys", exc_info=True)
+
+
+class ApiKeyAuthentication(authentication.BaseAuthentication):
+    """
+    Authentication for bots using keys created with `./manage.py create_api_key`:
+
+        Authorization: Api-Key <key>
+
+    Scopes of the key are enforced by dogauth.permissions.DjangoModelPermissions
+    """
+
+    keyword = "Api-Key"
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                "Invalid Api-Key header. Expected 'Api-Key <key>'."
+            )
+
+        try:
+            key = auth[1].decode()
+        except UnicodeError as error:
+            raise exceptions.AuthenticationFailed(
+                "Invalid Api-Key header. Key contains invalid characters."
+            ) from error
+
+        return self.authenticate_credentials(key)
+
+    def authenticate_credentials(self, key: str):
+        """Finds the key by its prefix and checks the digest of the full key"""
+        prefix, _, _ = key.partition(".")
+        api_key = (
+            ApiKey.objects.select_related("user")
+            .filter(prefix=prefix[: ApiKey.PREFIX_LENGTH])
+            .first()
+        )
+        if api_key is None or not compare_digest(api_key.digest, ApiKey.hash(key)):
+            raise exceptions.AuthenticationFailed("Invalid api key.")
+
+        if not api_key.is_valid():
+            raise exceptions.AuthenticationFailed("Api key revoked or expired.")
+
+        if not api_key.user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+        last_used_tracker.touch(api_key)
+        return (api_key.user, api_key)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+# ---- JWT without database lookups
+
+
+class RolesTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Adds the staff flags, group names and permissions of the user as claims of
+    the tokens, so that clients (and SnapshotUser) don't need to look them up"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        roles = roles_for_user(user)
+        token["username"] = user.username
+        token["is_staff"] = roles.is_staff
+        token["is_superuser"] = roles.is_superuser
+        token["roles"] = sorted(roles.groups)
+        # superusers have them all anyway
+        token["permissions"] = [] if roles.is_superuser else sorted(roles.permissions)
+        return token
+
+
+_ROLES_CLAIMS = ["iat", "is_staff", "is_superuser", "roles", "permissions"]
+
+
+class SnapshotUser(TokenUser):
+    """
+    Lightweight user built from the claims of a token (the id) and a snapshot of
+    the user's roles taken from the cache, see dogauth.roles.
+    Like TokenUser it can't be saved nor assigned to foreign keys.
+    """
+
+    def __init__(self, token, snapshot: Roles):
+        super().__init__(token)
+        self.snapshot = snapshot
+
+    @cached_property
+    def is_staff(self) -> bool:
+        return self.snapshot.is_staff
+
+    @cached_property
+    def is_superuser(self) -> bool:
+        return self.snapshot.is_superuser
+
+    @property
+    def is_active(self) -> bool:
+        return self.snapshot.is_active
+
+    def has_perm(self, perm, obj=None) -> bool:
+        return self.snapshot.has_perm(perm)
+
+    def has_perms(self, perm_list, obj=None) -> bool:
+        return self.snapshot.has_perms(perm_list)
+
+
+def _revoked_key(user_id) -> str:
+    return f"dogauth-jwt-revoked:{user_id}"
+
+
+def is_revoked(user_id) -> bool:
+    """True if the user has been deactivated or deleted after its tokens were issued"""
+    cache = shared_cache()
+    return cache is not None and cache.get(_revoked_key(user_id)) is not None
+
+
+class SnapshotJWTAuthentication(JWTAuthentication):
+    """
+    Same as JWTAuthentication (Authorization: Bearer <token>) but, for read-only
+    requests, the user is not loaded from the database: a SnapshotUser is built
+    from the cached roles of the user or, if they are not cached, from the claims
+    of the token as long as the roles haven't changed since it was issued.
+
+    Requests that modify data get a real User instance, since it's usually stored
+    in foreign keys. Views that need one even for GET can set
+    `requires_db_user = True`.
+
+    Deactivated/deleted users are kept in a revocation list (in the cache, for as
+    long as a refresh token is valid) so that their tokens stop working at once.
+    This needs a cache shared by all workers (DOGAUTH_ROLES_CACHE_ALIAS): without
+    one the user is always loaded from the database.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as error:
+            raise exceptions.AuthenticationFailed(
+                "Token contained no recognizable user identification"
+            ) from error
+
+        if not self._allows_snapshot() or shared_cache() is None:
+            return super().get_user(validated_token)
+
+        if is_revoked(user_id):
+            raise exceptions.AuthenticationFailed(
+                "User is inactive", code="user_inactive"
+            )
+
+        snapshot = self._snapshot(user_id, validated_token)
+        if snapshot is None:
+            raise exceptions.AuthenticationFailed(
+                "User not found", code="user_not_found"
+            )
+        if not snapshot.is_active:
+            raise exceptions.AuthenticationFailed(
+                "User is inactive", code="user_inactive"
+            )
+        return SnapshotUser(validated_token, snapshot)
+
+    def authenticate(self, request):
+        self._request = request  # pylint: disable=attribute-defined-outside-init
+        return super().authenticate(request)
+
+    def _allows_snapshot(self) -> bool:
+        request = getattr(self, "_request", None)
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return False
+        view = (getattr(request, "parser_context", None) or {}).get("view")
+        return not getattr(view, "requires_db_user", False)
+
+    @staticmethod
+    def _from_claims(user_id, token) -> Optional[Roles]:
+        """Roles from the token (RolesTokenObtainPairSerializer), unless they could
+        be stale. Tokens of inactive users are never issued, and the user would be
+        in the revocation list if they were deactivated later"""
+        if any(claim not in token for claim in _ROLES_CLAIMS):
+            return None
+        if changed_since(user_id, token["iat"]):
+            return None
+        return Roles(
+            user_id=user_id,
+            is_active=True,
+            is_staff=token["is_staff"],
+            is_superuser=token["is_superuser"],
+            groups=frozenset(token["roles"]),
+            permissions=frozenset(token["permissions"]),
+        )
+
+    def _snapshot(self, user_id, token) -> Optional[Roles]:
+        roles = cached_roles(user_id) or self._from_claims(user_id, token)
+        if roles is None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+            roles = roles_for_user(user)
+        return roles
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    """Keeps deactivated users in the revocation list"""
+    if instance.is_active:
+        cache = shared_cache()
+        if cache is not None:
+            cache.delete(_revoked_key(instance.pk))
+    else:
+        revoke(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    """Deleted users can't use their tokens either"""
+    revoke(instance.pk)
+
+
+def revoke(user_id):
+    """Rejects all tokens of the user"""
+    cache = shared_cache()
+    if cache is not None:
+        lifetime = jwt_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        cache.set(_revoked_key(user_id), time.time(), int(lifetime))
@@ -0,0 +1,48 @@
+"""
+Creates an api key for a (bot) user. The key is printed once and can't be
+recovered afterwards, only revoked.
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+from dogauth.models import ApiKey, ApiKeyScopes, User
+
+# pylint: disable=missing-class-docstring
+
+
+class Command(BaseCommand):
+    help = "Creates an api key for a user, to be sent as 'Authorization: Api-Key <key>'"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", type=str)
+        parser.add_argument("--name", type=str, default="")
+        parser.add_argument(
+            "--scopes",
+            nargs="+",
+            choices=ApiKeyScopes.values,
+            default=ApiKeyScopes.values,
+        )
+        parser.add_argument(
+            "--expires-days",
+            type=int,
+            default=None,
+            help="Days until the key expires (default: never)",
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if not user:
+            raise CommandError(f"{options['username']} does not exist")
+
+        expires = None
+        if options["expires_days"]:
+            expires = now() + timedelta(days=options["expires_days"])
+
+        api_key, key = ApiKey.create_key(
+            user,
+            name=options["name"],
+            scopes=" ".join(options["scopes"]),
+            expires=expires,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {api_key}"))
+        self.stdout.write(key)
@@ -1,10 +1,78 @@
 """
 globally needed models
 """
+import secrets
+from hashlib import sha256
+from typing import List, Tuple
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.db import models
+from django.utils.timezone import now
 
 
 class User(AbstractUser):
     """We reuse the standard user model in Django as recommended
     see AUTH_USER_MODEL in settings.py that *must* point to this
     """
+
+
+class ApiKeyScopes(models.TextChoices):
+    """What a request authenticated with an api key is allowed to do, on top of the
+    model permissions of the key's user"""
+
+    READ = "read", "Read only (GET, HEAD, OPTIONS)"
+    WRITE = "write", "Create, modify and delete"
+
+
+class ApiKey(models.Model):
+    """
+    Long lived credential for bots. Unlike passwords the keys are random with plenty
+    of entropy, so a single sha256 is enough to store them and checking one is
+    cheap (unlike the PBKDF2 of BasicAuthentication).
+
+    The key given to the client is `<prefix>.<secret>`: the prefix is stored in clear
+    to find the row, the digest is of the full key.
+    """
+
+    PREFIX_LENGTH = 8
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="api_keys"
+    )
+    name = models.CharField(max_length=50, blank=True, default="")
+    prefix = models.CharField(max_length=PREFIX_LENGTH, unique=True, editable=False)
+    digest = models.CharField(max_length=64, editable=False)
+    # space separated list of ApiKeyScopes
+    scopes = models.CharField(max_length=100, default="read write")
+    revoked = models.BooleanField(default=False)
+    expires = models.DateTimeField(null=True, blank=True)
+    last_used = models.DateTimeField(null=True, blank=True, editable=False)
+    date_created = models.DateTimeField(auto_now_add=True, editable=False)
+
+    @staticmethod
+    def hash(key: str) -> str:
+        """Digest stored for a key"""
+        return sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def create_key(cls, user, name: str = "", **kwargs) -> Tuple["ApiKey", str]:
+        """Creates a new key for the user. Returns the model and the key itself,
+        which is not stored anywhere and can't be recovered later"""
+        prefix = secrets.token_hex(cls.PREFIX_LENGTH // 2)
+        key = f"{prefix}.{secrets.token_urlsafe(32)}"
+        api_key = cls.objects.create(
+            user=user, name=name, prefix=prefix, digest=cls.hash(key), **kwargs
+        )
+        return api_key, key
+
+    @property
+    def scope_list(self) -> List[str]:
+        """Scopes as a list"""
+        return self.scopes.split()
+
+    def is_valid(self) -> bool:
+        """Not revoked nor expired"""
+        return not self.revoked and (self.expires is None or self.expires > now())
+
+    def __str__(self):
+        return f"{self.prefix}… ({self.user}:{self.name})"
@@ -3,21 +3,36 @@ Common django-rest-framework permissions used throughout the service
 """
 from rest_framework import permissions
 from rest_framework.request import Request
+from .models import ApiKey, ApiKeyScopes
+from .roles import roles_for
 
 
 def is_moderator(request: Request):
     """Returns true if the request user is a moderator"""
-    if request.user.groups.filter(name="Moderators").exists():
-        return True
-    return False
+    return roles_for(request).is_moderator
 
 
 def is_moderator_or_staff(request: Request):
     """Returns true if the request user is staff or a moderator"""
-    if request.user.is_staff:
-        return True
+    return roles_for(request).is_moderator_or_staff
+
 
-    return is_moderator(request)
+def has_perm(request: Request, perm: str):
+    """Returns true if the request user has the given model permission"""
+    return roles_for(request).has_perm(perm)
+
+
+def api_key_allows(request: Request):
+    """Returns false if the request was authenticated with an api key whose
+    scopes don't cover the request method"""
+    api_key = getattr(request, "auth", None)
+    if not isinstance(api_key, ApiKey):
+        return True
+    if request.method in permissions.SAFE_METHODS:
+        return bool(
+            {ApiKeyScopes.READ, ApiKeyScopes.WRITE}.intersection(api_key.scope_list)
+        )
+    return ApiKeyScopes.WRITE in api_key.scope_list
 
 
 class IsAuthenticated(permissions.BasePermission):
@@ -29,6 +44,30 @@ class IsAuthenticated(permissions.BasePermission):
         return request.user.is_authenticated
 
 
+class DjangoModelPermissions(permissions.DjangoModelPermissions):
+    """
+    Requires the model permission matching the operation (view/add/change/delete)
+    and, for api keys, a scope that allows it
+    """
+
+    def has_permission(self, request, view):
+        if getattr(view, "_ignore_model_permissions", False):
+            return True
+
+        if not request.user or (
+            not request.user.is_authenticated and self.authenticated_users_only
+        ):
+            return False
+
+        if not api_key_allows(request):
+            return False
+
+        queryset = self._queryset(view)
+        perms = self.get_required_permissions(request.method, queryset.model)
+
+        return roles_for(request).has_perms(perms)
+
+
 class IsModeratorOrStaff(permissions.BasePermission):
     """
     Blocks update/partial_updated/destroy if:
@@ -52,7 +91,7 @@ class IsOwnerOrStaff(permissions.BasePermission):
     """
 
     def has_object_permission(self, request: Request, view, obj):
-        if request.user.is_staff:
+        if roles_for(request).is_staff:
             return True
         if view.action in ["update", "partial_update", "destroy"]:
             return hasattr(obj, "owner") and obj.owner == request.user
@@ -0,0 +1,244 @@
+"""
+Resolved roles: groups and permissions of a user, computed once per request and
+cached across requests.
+
+Checking if a user is a moderator, or if it has a model permission, hits the
+database every time (the group membership query, or the two permission queries
+of ModelBackend). This module resolves everything at once into a `Roles` object,
+memoizes it on the request and, if DOGAUTH_ROLES_CACHE_ALIAS names a cache
+shared by all the workers (memcached, redis, file based...), keeps it there per
+user across requests.
+
+Cached entries are invalidated via signals when users, their groups or the
+permissions of a group change. A per-process cache (LocMemCache) would only be
+invalidated in the worker that made the change, so without a shared cache the
+roles are only memoized per request.
+"""
+
+import time
+from typing import FrozenSet, Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.core.checks import Tags, Warning as CheckWarning, register
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+MODERATORS_GROUP = "Moderators"
+
+_REQUEST_ATTRIBUTE = "_dogauth_roles"
+_GENERATION_KEY = "dogauth-roles-generation"
+_CHANGED_ALL_KEY = "dogauth-roles-changed"
+
+
+class Roles(NamedTuple):
+    """What a user is allowed to do, resolved once"""
+
+    user_id: Optional[int]
+    is_active: bool
+    is_staff: bool
+    is_superuser: bool
+    groups: FrozenSet[str]
+    permissions: FrozenSet[str]
+
+    @property
+    def is_moderator(self) -> bool:
+        """True if the user is in the 'Moderators' group"""
+        return MODERATORS_GROUP in self.groups
+
+    @property
+    def is_moderator_or_staff(self) -> bool:
+        """True if the user is staff or in the 'Moderators' group"""
+        return self.is_staff or self.is_moderator
+
+    def has_perm(self, perm: str) -> bool:
+        """Same semantics as User.has_perm with the default ModelBackend"""
+        if not self.is_active:
+            return False
+        if self.is_superuser:
+            return True
+        return perm in self.permissions
+
+    def has_perms(self, perms: Iterable[str]) -> bool:
+        """Same semantics as User.has_perms with the default ModelBackend"""
+        return all(self.has_perm(perm) for perm in perms)
+
+
+ANONYMOUS = Roles(None, False, False, False, frozenset(), frozenset())
+
+
+def shared_cache():
+    """The cache shared by all workers (DOGAUTH_ROLES_CACHE_ALIAS), None if there
+    isn't one configured"""
+    alias = getattr(settings, "DOGAUTH_ROLES_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def _key(cache, user_id) -> str:
+    generation = cache.get_or_set(_GENERATION_KEY, 1, None)
+    return f"dogauth-roles:{generation}:{user_id}"
+
+
+def _resolve(user) -> Roles:
+    # ModelBackend memoizes permissions on the instance, which may predate the change
+    # that invalidated our cached entry
+    for attribute in ["_perm_cache", "_user_perm_cache", "_group_perm_cache"]:
+        user.__dict__.pop(attribute, None)
+    return Roles(
+        user_id=user.pk,
+        is_active=user.is_active,
+        is_staff=user.is_staff,
+        is_superuser=user.is_superuser,
+        groups=frozenset(user.groups.values_list("name", flat=True)),
+        permissions=frozenset(user.get_all_permissions()),
+    )
+
+
+def cached_roles(user_id) -> Optional[Roles]:
+    """Returns the roles of a user if they are in the cache, None if not"""
+    cache = shared_cache()
+    if cache is None:
+        return None
+    return cache.get(_key(cache, user_id))
+
+
+def changed_since(user_id, timestamp: float) -> bool:
+    """True if the roles of the user may have changed after `timestamp` (always
+    True when there is no shared cache to tell)"""
+    cache = shared_cache()
+    if cache is None:
+        return True
+    changed = cache.get_many([_changed_key(user_id), _CHANGED_ALL_KEY])
+    return any(value >= timestamp for value in changed.values())
+
+
+def _changed_key(user_id) -> str:
+    return f"dogauth-roles-changed:{user_id}"
+
+
+def roles_for_user(user) -> Roles:
+    """Returns the roles of a user, from the shared cache if they were resolved
+    before"""
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    snapshot = getattr(user, "snapshot", None)
+    if isinstance(snapshot, Roles):
+        # lightweight users from tokens already carry them
+        return snapshot
+    cache = shared_cache()
+    if cache is None:
+        return _resolve(user)
+    key = _key(cache, user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = _resolve(user)
+        cache.set(key, roles, getattr(settings, "DOGAUTH_ROLES_CACHE_TIMEOUT", 5 * 60))
+    return roles
+
+
+def roles_for(request) -> Roles:
+    """Returns the roles of the user of the request, resolved at most once per request.
+    Works with both django HttpRequest and rest framework Request"""
+    # rest framework requests wrap the django one, we store it in the inner one
+    # so that middleware, views and serializers share it
+    target = getattr(request, "_request", request)
+    user = request.user
+    roles = getattr(target, _REQUEST_ATTRIBUTE, None)
+    if roles is None or roles.user_id != getattr(user, "pk", None):
+        roles = roles_for_user(user)
+        setattr(target, _REQUEST_ATTRIBUTE, roles)
+    return roles
+
+
+def invalidate_user(user_id):
+    """Forget the cached roles of a user"""
+    cache = shared_cache()
+    if cache is not None:
+        cache.delete(_key(cache, user_id))
+        cache.set(_changed_key(user_id), time.time(), None)
+
+
+def invalidate_all():
+    """Forget the cached roles of every user, eg when a group changes permissions"""
+    cache = shared_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.set(_GENERATION_KEY, 1, None)
+    cache.set(_CHANGED_ALL_KEY, time.time(), None)
+
+
+_PER_PROCESS_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):  # pylint: disable=unused-argument
+    """The roles cache must be shared by all workers, or revoked roles would still
+    be used by the ones that didn't see the change"""
+    alias = getattr(settings, "DOGAUTH_ROLES_CACHE_ALIAS", None)
+    if not alias:
+        return []
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend in _PER_PROCESS_BACKENDS:
+        return [
+            CheckWarning(
+                f"DOGAUTH_ROLES_CACHE_ALIAS '{alias}' is a per-process cache",
+                hint="Use a cache shared by all workers, or set it to None",
+                id="dogauth.W001",
+            )
+        ]
+    return []
+
+
+# ---- Signal handlers that invalidate cached roles
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    """is_staff/is_superuser/is_active may have changed (or the id was reused)"""
+    invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+@receiver(m2m_changed, sender=get_user_model().user_permissions.through)
+def user_membership_changed(
+    sender, instance=None, action="", reverse=False, model=None, pk_set=None, **kwargs
+):  # pylint: disable=unused-argument, too-many-arguments
+    """A user was added to/removed from a group, or given/removed a permission.
+    It can come from either side of the relation: user.groups.add(group) or
+    group.user_set.add(user)"""
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_user(instance.pk)
+    elif pk_set is not None and action != "post_clear":
+        for user_id in pk_set:
+            invalidate_user(user_id)
+    else:
+        # group.user_set.clear(): we don't know who was there
+        invalidate_all()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(
+    sender, action="", **kwargs
+):  # pylint: disable=unused-argument
+    """Permissions of a group changed, they affect all its users"""
+    if action.startswith("post_"):
+        invalidate_all()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_changed(sender, **kwargs):  # pylint: disable=unused-argument
+    """A group was renamed or deleted, or a permission disappeared"""
+    invalidate_all()
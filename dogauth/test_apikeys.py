@@ -0,0 +1,100 @@
+""" Test cases for api key authentication """
+from datetime import timedelta
+from test.common import rw_for
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APITestCase
+from news.models import Submission
+from .authentication import last_used_tracker
+from .models import ApiKey
+
+# pylint: disable=missing-function-docstring
+
+
+class ApiKeyAPITests(APITestCase):
+    """
+    Bots authenticating with Authorization: Api-Key <key>
+    """
+
+    def setUp(self):
+        self.bot = rw_for([Submission], "bot")
+
+    def with_key(self, key):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Api-Key {key}")
+
+    def test_key_is_not_stored(self):
+        api_key, key = ApiKey.create_key(self.bot, "fetcher")
+        self.assertTrue(key.startswith(api_key.prefix + "."))
+        self.assertNotIn(key, [api_key.digest, api_key.prefix])
+        self.assertEqual(api_key.digest, ApiKey.hash(key))
+
+    def test_valid_key_authenticates(self):
+        _, key = ApiKey.create_key(self.bot)
+        self.with_key(key)
+        response = self.client.post(
+            "/submissions", {"target_url": "https://example.com/1"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(Submission.objects.get().owner, self.bot)
+
+    def test_invalid_keys_are_rejected(self):
+        api_key, key = ApiKey.create_key(self.bot)
+        for wrong in [key + "x", api_key.prefix + ".nope", "nope", "a b"]:
+            self.with_key(wrong)
+            response = self.client.get("/submissions")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_and_expired_keys_are_rejected(self):
+        revoked, revoked_key = ApiKey.create_key(self.bot, revoked=True)
+        _, expired_key = ApiKey.create_key(self.bot, expires=now() - timedelta(days=1))
+        for key in [revoked_key, expired_key]:
+            self.with_key(key)
+            response = self.client.get("/submissions")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        revoked.revoked = False
+        revoked.save()
+        self.with_key(revoked_key)
+        self.assertEqual(self.client.get("/submissions").status_code, 200)
+
+    def test_read_scope_cant_write(self):
+        _, key = ApiKey.create_key(self.bot, scopes="read")
+        self.with_key(key)
+        response = self.client.get("/submissions")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(
+            "/submissions", {"target_url": "https://example.com/1"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_last_used_is_written_in_batches(self):
+        api_key, key = ApiKey.create_key(self.bot)
+        last_used_tracker.flush()
+        self.with_key(key)
+        with self.settings(DOGAUTH_API_KEY_LAST_USED_INTERVAL=3600):
+            for _ in range(3):
+                self.client.get("/submissions")
+            api_key.refresh_from_db()
+            self.assertIsNone(api_key.last_used)
+            last_used_tracker.flush()
+        api_key.refresh_from_db()
+        self.assertIsNotNone(api_key.last_used)
+
+    def test_last_used_is_written_after_a_burst(self):
+        api_key, key = ApiKey.create_key(self.bot)
+        last_used_tracker.flush()
+        self.with_key(key)
+        with self.settings(DOGAUTH_API_KEY_LAST_USED_INTERVAL=3600):
+            self.client.get("/submissions")
+            before = now()
+            self.client.get("/submissions")
+        api_key.refresh_from_db()
+        self.assertIsNone(api_key.last_used)
+        # the bot stops, the next request that finishes after the interval (from
+        # anyone) writes it, with the time it was last used
+        self.client.credentials()
+        with self.settings(DOGAUTH_API_KEY_LAST_USED_INTERVAL=0):
+            self.client.get("/articles")
+        api_key.refresh_from_db()
+        self.assertIsNotNone(api_key.last_used)
+        self.assertGreaterEqual(api_key.last_used, before)
+        self.assertLess(api_key.last_used - before, timedelta(seconds=1))
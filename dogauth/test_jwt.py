@@ -0,0 +1,110 @@
+""" Test cases for JWT authentication without database lookups """
+from unittest import mock
+from test.common import rw_for
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from news.models import Submission
+from .authentication import RolesTokenObtainPairSerializer, SnapshotJWTAuthentication
+from .roles import MODERATORS_GROUP
+
+# pylint: disable=missing-function-docstring, protected-access
+
+
+class SnapshotJWTAPITests(APITestCase):
+    """
+    Authorization: Bearer <token>
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = rw_for([Submission], "jwt")
+        Submission.objects.create(target_url="https://example.com/1", owner=self.user)
+
+    def with_token(self, user):
+        token = RolesTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return token
+
+    def test_token_has_role_claims(self):
+        token = self.with_token(self.user)
+        self.assertEqual(token["roles"], ["rw-jwtuser"])
+        self.assertFalse(token["is_staff"])
+        self.assertIn("news.add_submission", token["permissions"])
+
+    def test_roles_from_claims_if_not_cached(self):
+        self.with_token(self.user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/submissions")
+        self.assertEqual(response.data["count"], 1)
+        tables = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn("dogauth_user", tables)
+        self.assertNotIn("auth_group", tables)
+
+    def test_claims_are_not_used_after_roles_change(self):
+        group, _ = Group.objects.get_or_create(name=MODERATORS_GROUP)
+        self.user.groups.add(group)
+        token = RolesTokenObtainPairSerializer.get_token(self.user).access_token
+        token["iat"] += 1  # issued after the change
+        from_claims = SnapshotJWTAuthentication._from_claims
+        self.assertTrue(from_claims(self.user.pk, token).is_moderator)
+        with mock.patch("dogauth.roles.time.time", return_value=token["iat"] + 5):
+            group.user_set.remove(self.user)
+        self.assertIsNone(from_claims(self.user.pk, token))
+
+    def test_reads_dont_load_the_user(self):
+        self.with_token(self.user)
+        response = self.client.get("/submissions")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data["count"], 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/submissions")
+        self.assertEqual(response.data["count"], 1)
+        tables = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn("dogauth_user", tables)
+        self.assertNotIn("auth_group", tables)
+
+    def test_writes_use_the_real_user(self):
+        self.with_token(self.user)
+        response = self.client.post(
+            "/submissions", {"target_url": "https://example.com/2"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(
+            Submission.objects.get(target_url="https://example.com/2").owner,
+            self.user,
+        )
+
+    def test_deactivated_users_are_revoked(self):
+        self.with_token(self.user)
+        self.assertEqual(self.client.get("/submissions").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        for _ in range(2):
+            response = self.client.get("/submissions")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get("/submissions").status_code, 200)
+
+    def test_deleted_users_are_revoked(self):
+        self.with_token(self.user)
+        self.user.delete()
+        response = self.client.get("/submissions")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_loads_the_user_without_shared_cache(self):
+        self.with_token(self.user)
+        with self.settings(DOGAUTH_ROLES_CACHE_ALIAS=None):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get("/submissions").status_code, 200)
+            tables = " ".join(query["sql"] for query in queries.captured_queries)
+            self.assertIn("dogauth_user", tables)
+            self.user.is_active = False
+            self.user.save()
+            response = self.client.get("/submissions")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
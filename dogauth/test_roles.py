@@ -0,0 +1,109 @@
+""" Test cases for the cached roles of users """
+from test.common import rw_for
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APITestCase
+from news.models import Submission, Vote
+from .roles import ANONYMOUS, MODERATORS_GROUP, check_shared_cache, roles_for
+
+# pylint: disable=missing-function-docstring
+
+
+class RolesTests(TestCase):
+    """
+    resolution, caching and invalidation of roles
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = rw_for([Submission], "roles")
+
+    def _request(self, user=None):
+        request = RequestFactory().get("/")
+        request.user = user or self.user
+        return request
+
+    def test_resolved_once_per_request_and_cached_across_requests(self):
+        request = self._request()
+        roles = roles_for(request)
+        self.assertTrue(roles.has_perm("news.add_submission"))
+        self.assertFalse(roles.has_perm("news.add_moderation"))
+        self.assertFalse(roles.is_moderator)
+        with self.assertNumQueries(0):
+            self.assertIs(roles_for(request), roles)
+            self.assertEqual(roles_for(self._request()), roles)
+
+    def test_anonymous_has_no_roles(self):
+        request = self._request()
+        request.user = type("Anon", (), {"is_authenticated": False, "pk": None})()
+        self.assertEqual(roles_for(request), ANONYMOUS)
+        self.assertFalse(roles_for(request).has_perm("news.view_submission"))
+
+    def test_group_membership_invalidates(self):
+        self.assertFalse(roles_for(self._request()).is_moderator)
+        group, _ = Group.objects.get_or_create(name=MODERATORS_GROUP)
+        self.user.groups.add(group)
+        self.assertTrue(roles_for(self._request()).is_moderator)
+        group.user_set.remove(self.user)
+        self.assertFalse(roles_for(self._request()).is_moderator)
+
+    def test_group_permissions_invalidate(self):
+        self.assertFalse(roles_for(self._request()).has_perm("news.add_moderation"))
+        group = self.user.groups.first()
+        group.permissions.add(Permission.objects.get(codename="add_moderation"))
+        self.assertTrue(roles_for(self._request()).has_perm("news.add_moderation"))
+
+    def test_user_changes_invalidate(self):
+        self.assertFalse(roles_for(self._request()).is_moderator_or_staff)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(roles_for(self._request()).is_moderator_or_staff)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(roles_for(self._request()).has_perm("news.add_submission"))
+
+    def test_not_cached_across_requests_without_shared_cache(self):
+        with self.settings(DOGAUTH_ROLES_CACHE_ALIAS=None):
+            request = self._request()
+            roles = roles_for(request)
+            with self.assertNumQueries(0):
+                self.assertIs(roles_for(request), roles)
+            # another worker would see the change at once
+            group, _ = Group.objects.get_or_create(name=MODERATORS_GROUP)
+            self.user.groups.add(group)
+            self.assertTrue(roles_for(self._request()).is_moderator)
+
+    def test_per_process_cache_warns(self):
+        with self.settings(DOGAUTH_ROLES_CACHE_ALIAS=None):
+            self.assertEqual(check_shared_cache(None), [])
+        self.assertEqual(check_shared_cache(None)[0].id, "dogauth.W001")
+
+
+class RolesAPITests(APITestCase):
+    """
+    permission checks don't scale with the number of serialized objects
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = rw_for([Submission, Vote], "voter")
+
+    def test_vote_list_checks_roles_once(self):
+        submission = Submission.objects.create(target_url="https://example.com/1")
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        url = f"/submissions/{submission.pk}/votes"
+        for value in [1, -1]:
+            self.client.post(url, {"value": value})
+
+        # the number of queries doesn't depend on the number of votes
+        for num in range(2, 10):
+            Vote.objects.create(
+                submission=submission,
+                owner=rw_for([Vote], f"voter{num}"),
+            )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data["count"], 9)
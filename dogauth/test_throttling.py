@@ -0,0 +1,106 @@
+""" Test cases for the shared GCRA throttling """
+import os
+import tempfile
+from unittest import mock
+from test.common import rw_for
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from news.models import Submission
+from .models import ApiKey
+from .throttling import (
+    AnonRateThrottle,
+    BotRateThrottle,
+    GCRAStore,
+    UserRateThrottle,
+    get_store,
+)
+
+# pylint: disable=missing-function-docstring
+
+RATES = {"anon": "2/min", "user": "3/min", "bot": "5/min"}
+
+
+@override_settings(
+    REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": RATES},
+)
+class ThrottlingTests(TestCase):
+    """
+    token bucket behaviour and scopes
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "throttle.sqlite3")
+        self.override = override_settings(DOGAUTH_THROTTLE_DATABASE=self.path)
+        self.override.enable()
+        self.now = 1000.0
+        self.user = rw_for([Submission], "throttled")
+
+    def tearDown(self):
+        self.override.disable()
+
+    def _request(self, user=None, auth=None):
+        request = APIRequestFactory().get("/")
+        request.user = user or AnonymousUser()
+        request.auth = auth
+        return request
+
+    def _allowed(self, throttle_class, request, times):
+        results = []
+        for _ in range(times):
+            throttle = throttle_class()
+            with mock.patch.object(throttle, "timer", lambda: self.now):
+                results.append(throttle.allow_request(request, None))
+        return results
+
+    def test_burst_then_refill(self):
+        request = self._request(self.user)
+        self.assertEqual(
+            self._allowed(UserRateThrottle, request, 4), [True, True, True, False]
+        )
+        throttle = UserRateThrottle()
+        with mock.patch.object(throttle, "timer", lambda: self.now):
+            self.assertFalse(throttle.allow_request(request, None))
+        self.assertAlmostEqual(throttle.wait(), 20)
+        # one request every 20 seconds
+        self.now += 20
+        self.assertEqual(self._allowed(UserRateThrottle, request, 2), [True, False])
+        self.now += 60
+        self.assertEqual(
+            self._allowed(UserRateThrottle, request, 4), [True, True, True, False]
+        )
+
+    def test_scopes(self):
+        anon = self._request()
+        self.assertEqual(self._allowed(AnonRateThrottle, anon, 3), [True, True, False])
+        # authenticated users don't count against anon
+        self.assertEqual(
+            self._allowed(AnonRateThrottle, self._request(self.user), 3),
+            [True] * 3,
+        )
+        api_key, _ = ApiKey.create_key(self.user)
+        bot = self._request(self.user, api_key)
+        self.assertEqual(self._allowed(UserRateThrottle, bot, 6), [True] * 6)
+        self.assertEqual(self._allowed(BotRateThrottle, bot, 6), [True] * 5 + [False])
+        # bot limits don't affect the same user without the key
+        self.assertEqual(
+            self._allowed(UserRateThrottle, self._request(self.user), 3), [True] * 3
+        )
+
+    def test_state_is_shared_between_workers(self):
+        worker1 = GCRAStore(self.path)
+        worker2 = GCRAStore(self.path)
+        self.assertIsNot(worker1, get_store())
+        results = [
+            store.update("user:1", self.now, 20, 60)[0]
+            for store in [worker1, worker2, worker1, worker2]
+        ]
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_fails_open(self):
+        request = self._request(self.user)
+        missing = os.path.join(self.path, "not", "a", "directory.sqlite3")
+        with override_settings(DOGAUTH_THROTTLE_DATABASE=missing):
+            with self.assertLogs("dogauth.throttling", "WARNING"):
+                self.assertEqual(self._allowed(UserRateThrottle, request, 4), [True] * 4)
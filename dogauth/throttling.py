@@ -0,0 +1,208 @@
+"""
+Django-rest-framework throttling shared by all the workers of a host.
+
+DRF's own throttles keep a list of timestamps per user in the default cache,
+which here is per-process memory: every worker had its own limits, and each
+check rewrote a list that grows with the rate.
+
+These use GCRA (generic cell rate algorithm, equivalent to a token bucket): the
+whole state of a key is a single number, the "theoretical arrival time" (TAT) of
+the next request. It is kept in a small sqlite database next to the project
+that all workers share, updated atomically inside `BEGIN IMMEDIATE` transactions.
+
+Rates come from REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] with the usual format
+("100/min") for the scopes "anon", "user" and "bot" (requests authenticated with
+an api key).
+
+If the database can't be used (read-only directory, locked for too long...) the
+throttles let requests through and log a warning.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+# how often (on average, in calls) old keys are purged
+_PURGE_ONE_IN = 1000
+
+
+class GCRAStore:
+    """Keeps the TAT of every key in a sqlite database file. One connection per
+    thread; the database itself is shared by all processes using the same file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat REAL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def update(
+        self, key: str, now: float, interval: float, period: float
+    ) -> Tuple[bool, float]:
+        """Accounts for one request at time `now` if allowed. Returns if it was
+        allowed and, if it wasn't, how many seconds to wait"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tat FROM throttle WHERE key = ?", (key,)
+            ).fetchone()
+            tat = max(row[0], now) if row else now
+            new_tat = tat + interval
+            allowed = new_tat - now <= period
+            if allowed:
+                connection.execute(
+                    "INSERT OR REPLACE INTO throttle (key, tat) VALUES (?, ?)",
+                    (key, new_tat),
+                )
+            if random.randrange(_PURGE_ONE_IN) == 0:
+                # a key whose tat is in the past is the same as a missing key
+                connection.execute("DELETE FROM throttle WHERE tat < ?", (now,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else new_tat - now - period
+
+    def clear(self):
+        """Forgets all keys"""
+        self._connection().execute("DELETE FROM throttle")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store() -> GCRAStore:
+    """Store for the configured DOGAUTH_THROTTLE_DATABASE"""
+    path = settings.DOGAUTH_THROTTLE_DATABASE
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = GCRAStore(path)
+        return _stores[path]
+
+
+class GCRARateThrottle(BaseThrottle):
+    """
+    Base class: limits the rate of requests for the `scope`, per key returned by
+    `get_cache_key`. Requests for which it returns None are not throttled.
+    """
+
+    scope: Optional[str] = None
+    timer = time.time
+
+    def __init__(self):
+        self.num_requests, self.duration = self.parse_rate(self.get_rate())
+        self._wait = None
+
+    def get_rate(self):
+        """Rate configured for the scope in DEFAULT_THROTTLE_RATES"""
+        if not self.scope:
+            raise ImproperlyConfigured(
+                f"You must set a `.scope` for '{self.__class__.__name__}' throttle"
+            )
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError as error:
+            raise ImproperlyConfigured(
+                f"No default throttle rate set for '{self.scope}' scope"
+            ) from error
+
+    @staticmethod
+    def parse_rate(rate):
+        """'100/min' -> (100, 60). None means not limited"""
+        if rate is None:
+            return (None, None)
+        num, period = rate.split("/")
+        duration = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+        return (int(num), duration)
+
+    def get_cache_key(self, request, view):
+        """Identifies who is being limited, None to not limit the request"""
+        raise NotImplementedError(".get_cache_key() must be overridden")
+
+    def allow_request(self, request, view):
+        if self.num_requests is None:
+            return True
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        try:
+            allowed, self._wait = get_store().update(
+                f"{self.scope}:{key}",
+                self.timer(),
+                self.duration / self.num_requests,
+                self.duration,
+            )
+        except sqlite3.Error as error:
+            # better not limiting than failing every request
+            logger.warning("Throttling disabled, %s: %s", self.scope, error)
+            return True
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+def _is_api_key(request) -> bool:
+    return isinstance(getattr(request, "auth", None), ApiKey)
+
+
+class AnonRateThrottle(GCRARateThrottle):
+    """Limits unauthenticated requests per IP address (scope 'anon')"""
+
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserRateThrottle(GCRARateThrottle):
+    """Limits requests per user, or per IP address when not authenticated
+    (scope 'user'). Api key requests are limited by BotRateThrottle instead"""
+
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            if _is_api_key(request):
+                return None
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class BotRateThrottle(GCRARateThrottle):
+    """Limits requests authenticated with an api key, per key (scope 'bot')"""
+
+    scope = "bot"
+
+    def get_cache_key(self, request, view):
+        if not _is_api_key(request):
+            return None
+        return request.auth.pk
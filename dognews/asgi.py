@@ -0,0 +1,64 @@
+"""
+ASGI config for dognews project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django (4.1) sends streaming responses by iterating them in the event loop, so
+a response that waits for data would block every other request. Responses with
+`streams_async` (news/events.py) are sent by their own coroutine instead, which
+is how /moderation/events keeps connections open.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+"""
+import os
+from contextvars import ContextVar
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dognews.settings")
+
+_receive: ContextVar = ContextVar("receive")
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler that lets responses with `streams_async` send their body"""
+
+    async def handle(self, scope, receive, send):
+        # (the stream watches it to stop when the client disconnects)
+        _receive.set(receive)
+        await super().handle(scope, receive, send)
+
+    async def send_response(self, response, send):
+        if not getattr(response, "streams_async", False):
+            await super().send_response(response, send)
+            return
+        headers = [
+            (str(header).encode("ascii"), str(value).encode("latin1"))
+            for header, value in response.items()
+        ] + [
+            (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            for cookie in response.cookies.values()
+        ]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        try:
+            await response.stream(send, _receive.get())
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """Same as django.core.asgi.get_asgi_application, with StreamingASGIHandler"""
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
+
+
+application = get_asgi_application()
@@ -0,0 +1,166 @@
+"""
+Reads from replicas of the database.
+
+Aliases of DATABASES listed in DATABASE_READ_REPLICAS are read-only copies of
+"default" (eg. other nodes or follower replicas of the cluster). Only the reads
+that ask for it go to them: list endpoints, /articles and the admin changelists
+call `read_alias(request)` and use `.using()` with it. Everything else, and every
+write, stays on "default".
+
+A replica can be behind the primary, so after a user changes something their
+own reads stay on "default" for DATABASE_STICKY_SECONDS (`StickyWritesMiddleware`
+marks them), and they see their change. The mark is kept in a cache shared by all
+workers (DATABASE_STICKY_CACHE_ALIAS): without one nothing is read from replicas.
+
+On CockroachDB, reads that tolerate slightly stale data can also be follower
+reads (DATABASE_FOLLOWER_READS): `follower_reads(using)` runs them in a
+transaction `AS OF SYSTEM TIME follower_read_timestamp()`, a few seconds in the
+past, that the nearest replica of each range serves without waiting for the
+leaseholder or contending with writes. On other databases it does nothing.
+"""
+import random
+from contextlib import contextmanager
+from typing import List
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning as CheckWarning, register
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def replicas() -> List[str]:
+    """Aliases of the read replicas"""
+    return list(getattr(settings, "DATABASE_READ_REPLICAS", []))
+
+
+def _key(user) -> str:
+    return f"dognews:wrote:{user.pk}"
+
+
+def _cache():
+    """The cache of the users who wrote recently, None if there isn't one"""
+    alias = getattr(settings, "DATABASE_STICKY_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def mark_written(user):
+    """Keeps the reads of the user on the primary for a while"""
+    cache = _cache()
+    if cache is not None and user is not None and user.pk is not None:
+        cache.set(_key(user), True, getattr(settings, "DATABASE_STICKY_SECONDS", 10))
+
+
+def wrote_recently(user) -> bool:
+    """Whether the reads of the user stick to the primary"""
+    cache = _cache()
+    if cache is None or user is None or user.pk is None:
+        return False
+    return bool(cache.get(_key(user)))
+
+
+def read_alias(request=None) -> str:
+    """Database the reads of a request can use: a replica, unless there are none
+    (or no cache to remember who wrote), the request changes something or its
+    user changed something recently"""
+    aliases = replicas()
+    if not aliases or _cache() is None:
+        return DEFAULT_DB_ALIAS
+    if request is not None:
+        if request.method not in _SAFE_METHODS:
+            return DEFAULT_DB_ALIAS
+        if wrote_recently(getattr(request, "user", None)):
+            return DEFAULT_DB_ALIAS
+    return random.choice(aliases)
+
+
+def follower_reads_enabled(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Whether reads of the database can be follower reads"""
+    return connections[using].vendor == "cockroachdb" and getattr(
+        settings, "DATABASE_FOLLOWER_READS", False
+    )
+
+
+@contextmanager
+def follower_reads(using: str = DEFAULT_DB_ALIAS):
+    """Runs the reads of the block in a read-only transaction as of
+    follower_read_timestamp(), if enabled. Inside another transaction (which
+    may have written something) the reads are left as they are. Yields whether
+    the block is in the follower read transaction"""
+    connection = connections[using]
+    if not follower_reads_enabled(using) or connection.in_atomic_block:
+        yield False
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            # (the first statement of the transaction)
+            cursor.execute(
+                "SET TRANSACTION AS OF SYSTEM TIME follower_read_timestamp()"
+            )
+        yield True
+
+
+_PER_PROCESS_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches)
+def check_sticky_cache(app_configs, **kwargs):  # pylint: disable=unused-argument
+    """The users who wrote recently have to be seen by all workers, or the others
+    would send their reads to a replica that may not have their change yet"""
+    alias = getattr(settings, "DATABASE_STICKY_CACHE_ALIAS", None)
+    if not alias:
+        return []
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend in _PER_PROCESS_BACKENDS:
+        return [
+            CheckWarning(
+                f"DATABASE_STICKY_CACHE_ALIAS '{alias}' is a per-process cache",
+                hint="Use a cache shared by all workers, or set it to None",
+                id="dognews.W001",
+            )
+        ]
+    return []
+
+
+class ReplicaRouter:
+    """
+    Sends the writes of objects read from a replica to the primary, and allows
+    relations between them. Reads are routed as usual: explicitly with `.using()`
+    """
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in replicas():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class StickyWritesMiddleware:
+    """Marks the users of requests that changed something (see read_alias)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method not in _SAFE_METHODS
+            and response.status_code < 400
+            and (replicas() or getattr(settings, "DATABASE_FOLLOWER_READS", False))
+        ):
+            # (rest framework views set the user they authenticated here)
+            mark_written(getattr(request, "user", None))
+        return response
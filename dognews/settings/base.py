@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 from datetime import timedelta
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -53,10 +54,12 @@ AUTHENTICATION_BACKENDS = ("django.contrib.auth.backends.ModelBackend",)  # defa
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "dognews.transactions.RetryMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "dognews.replicas.StickyWritesMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "admin_reorder.middleware.ModelAdminReorderMiddleware",
@@ -93,6 +96,36 @@ DATABASES = {
     }
 }
 
+# aliases of DATABASES that are read replicas of "default" (dognews/replicas.py):
+# list endpoints, /articles and the admin changelists read from them. After a
+# user changes something their reads stay on "default" for this many seconds,
+# remembered in this cache. It must be shared by all workers (see
+# DOGAUTH_ROLES_CACHE_ALIAS): without one (None) nothing is read from replicas
+DATABASE_READ_REPLICAS = []
+DATABASE_STICKY_SECONDS = 10
+DATABASE_STICKY_CACHE_ALIAS = None
+# on CockroachDB, the public reads of /articles are follower reads: as of a few
+# seconds ago, served by the nearest replica (dognews/replicas.py). Users who
+# changed something recently still read the latest data. The cache can't be a
+# database cache of the same database: its writes would be in the read-only
+# transaction
+DATABASE_FOLLOWER_READS = False
+DATABASE_ROUTERS = ["dognews.replicas.ReplicaRouter"]
+
+# transactions aborted by a conflict with another one (SQLSTATE 40001 in
+# CockroachDB) are run again, see dognews/transactions.py: requests that change
+# something and bulk moderation. At most this many attempts, waiting a random
+# time up to the backoff (seconds), doubled after each attempt up to the maximum
+DATABASE_RETRY_ATTEMPTS = 5
+DATABASE_RETRY_BACKOFF = 0.05
+DATABASE_RETRY_MAX_BACKOFF = 1.0
+
+# on CockroachDB, hash-sharded primary keys and date indexes for submissions,
+# votes and the stage tables, so inserts don't all go to one range (see
+# news/cockroach.py). Applied by the migrations: set it before running them.
+# New ids are then larger than 2^53, which JavaScript clients can't read exactly
+NEWS_COCKROACH_SCHEMA = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -134,14 +167,115 @@ STATIC_ROOT = "public/static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "public/media/"
 
+# urls of stored files are cached (see news/urlcache.py): signed urls are kept
+# until this many seconds before they expire, public ones are built from a template
+STORAGE_URL_CACHE_ALIAS = "default"
+STORAGE_URL_EXPIRY_MARGIN = 5 * 60
+# STORAGE_PUBLIC_URL_TEMPLATE = "https://cdn.onlydognews.com/prod/{name}"
+
 # JWT authentication with djangorestframework-simplejwt
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # adds is_staff/roles claims used by dogauth.authentication.SnapshotUser
+    "TOKEN_OBTAIN_SERIALIZER": "dogauth.authentication.RolesTokenObtainPairSerializer",
 }
 
 
+# cached groups/permissions of each user (see dogauth/roles.py). Must be a cache
+# shared by all workers, eg:
+#   CACHES = {
+#       "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+#       "shared": {
+#           "BACKEND": "django.core.cache.backends.redis.RedisCache",
+#           "LOCATION": "redis://127.0.0.1:6379",
+#       },
+#   }
+#   DOGAUTH_ROLES_CACHE_ALIAS = "shared"
+# Without one (None) roles are resolved once per request, and JWT requests load
+# the user from the database
+DOGAUTH_ROLES_CACHE_ALIAS = None
+DOGAUTH_ROLES_CACHE_TIMEOUT = 5 * 60
+
+# api keys for bots: last_used is written at most once per this many seconds
+DOGAUTH_API_KEY_LAST_USED_INTERVAL = 60
+
+# state of the throttling of all workers: a sqlite file in a writable directory
+# shared by them (not the source tree, which may be read-only)
+DOGAUTH_THROTTLE_DATABASE = os.environ.get(
+    "DOGAUTH_THROTTLE_DATABASE",
+    os.path.join(tempfile.gettempdir(), "dognews-throttle.sqlite3"),
+)
+
+# list endpoints of submissions/articles use the compiled serializers in
+# news/rest/fastpath.py
+NEWS_FAST_SERIALIZERS = True
+
+# /articles/search and /submissions/search return at most this many matches
+NEWS_SEARCH_MAX_RESULTS = 500
+
+# /articles/changes returns at most this many changes per call
+NEWS_CHANGES_MAX_RESULTS = 500
+
+# the logs of /articles/changes and /moderation/events are read up to the rows
+# this many seconds old: rows that commit late get a lower sequence than others
+# already read, this has to be longer than the transactions writing them take
+# (news/sequences.py)
+NEWS_LOG_SETTLE_SECONDS = 5
+
+# near-duplicate pages (news/fingerprint.py): fingerprints that differ in at most
+# this many bits (up to 3). With auto-reject, duplicates of earlier submissions
+# are rejected unless a moderator accepts them
+NEWS_DUPLICATE_DISTANCE = 3
+NEWS_DUPLICATES_AUTO_REJECT = False
+
+# /feeds/articles.<rss|atom|json> (news/feeds.py): latest articles in the feeds,
+# the absolute url their links use, and how long each worker serves a feed from
+# memory before checking for a newer one
+NEWS_FEED_ITEMS = 50
+NEWS_FEED_BASE_URL = "https://dognewsserver.gatillos.com"
+NEWS_FEED_MAX_AGE = 120
+
+# /moderation/queue (news/priority.py): weights of the parts of the priority
+# (votes, analysis, history, age) and hours of waiting worth one point. Run
+# ./manage.py refresh_priorities after changing them
+NEWS_PRIORITY_WEIGHTS = {"votes": 1.0, "analysis": 2.0, "history": 2.0, "age": 1.0}
+NEWS_PRIORITY_HOURS_PER_POINT = 6
+
+# /moderation/events (news/events.py): how often a subscriber checks the database
+# for events of other workers, how long a request waits for events when it can't
+# stream them (WSGI), the reconnection delay suggested to EventSource clients
+# (ms), and how long events are kept for reconnecting clients
+NEWS_EVENTS_POLL_INTERVAL = 5
+NEWS_EVENTS_LONG_POLL = 20
+NEWS_EVENTS_RETRY = 1000
+NEWS_EVENTS_RETENTION = 24 * 3600
+
+# /moderation/bulk (news/bulk.py): most submissions moderated in one request
+NEWS_BULK_MODERATION_MAX = 500
+
+# admin changelists (news/adminlist.py): rows counted exactly before the count
+# is estimated, seconds the date hierarchy is cached, most results of a
+# full-text search in the admin, and votes loaded at a time in a change page
+NEWS_ADMIN_COUNT_LIMIT = 10000
+NEWS_ADMIN_DATE_HIERARCHY_CACHE = 600
+NEWS_ADMIN_SEARCH_MAX_RESULTS = 1000
+NEWS_ADMIN_VOTES_PER_PAGE = 50
+
+# background admin actions (custom_admin_actions/jobs.py): a running job whose
+# worker hasn't reported for this many seconds is assumed dead and queued again,
+# up to this many attempts in total
+CUSTOM_ADMIN_JOBS_TIMEOUT = 600
+CUSTOM_ADMIN_JOBS_ATTEMPTS = 2
+
+# ./manage.py export_static (news/static_export.py): directory the static site is
+# written to, or the dotted path of a storage class to use instead (eg.
+# "storages.backends.s3boto3.S3StaticStorage"), and articles per page
+NEWS_EXPORT_ROOT = "public/site/"
+NEWS_EXPORT_STORAGE = None
+NEWS_EXPORT_PAGE_SIZE = 50
+
 # Rest framework
 
 REST_FRAMEWORK = {
@@ -150,26 +284,38 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 50,
     "DEFAULT_SCHEMA_CLASS": "dogauth.views.SwaggerAutoSchema",
     # make default permissions to require auth
-    "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.DjangoModelPermissions"],
+    "DEFAULT_PERMISSION_CLASSES": ["dogauth.permissions.DjangoModelPermissions"],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.BasicAuthentication",  # Basic user:password
+        "dogauth.authentication.ApiKeyAuthentication",  # Api-Key XXX (for bots)
         "rest_framework.authentication.SessionAuthentication",  # cookie
         # "rest_framework.authentication.TokenAuthentication",  # Token XXXX (from post auth/login)
-        "rest_framework_simplejwt.authentication.JWTAuthentication",  # Bearer XXX (from post api/token/)
+        "dogauth.authentication.SnapshotJWTAuthentication",  # Bearer XXX (from post api/token/)
     ],
     # we disable the browseable API, not particularly useful
+    # (news/rest/fastjson.py: same output as JSONRenderer, faster if orjson is
+    # installed; ?format=json-stream streams list pages in chunks)
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "news.rest.fastjson.FastJSONRenderer",
+        "news.rest.fastjson.StreamingJSONRenderer",
         # 'rest_framework.renderers.BrowsableAPIRenderer',
     ],
+    "DEFAULT_PARSER_CLASSES": [
+        "news.rest.fastjson.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     # Throttling: these apply site-wide
+    # (see dogauth/throttling.py: limits are shared by all workers)
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.UserRateThrottle",
-        "rest_framework.throttling.AnonRateThrottle",
+        "dogauth.throttling.UserRateThrottle",
+        "dogauth.throttling.AnonRateThrottle",
+        "dogauth.throttling.BotRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": "50/second",  # applies to all requests form unauntenthicated users
         "user": "100/min",  # applies to unauthenticated _and_ authenticated users
+        "bot": "600/min",  # applies to requests authenticated with an api key
     },
 }
 
@@ -194,6 +340,7 @@ ADMIN_REORDER = {
             "models": (
                 # "authtoken.TokenProxy",
                 "dogauth.User",
+                "dogauth.ApiKey",
                 "auth.Group",
                 "auth.Permission",
             ),
@@ -15,6 +15,8 @@ DATABASES = {
         default=os.environ["DATABASE_URL"],
         engine="django_cockroachdb",
         ssl_require=True,
+        conn_max_age=600,
+        conn_health_checks=True,
     )
 }
 
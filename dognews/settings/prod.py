@@ -28,11 +28,44 @@ DATABASES = {
     #         "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
     #     },
     # }
+    # connections are kept open between requests (a new one to the cluster is a
+    # TLS handshake), and checked before they are reused
     "default": dj_database_url.config(
-        default=os.environ["DATABASE_URL"], engine="django_cockroachdb"
+        default=os.environ["DATABASE_URL"],
+        engine="django_cockroachdb",
+        conn_max_age=int(os.environ.get("DATABASE_CONN_MAX_AGE", 600)),
+        conn_health_checks=True,
     )
 }
 
+# read replicas: DATABASE_REPLICA_URLS="postgres://...,postgres://..."
+for num, url in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(","))
+):
+    DATABASES[f"replica{num}"] = dj_database_url.parse(
+        url,
+        engine="django_cockroachdb",
+        conn_max_age=int(os.environ.get("DATABASE_CONN_MAX_AGE", 600)),
+        conn_health_checks=True,
+    )
+DATABASE_READ_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+# users who wrote recently read from the primary: remembered in a cache shared by
+# all workers, a table of the database (./manage.py createcachetable)
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "dognews_cache",
+    },
+}
+DATABASE_STICKY_CACHE_ALIAS = "shared"
+# follower reads of public endpoints: DATABASE_FOLLOWER_READS=1
+DATABASE_FOLLOWER_READS = os.environ.get("DATABASE_FOLLOWER_READS") == "1"
+
+# hash-sharded keys and indexes (news/cockroach.py), before migrating. Ids
+# become larger than JavaScript numbers hold exactly: not for the web front end
+NEWS_COCKROACH_SCHEMA = os.environ.get("NEWS_COCKROACH_SCHEMA") == "1"
+
 INSTALLED_APPS += ()
 
 ALLOWED_HOSTS = ["192.168.1.149", "dognewsserver.gatillos.com"]
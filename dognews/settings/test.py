@@ -2,6 +2,9 @@
 Settings auto loaded when running tests
 """
 
+import os
+import tempfile
+
 # pylint: disable=wildcard-import, unused-wildcard-import
 from .base import *
 
@@ -10,12 +13,29 @@ from .base import *
 # https://docs.djangoproject.com/en/2.2/topics/testing/overview/#the-test-database
 
 REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []  # disable throttling in tests
+DOGAUTH_THROTTLE_DATABASE = os.path.join(
+    tempfile.gettempdir(), "dognews-testthrottle.sqlite3"
+)
+
+# tests run in a single process, so the local memory cache is "shared"
+DOGAUTH_ROLES_CACHE_ALIAS = "default"
+DATABASE_STICKY_CACHE_ALIAS = "default"
+SILENCED_SYSTEM_CHECKS = ["dogauth.W001", "dognews.W001"]
+
+# logs are read as soon as rows are written (news/test_changes.py and
+# news/test_events.py test the delay)
+NEWS_LOG_SETTLE_SECONDS = 0
 
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "testdb.sqlite3",
-    }
+    },
+    # a separate database, to tell the reads routed to it (news/test_replicas.py)
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "testdb-replica.sqlite3",
+    },
 }
 
 INSTALLED_APPS += ()
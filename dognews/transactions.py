@@ -0,0 +1,156 @@
+"""
+Retries of transactions that the database aborted because of a conflict with
+another one.
+
+CockroachDB runs every transaction as SERIALIZABLE: when two of them conflict
+one is aborted with a "restart transaction" error (SQLSTATE 40001), and it
+succeeds if it is run again. Postgres does the same with SERIALIZABLE
+transactions and deadlocks (40P01).
+
+* `run_atomic(func)` runs a function in a transaction, again after a retryable
+  error, waiting a random time that grows with each attempt (so the
+  transactions that conflicted don't meet again)
+* `RetryMiddleware` does the same with requests that change something: they
+  run in a transaction (rolled back if the view fails) and are retried. If the
+  attempts run out the response is a 503 with Retry-After, instead of a 500
+
+Only the outermost transaction can be retried: inside another one a retryable
+error is raised as usual, for the outer one to retry.
+"""
+import logging
+import random
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_CODES = {"40001", "40P01"}
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether the error aborted a transaction that can be run again"""
+    if not isinstance(exc, DatabaseError):
+        return False
+    # (the error of the driver: psycopg2 has pgcode, psycopg 3 sqlstate)
+    cause = exc.__cause__
+    code = getattr(cause, "pgcode", None) or getattr(cause, "sqlstate", None)
+    return code in RETRYABLE_CODES
+
+
+def attempts() -> int:
+    """Times a transaction is tried"""
+    return max(1, getattr(settings, "DATABASE_RETRY_ATTEMPTS", 5))
+
+
+def backoff(attempt: int):
+    """Waits before another attempt: a random time up to DATABASE_RETRY_BACKOFF
+    seconds, doubled after each attempt up to DATABASE_RETRY_MAX_BACKOFF"""
+    limit = min(
+        getattr(settings, "DATABASE_RETRY_MAX_BACKOFF", 1.0),
+        getattr(settings, "DATABASE_RETRY_BACKOFF", 0.05) * 2**attempt,
+    )
+    time.sleep(random.uniform(0, limit))
+
+
+def run_atomic(func, using: str = DEFAULT_DB_ALIAS):
+    """Returns func() run in a transaction, retried after a retryable error"""
+    if connections[using].in_atomic_block:
+        with transaction.atomic(using=using):
+            return func()
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic(using=using):
+                return func()
+        except DatabaseError as exc:
+            if not is_retryable(exc) or attempt + 1 >= attempts():
+                raise
+            logger.info("Retrying transaction (attempt %s): %s", attempt + 1, exc)
+        backoff(attempt)
+        attempt += 1
+
+
+class RetryMiddleware:
+    """Runs requests that change something in a transaction of the default
+    database, retried after a retryable error"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in _SAFE_METHODS:
+            return self.get_response(request)
+        try:
+            # (read now, to send it again)
+            body = request.body
+        except RequestDataTooBig:
+            body = None
+        connection = connections[DEFAULT_DB_ALIAS]
+        retries = (
+            attempts() if body is not None and not connection.in_atomic_block else 1
+        )
+        for attempt in range(retries):
+            request.retryable_error = None
+            if attempt:
+                _rewind(request, body)
+            try:
+                response = self._attempt(request)
+            except DatabaseError as exc:
+                # (raised committing)
+                if not is_retryable(exc):
+                    raise
+                request.retryable_error = exc
+            if request.retryable_error is None:
+                return response
+            logger.info(
+                "Request %s %s aborted (attempt %s): %s",
+                request.method,
+                request.path,
+                attempt + 1,
+                request.retryable_error,
+            )
+            if attempt + 1 < retries:
+                backoff(attempt)
+        return _busy()
+
+    def _attempt(self, request):
+        request.view_failed = False
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            response = self.get_response(request)
+            if request.view_failed:
+                # (the view raised: what it wrote is undone, as if it had
+                # propagated)
+                transaction.set_rollback(True, using=DEFAULT_DB_ALIAS)
+        return response
+
+    def process_exception(self, request, exception):
+        """Called when the view raises. A retryable error becomes a 503 (the
+        response if there are no more attempts), others a 500"""
+        request.view_failed = True
+        if is_retryable(exception):
+            request.retryable_error = exception
+            return _busy()
+        return None
+
+
+def _busy():
+    response = JsonResponse({"detail": "The database is busy, try again"}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _rewind(request, body: bytes):
+    """The request as it was before the view read it"""
+    # pylint: disable=protected-access
+    request._stream = BytesIO(body)
+    request._read_started = False
+    for cached in ("_post", "_files"):
+        if hasattr(request, cached):
+            delattr(request, cached)
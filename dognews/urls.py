@@ -32,8 +32,12 @@ from rest_framework_simplejwt.views import (
 )
 
 # from django.contrib.auth.models import Group, Permission
+from news import feeds
 from news.rest.views import (
     GroupViewSet,
+    ModerationBulkView,
+    ModerationEventsView,
+    ModerationQueueViewSet,
     SubmissionViewSet,
     ModerationViewSet,
     RetrievalViewSet,
@@ -58,12 +62,14 @@ urlpatterns += [
         ModerationViewSet.as_view(
             {"get": "retrieve", "put": "update", "delete": "destroy"}
         ),
+        name="submission-moderation",
     ),
     re_path(
         r"^submissions/(?P<submission_pk>\d+)/fetch$",
         RetrievalViewSet.as_view(
             {"get": "retrieve", "put": "update", "delete": "destroy"}
         ),
+        name="submission-fetch",
     ),
     re_path(
         # r"^submissions/(?P<submission_pk>\d+)/fetch/(?P<thumbnail_field>(thumbnail_from_page|thumbnail_submitted|thumbnail_processed))$",
@@ -77,6 +83,19 @@ urlpatterns += [
 ]
 
 router.register(r"articles", ArticleViewSet, basename="articles")
+router.register(
+    r"moderation/queue", ModerationQueueViewSet, basename="moderation-queue"
+)
+
+urlpatterns += [
+    path("moderation/events", ModerationEventsView.as_view(), name="moderation-events"),
+    path("moderation/bulk", ModerationBulkView.as_view(), name="moderation-bulk"),
+    re_path(
+        r"^feeds/articles\.(?P<name>rss|atom|json)$",
+        feeds.feed_view,
+        name="article-feeds",
+    ),
+]
 
 router.register(r"users", UserViewSet)
 router.register(r"groups", GroupViewSet)
@@ -3,25 +3,37 @@ Minimal UI
 """
 
 from django import forms
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
 from django.contrib.auth.models import Permission
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
 from django.forms.models import BaseInlineFormSet
-from django.urls import reverse
+from django.http import Http404, JsonResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from custom_admin_actions.admin import CustomActionsModelAdmin
+from dognews import transactions
 
-from . import models
+from . import bulk, models
+from .adminlist import (
+    AutocompleteFilter,
+    IndexedSearchMixin,
+    ScalableAdminMixin,
+    log_changes,
+)
+from .urlcache import storage_url
 
 # pylint: disable=missing-module-docstring, missing-function-docstring, missing-class-docstring
 
 
-def _preview(url):
+def _preview(file):
+    url = storage_url(file)
     if not url:
         return "-"
 
-    if not url.startswith("http"):
-        url = f"/media/{url}"
-
     return mark_safe(
         f'<a rel="noreferrer" href="{url}"><img src="{url}" width="128px"/></a>'
     )
@@ -118,35 +130,107 @@ class PermissionAdmin(admin.ModelAdmin):
     list_filter = ["content_type__app_label", "content_type__model"]
 
 
+# ---- Heavy parts of the change page, loaded on demand (SubmissionAdmin.lazy_view)
+
+
+def _lazy(submission_pk, part: str, label: str):
+    """Button that loads a part of the change page when clicked (lazy.js)"""
+    url = reverse(
+        f"admin:{models.Submission._meta.app_label}_{models.Submission._meta.model_name}_lazy",
+        args=(submission_pk, part),
+        current_app=admin.site.name,
+    )
+    return format_html(
+        '<div id="lazy-{part}"></div><button type="button" class="button" '
+        'data-lazy-url="{url}" data-lazy-part="{part}">{label}</button>',
+        url=url,
+        part=part,
+        label=label,
+    )
+
+
+_THUMBNAILS = ["thumbnail_processed", "thumbnail_submitted", "thumbnail_from_page"]
+
+
+def _lazy_page(request, submission: models.Submission):
+    page = (
+        models.Retrieval.objects.filter(submission=submission)
+        .values_list("fetched_page", flat=True)
+        .first()
+    )
+    return {"fetched_page": page}
+
+
+def _lazy_thumbnails(request, submission: models.Submission):
+    retrieval = (
+        models.Retrieval.objects.filter(submission=submission)
+        .only(*_THUMBNAILS)
+        .first()
+    )
+    thumbnails = []
+    for field in _THUMBNAILS if retrieval else []:
+        url = storage_url(getattr(retrieval, field))
+        if url:
+            thumbnails.append({"name": field, "url": url})
+    return {"thumbnails": thumbnails}
+
+
+def _lazy_votes(request, submission: models.Submission):
+    votes = submission.votes.select_related("owner").order_by("-date_created", "-id")
+    paginator = Paginator(votes, getattr(settings, "NEWS_ADMIN_VOTES_PER_PAGE", 50))
+    page = paginator.get_page(request.GET.get("page"))
+    return {
+        "count": paginator.count,
+        "next": (
+            f"{request.path}?page={page.next_page_number()}"
+            if page.has_next()
+            else None
+        ),
+        "results": [
+            {
+                "owner": str(vote.owner) if vote.owner else None,
+                "value": vote.value,
+                "label": vote.get_value_display(),
+                "date_created": vote.date_created.isoformat(),
+            }
+            for vote in page
+        ],
+    }
+
+
+_LAZY_PARTS = {
+    "page": _lazy_page,
+    "thumbnails": _lazy_thumbnails,
+    "votes": _lazy_votes,
+}
+
+
 class RetrievalInline(SavesOwnerMixin, admin.StackedInline):
     model = models.Retrieval
+    fk_name = "submission"
     fields = (
         "status",
         "title",
         "description",
-        (
-            "thumbnail_submitted",
-            "thumbnail_submitted_preview",
-        ),
-        (
-            "thumbnail_processed",
-            "thumbnail_processed_preview",
-            "thumbnail_from_page",
-            "thumbnail_from_page_preview",
-        ),
-        "fetched_page",
+        "thumbnail_submitted",
+        ("thumbnail_processed", "thumbnail_from_page"),
+        "thumbnails",
+        "fetched_page_preview",
         ("last_updated", "date_created", "owner"),
     )
 
+    def get_queryset(self, request):
+        # (loaded on demand, see SubmissionAdmin.lazy_view)
+        return super().get_queryset(request).defer("fetched_page")
+
     def get_readonly_fields(self, request, obj=None):
         readonly_fields = [
             "title",
             "description",
             "thumbnail",
             "thumbnail_processed",
-            "thumbnail_processed_preview",
-            "thumbnail_submitted_preview",
-            "thumbnail_from_page_preview",
+            "thumbnails",
+            "fetched_page_preview",
             "last_updated",
             "date_created",
             "owner",
@@ -156,21 +240,13 @@ class RetrievalInline(SavesOwnerMixin, admin.StackedInline):
             readonly_fields += "status"
         return readonly_fields
 
-    def thumbnail_processed_preview(self, obj: models.Retrieval):
-        return _preview(obj.thumbnail_processed)
+    @admin.display(description="Previews")
+    def thumbnails(self, obj: models.Retrieval):
+        return _lazy(obj.submission_id, "thumbnails", "Show previews")
 
-    def thumbnail_from_page_preview(self, obj: models.Retrieval):
-        return _preview(obj.thumbnail_from_page)
-
-    def thumbnail_submitted_preview(self, obj: models.Retrieval):
-        try:
-            # will fail if image is not there or there is a connection error
-            return mark_safe(
-                f"""<img src="{obj.thumbnail_submitted.url}" width="{obj.thumbnail_submitted.width}"
-                height={obj.thumbnail_submitted.height} />"""
-            )
-        except Exception as e:
-            return e.msg
+    @admin.display(description="Fetched page")
+    def fetched_page_preview(self, obj: models.Retrieval):
+        return _lazy(obj.submission_id, "page", "Show fetched page")
 
 
 class AnalysisInline(SavesOwnerMixin, admin.StackedInline):
@@ -210,24 +286,10 @@ class ModerationInline(SavesOwnerMixin, admin.StackedInline):
     readonly_fields = ("last_updated", "date_created", "owner")
 
 
-class VoteInline(SavesOwnerMixin, admin.TabularInline):
-    model = models.Vote
-    fields = (
-        "date_created",
-        "last_updated",
-        "owner",
-        "value",
-    )
-    readonly_fields = ("last_updated", "date_created", "owner", "value")
-    extra = 0
-
-    # we don't allow adding from here, online via api/button
-    def has_add_permission(self, request, obj=None):
-        return False
-
-
 @admin.register(models.Submission)
-class SubmissionAdmin(SavesOwnerMixin, CustomActionsModelAdmin):
+class SubmissionAdmin(
+    SavesOwnerMixin, IndexedSearchMixin, ScalableAdminMixin, CustomActionsModelAdmin
+):
     list_display = [
         "last_updated",
         "date",
@@ -239,6 +301,9 @@ class SubmissionAdmin(SavesOwnerMixin, CustomActionsModelAdmin):
         "moderation",
         "preview",
     ]
+    # what list_display shows, see news/adminlist.py
+    list_select_related = ["owner", "retrieval", "moderation__owner"]
+    list_defer = ["retrieval__fetched_page"]
     date_hierarchy = "date_created"
     list_filter = [
         "status",
@@ -247,11 +312,14 @@ class SubmissionAdmin(SavesOwnerMixin, CustomActionsModelAdmin):
         "date",
         "date_created",
         "last_updated",
-        "owner",
+        ("owner", AutocompleteFilter),
     ]
+    # (searched through the full-text index, see IndexedSearchMixin)
     search_fields = ["target_url", "title", "description", "owner__username"]
     list_display_links = ["last_updated", "target_url", "title"]
-    inlines = [RetrievalInline, AnalysisInline, ModerationInline, VoteInline]
+    inlines = [RetrievalInline, AnalysisInline, ModerationInline]
+    # (a select would list every user)
+    autocomplete_fields = ["owner"]
     title = forms.CharField(widget=forms.Textarea(attrs={"cols": 120, "rows": 2}))
     description = forms.CharField(widget=forms.Textarea(attrs={"cols": 120, "rows": 4}))
 
@@ -263,8 +331,8 @@ class SubmissionAdmin(SavesOwnerMixin, CustomActionsModelAdmin):
 
     @admin.display(description="Preview")
     def preview(self, obj: models.Submission):
-        retrieval: models.Retrieval = obj.retrieval
         if hasattr(obj, "retrieval"):
+            retrieval: models.Retrieval = obj.retrieval
             return _preview(
                 retrieval.thumbnail_processed
                 or retrieval.thumbnail_submitted
@@ -272,12 +340,100 @@ class SubmissionAdmin(SavesOwnerMixin, CustomActionsModelAdmin):
             )
         return "-"
 
+    @admin.display(description="Votes")
+    def votes_list(self, obj: models.Submission):
+        return _lazy(obj.pk, "votes", "Show votes")
+
     def get_readonly_fields(self, request, obj: models.Submission = None):
         readonly_fields = ["status", "date_created", "last_updated"]
+        if obj is not None:
+            readonly_fields.append("votes_list")
         if not request.user.is_staff:
             readonly_fields += "owner"
         return readonly_fields
 
+    def get_urls(self):
+        return [
+            path(
+                "<path:object_id>/lazy/<str:part>/",
+                self.admin_site.admin_view(self.lazy_view),
+                name=f"{self.opts.app_label}_{self.opts.model_name}_lazy",
+            ),
+        ] + super().get_urls()
+
+    def lazy_view(self, request, object_id, part):
+        """JSON with a heavy part of the change page: the fetched page, the
+        thumbnail previews or a page of votes"""
+        if part not in _LAZY_PARTS:
+            raise Http404()
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied()
+        submission = self.get_object(request, unquote(object_id))
+        if submission is None:
+            raise Http404()
+        return JsonResponse(_LAZY_PARTS[part](request, submission))
+
+    class Media:
+        js = ("news/admin/lazy.js",)
+
+    actions = ["accept_selected", "reject_selected", "requeue_selected"]
+
+    def _log_selected(self, request, ids, message: str):
+        submissions = models.Submission.objects.filter(id__in=ids).select_related(
+            "owner"
+        )
+        log_changes(
+            request.user,
+            models.Submission,
+            [(submission.pk, str(submission)) for submission in submissions],
+            message,
+        )
+
+    def _moderate_selected(self, request, queryset, status: str, message: str):
+        results = bulk.moderate(
+            [
+                {"submission": pk, "status": status}
+                for pk in queryset.values_list("id", flat=True)
+            ],
+            request.user,
+        )
+        done = [result["submission"] for result in results if "error" not in result]
+        self._log_selected(request, done, message)
+        self.message_user(request, f"{message}: {len(done)}", messages.SUCCESS)
+        errors = [result for result in results if "error" in result]
+        if errors:
+            self.message_user(
+                request,
+                f"Not changed: {len(errors)} ({errors[0]['error']}...)",
+                messages.WARNING,
+            )
+
+    @admin.action(description="Accept selected submissions", permissions=["change"])
+    def accept_selected(self, request, queryset):
+        self._moderate_selected(
+            request, queryset, models.ModerationStatuses.ACCEPTED, "Accepted"
+        )
+
+    @admin.action(description="Reject selected submissions", permissions=["change"])
+    def reject_selected(self, request, queryset):
+        self._moderate_selected(
+            request, queryset, models.ModerationStatuses.REJECTED, "Rejected"
+        )
+
+    @admin.action(
+        description="Send selected submissions back to moderation",
+        permissions=["change"],
+    )
+    def requeue_selected(self, request, queryset):
+        statuses = bulk.requeue(queryset.values_list("id", flat=True))
+        self._log_selected(request, list(statuses), "Back to moderation")
+        self.message_user(
+            request, f"Back to moderation: {len(statuses)}", messages.SUCCESS
+        )
+
+    # slow or fanning out: run by ./manage.py run_admin_jobs
+    background_actions = ["refetch", "reanalyse", "reject"]
+
     # pylint: disable=too-many-arguments
     def get_custom_admin_actions(
         self,
@@ -288,15 +444,45 @@ class SubmissionAdmin(SavesOwnerMixin, CustomActionsModelAdmin):
         form_url="",
         obj=None,
     ):
-        # if obj and obj.status == models.SubmissionStatuses.PENDING:
-        #     return {"start_moderation": "Move to Moderation", "reject": "Reject"}
-        return {}
+        if obj is None:
+            return {}
+        return {
+            "refetch": "Fetch again",
+            "reanalyse": "Analyse again",
+            "reject": "Reject",
+        }
 
     def custom_action_called(self, request, custom_action_code, obj=None):
-        # if custom_action_code == "reject":
-        # obj.reject(request.user)
+        # (all of them run in the background, see run_custom_action)
         return None
 
+    def run_custom_action(self, job, obj: models.Submission, report):
+        if job.action == "reject":
+            report(10, "Moderating")
+            (result,) = bulk.moderate(
+                [{"submission": obj.pk, "status": models.ModerationStatuses.REJECTED}],
+                job.owner,
+            )
+            if "error" in result:
+                raise ValueError(result["error"])
+            return f"Status: {result['status']}"
+        stages = {
+            "refetch": (models.Retrieval, models.RetrievalStatuses.PENDING),
+            "reanalyse": (models.Analysis, models.AnalysisStatuses.PENDING),
+        }
+        if job.action not in stages:
+            return super().run_custom_action(job, obj, report)
+        model, status = stages[job.action]
+
+        def mark_pending():
+            # (saved one by one: the status signals run)
+            stage, _ = model.objects.get_or_create(submission=obj)
+            stage.status = status
+            stage.save()
+
+        transactions.run_atomic(mark_pending)
+        return f"{model._meta.verbose_name.capitalize()} pending"
+
 
 # class ArticleForm(forms.ModelForm):
 #     class Meta:
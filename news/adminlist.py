@@ -0,0 +1,265 @@
+"""
+Admin changelists that stay fast as the table grows.
+
+A changelist page costs, besides the rows themselves:
+
+* a query per row and related object shown (owner, retrieval, moderation...):
+  `list_select_related` joins them, and `list_defer` leaves out large columns
+  (the fetched page) the list doesn't show
+* an exact COUNT(*) of the filtered rows, and another of the whole table:
+  `EstimatedCountPaginator` counts at most NEWS_ADMIN_COUNT_LIMIT rows, and the
+  full count isn't shown
+* the users for the owner filter, all of them: `AutocompleteFilter` is a search
+  box (the admin autocomplete view) that only loads the selected one
+* the date aggregates of `date_hierarchy` (min/max and distinct years, months or
+  days): they are kept in the cache for NEWS_ADMIN_DATE_HIERARCHY_CACHE seconds
+  (`cached_date_hierarchy`, admin/news/scalable_change_list.html)
+* the search box: `search_fields` is an `ILIKE '%...%'` over every column, a
+  full scan. `IndexedSearchMixin` looks words up in the full-text index
+  (news/search.py) and urls, domains, owners and ids in their indexes
+* actions on the selected rows: `log_changes` records their LogEntry rows with
+  one insert
+* the primary database: the list is read from a replica when there are any
+  (dognews/replicas.py)
+"""
+import re
+from hashlib import sha1
+from typing import Iterable, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from dognews import replicas
+
+from . import search
+
+
+def estimated_rows(queryset) -> Optional[int]:
+    """Rows in the table of the queryset according to the statistics of the
+    database, None if it doesn't keep them"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts up to NEWS_ADMIN_COUNT_LIMIT rows. Past that the count of an
+    unfiltered list is the estimate of the database (estimated_rows), and of a
+    filtered one the limit: pages after it are not linked, a narrower filter
+    finds them
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, "NEWS_ADMIN_COUNT_LIMIT", 10000)
+        queryset = self.object_list
+        # (SELECT COUNT(*) FROM (... LIMIT n): it stops after n rows)
+        counted = queryset.order_by()[: limit + 1].count()
+        if counted <= limit:
+            return counted
+        estimate = None if queryset.query.where else estimated_rows(queryset)
+        return max(estimate or 0, limit)
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Filter on a foreign key with a search box instead of a list of every
+    related object. The related model's admin needs `search_fields`
+    """
+
+    template = "admin/news/autocomplete_filter.html"
+
+    def __init__(
+        self, field, request, params, model, model_admin, field_path
+    ):  # pylint: disable=too-many-arguments
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # (a form field gives the widget the choices of the selected value)
+        self.form_field = field.formfield(
+            widget=AutocompleteSelect(
+                field, model_admin.admin_site, attrs={"onchange": "this.form.submit()"}
+            ),
+            required=False,
+        )
+        self.hidden_params = []
+        self.rendered_widget = ""
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        # (the form keeps the other filters)
+        self.hidden_params = [
+            (name, value)
+            for name, value in changelist.params.items()
+            if name != self.lookup_kwarg
+        ]
+        self.rendered_widget = self.form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val
+        )
+        yield {
+            "selected": self.lookup_val is None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": _("All"),
+        }
+
+
+class ScalableChangeList(ChangeList):
+    """Leaves out the model admin's `list_defer` columns, and is read from a
+    replica of the database (dognews/replicas.py) unless the request changes
+    something (actions) or the user did recently"""
+
+    def get_queryset(self, request):
+        # (before the filters and the search, which read from its database)
+        self.root_queryset = self.root_queryset.using(replicas.read_alias(request))
+        queryset = super().get_queryset(request)
+        if self.model_admin.list_defer:
+            queryset = queryset.defer(*self.model_admin.list_defer)
+        return queryset
+
+
+class ScalableAdminMixin:
+    """ModelAdmin whose changelist doesn't slow down as the table grows. Set
+    `list_select_related` to what `list_display` shows, and use AutocompleteFilter
+    for foreign keys in `list_filter`"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/news/scalable_change_list.html"
+    # columns not loaded for the changelist
+    list_defer: Sequence[str] = ()
+
+    def get_changelist(self, request, **kwargs):
+        return ScalableChangeList
+
+    @property
+    def media(self):
+        media = super().media
+        for spec in self.list_filter:
+            if isinstance(spec, (list, tuple)) and issubclass(
+                spec[1], AutocompleteFilter
+            ):
+                field = self.model._meta.get_field(spec[0])
+                media += AutocompleteSelect(field, self.admin_site).media
+                break
+        return media
+
+
+def cached_date_hierarchy(changelist) -> dict:
+    """Context of the admin's date_hierarchy tag, cached by model and filters"""
+    timeout = getattr(settings, "NEWS_ADMIN_DATE_HIERARCHY_CACHE", 600)
+    key = "news:date_hierarchy:{}:{}".format(
+        changelist.model._meta.label_lower,
+        sha1(changelist.get_query_string().encode()).hexdigest(),
+    )
+    context = cache.get(key)
+    if context is None:
+        context = date_hierarchy(changelist)
+        cache.set(key, context, timeout)
+    return context
+
+
+_URL = re.compile(r"^https?://\S+$", re.IGNORECASE)
+_DOMAIN = re.compile(r"^(?:domain:)?((?:[\w-]+\.)+[a-z]{2,})$", re.IGNORECASE)
+_OWNER = re.compile(r"^owner:(\S+)$", re.IGNORECASE)
+_ID = re.compile(r"^#?(\d+)$")
+
+
+def _domain_filter(domain: str) -> Q:
+    """Urls of the domain: prefixes, so the index of the url column is used"""
+    domain = domain.lower().removeprefix("www.")
+    prefixes = [
+        f"{scheme}://{www}{domain}/"
+        for scheme in ("http", "https")
+        for www in ("", "www.")
+    ]
+    query = Q()
+    for prefix in prefixes:
+        query |= Q(target_url__startswith=prefix) | Q(target_url=prefix[:-1])
+    return query
+
+
+class IndexedSearchMixin:
+    """
+    Admin search box without table scans. The term can be:
+
+    * a url: the submission with that exact url
+    * a domain (`example.com`, `domain:example.com`): its urls, with or without
+      www. (not its other subdomains)
+    * `owner:<username>`: the submissions of the user
+    * an id (`123`, `#123`)
+    * anything else: words, looked up in the full-text index (news/search.py)
+
+    `search_fields` still needs a value for the admin to show the box
+    """
+
+    search_help_text = _(
+        "Words, a url, a domain (domain:example.com), owner:username or an id"
+    )
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if _URL.match(term):
+            urls = {term, term.rstrip("/"), term.rstrip("/") + "/"}
+            return queryset.filter(target_url__in=urls), False
+        match = _DOMAIN.match(term)
+        if match:
+            return queryset.filter(_domain_filter(match.group(1))), False
+        match = _OWNER.match(term)
+        if match:
+            return queryset.filter(owner__username=match.group(1)), False
+        match = _ID.match(term)
+        if match:
+            return queryset.filter(pk=int(match.group(1))), False
+        ids = search.search(
+            term,
+            limit=getattr(settings, "NEWS_ADMIN_SEARCH_MAX_RESULTS", 1000),
+            using=queryset.db,
+        )
+        return queryset.filter(id__in=ids), False
+
+
+def log_changes(user, model, objects: Iterable[Tuple[int, str]], message: str):
+    """Same as ModelAdmin.log_change for many objects, given as (pk, repr), with a
+    single insert"""
+    content_type_id = ContentType.objects.get_for_model(model).pk
+    now = timezone.now()
+    LogEntry.objects.bulk_create(
+        [
+            LogEntry(
+                action_time=now,
+                user_id=user.pk,
+                content_type_id=content_type_id,
+                object_id=str(pk),
+                object_repr=representation[:200],
+                action_flag=CHANGE,
+                change_message=message,
+            )
+            for pk, representation in objects
+        ]
+    )
@@ -8,3 +8,12 @@ class NewsConfig(AppConfig):
     """Django app to handle news articles"""
 
     name = "news"
+
+    def ready(self):
+        # connects the signals that keep the search index, the fingerprints, the
+        # feeds, the change log, the event stream and the priorities up to date
+        # pylint: disable=import-outside-toplevel, unused-import
+        from . import changes, events, feeds, fingerprint, priority, search
+
+        # registers the check of the cache of dognews/replicas.py
+        from dognews import replicas
@@ -0,0 +1,152 @@
+"""
+Moderation of many submissions at once (`/moderation/bulk`, the moderation
+actions of the submissions admin).
+
+A batch is moderated in one transaction (run again if a conflict with another
+one aborts it, dognews/transactions.py) with a query per step instead of per
+submission: the moderations are inserted and updated in bulk, the statuses are
+recalculated once for the batch (models.calculate_statuses) and
+`submissions_changed` (news/signals.py) updates what's derived from them.
+"""
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from dognews import transactions
+
+from .models import (
+    Moderation,
+    ModerationStatuses,
+    Submission,
+    SubmissionEventKinds,
+    calculate_statuses,
+)
+from .signals import submissions_changed
+
+NOT_FOUND = "Not found"
+REPEATED = "Repeated in the batch"
+
+_OVERRIDES = ["title", "description"]
+
+
+def moderate(items: Iterable[dict], user, using: str = DEFAULT_DB_ALIAS) -> List[dict]:
+    """
+    Accepts or rejects submissions. Each item has the `submission` id, the
+    moderation `status` and optionally a `title` and `description` that override
+    the fetched ones. Returns, in the same order, the new `status` of each
+    submission or the `error` that kept it from being moderated
+    """
+    items = list(items)
+    # (retried from the start if the transaction is aborted by a conflict)
+    errors, statuses = transactions.run_atomic(
+        partial(_moderate, items, user, using), using
+    )
+    return [
+        (
+            {"submission": item["submission"], "error": errors[index]}
+            if index in errors
+            else {
+                "submission": item["submission"],
+                "status": statuses[item["submission"]],
+            }
+        )
+        for index, item in enumerate(items)
+    ]
+
+
+def _moderate(
+    items: List[dict], user, using: str
+) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """Moderates the items, in a transaction. Returns the errors by position of
+    the item and the new statuses by submission id"""
+    errors: Dict[int, str] = {}
+    moderated: Dict[int, Submission] = {}
+    created: List[Moderation] = []
+    updated: List[Moderation] = []
+    now = timezone.now()
+    submissions = (
+        Submission.objects.using(using)
+        .select_related("moderation__owner", "retrieval", "analysis")
+        .in_bulk([item["submission"] for item in items])
+    )
+    for index, item in enumerate(items):
+        submission = submissions.get(item["submission"])
+        if submission is None:
+            errors[index] = NOT_FOUND
+            continue
+        if submission.pk in moderated:
+            errors[index] = REPEATED
+            continue
+        moderation = getattr(submission, "moderation", None)
+        if moderation is None:
+            moderation = Moderation(submission=submission, owner=user)
+            created.append(moderation)
+        elif moderation.owner_id and moderation.owner_id != user.pk:
+            errors[index] = f"Object already moderated by {moderation.owner}"
+            continue
+        else:
+            moderation.owner = user
+            # (bulk_update doesn't set auto_now fields)
+            moderation.last_updated = now
+            updated.append(moderation)
+        moderation.status = item["status"]
+        for field in _OVERRIDES:
+            if field in item:
+                setattr(moderation, field, item[field])
+        submission.moderation = moderation
+        moderated[submission.pk] = submission
+
+    Moderation.objects.using(using).bulk_create(created)
+    Moderation.objects.using(using).bulk_update(
+        updated, ["status", "owner", "last_updated", *_OVERRIDES]
+    )
+    statuses = _recalculate(
+        list(moderated.values()), SubmissionEventKinds.MODERATED, using
+    )
+    return errors, statuses
+
+
+def requeue(ids: Iterable[int], using: str = DEFAULT_DB_ALIAS) -> Dict[int, str]:
+    """Puts moderated submissions back in the moderation queue: their moderations
+    are pending again, without an owner. Returns the new status of each"""
+    return transactions.run_atomic(partial(_requeue, list(ids), using), using)
+
+
+def _requeue(ids: List[int], using: str) -> Dict[int, str]:
+    """Requeues the submissions, in a transaction"""
+    submissions = list(
+        Submission.objects.using(using)
+        .select_related("moderation", "retrieval", "analysis")
+        .filter(id__in=list(ids), moderation__isnull=False)
+    )
+    now = timezone.now()
+    for submission in submissions:
+        submission.moderation.status = ModerationStatuses.PENDING
+        submission.moderation.owner = None
+        submission.moderation.last_updated = now
+    Moderation.objects.using(using).bulk_update(
+        [submission.moderation for submission in submissions],
+        ["status", "owner", "last_updated"],
+    )
+    return _recalculate(submissions, None, using)
+
+
+def _recalculate(
+    submissions: List[Submission], kind: Optional[str], using: str
+) -> Dict[int, str]:
+    """Statuses after a change of the related models of the submissions, with
+    `submissions_changed` sent for them"""
+    previous = {submission.pk: submission.status for submission in submissions}
+    calculate_statuses(submissions, using)
+    statuses = {submission.pk: submission.status for submission in submissions}
+    if submissions:
+        submissions_changed.send(
+            sender=Submission,
+            ids=list(statuses),
+            previous=previous,
+            statuses=statuses,
+            kind=kind,
+            using=using,
+        )
+    return statuses
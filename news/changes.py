@@ -0,0 +1,152 @@
+"""
+Change log of articles, for clients that keep a copy of them
+(`/articles/changes?since=<cursor>`).
+
+Every time a submission enters or leaves the accepted state, or an accepted one
+(or its retrieval or moderation) is saved, its row in ArticleChange is replaced
+in the same transaction by a new one with the next sequence number. A client
+asks for the changes after the cursor it got last time and gets each changed
+article once, as created (published after the cursor), updated or unpublished,
+so syncing costs what changed and not the size of the archive.
+
+Cursors are opaque to clients: an encoded sequence number. Changes are only
+returned once they are NEWS_LOG_SETTLE_SECONDS old (news/sequences.py), so a
+cursor never passes one whose transaction commits late.
+"""
+import base64
+from operator import attrgetter
+from typing import Iterable, List, Optional, Tuple
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import sequences
+from .models import ArticleChange, Moderation, Retrieval, Submission, SubmissionStatuses
+from .signals import submissions_changed
+
+CREATED = "created"
+UPDATED = "updated"
+UNPUBLISHED = "unpublished"
+
+_PREFIX = "seq:"
+
+
+def encode_cursor(sequence: int) -> str:
+    """Opaque cursor for a position in the log"""
+    return base64.urlsafe_b64encode(f"{_PREFIX}{sequence}".encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Sequence of a cursor (0 if none is given). ValueError if it's not valid"""
+    if not cursor:
+        return 0
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not value.startswith(_PREFIX) or not value[len(_PREFIX) :].isdigit():
+        raise ValueError("Invalid cursor")
+    return int(value[len(_PREFIX) :])
+
+
+def record(
+    submission_id: int,
+    published: bool = False,
+    unpublished: bool = False,
+    using: Optional[str] = None,
+) -> ArticleChange:
+    """Replaces the row of the article with one for this change"""
+    return record_many([(submission_id, published, unpublished)], using)[0]
+
+
+def record_many(
+    entries: Iterable[Tuple[int, bool, bool]], using: Optional[str] = None
+) -> List[ArticleChange]:
+    """Same as `record` for many articles, given as (submission id, published,
+    unpublished), with a query for each step instead of for each article"""
+    entries = list(entries)
+    if not entries:
+        return []
+    changes = ArticleChange.objects.using(using)
+    ids = [entry[0] for entry in entries]
+    previous = {row.submission_id: row for row in changes.filter(submission_id__in=ids)}
+    rows = []
+    for submission_id, published, unpublished in entries:
+        published_sequence = None
+        row = previous.get(submission_id)
+        if row is not None and not published and not row.unpublished:
+            published_sequence = row.published_sequence or row.sequence
+        rows.append(
+            ArticleChange(
+                submission_id=submission_id,
+                published_sequence=published_sequence,
+                unpublished=unpublished,
+            )
+        )
+    if previous:
+        changes.filter(submission_id__in=list(previous)).delete()
+    return changes.bulk_create(rows)
+
+
+def since(sequence: int, limit: int) -> List[ArticleChange]:
+    """Changes after the sequence, in order, up to the first that is too recent"""
+    rows = ArticleChange.objects.filter(sequence__gt=sequence).order_by("sequence")
+    found, _ = sequences.settled(rows[:limit], attrgetter("date_created"))
+    return found
+
+
+def kind(change: ArticleChange, sequence: int) -> str:
+    """What the change is for a client that has seen everything up to `sequence`"""
+    if change.unpublished:
+        return UNPUBLISHED
+    if change.published_sequence is None or change.published_sequence > sequence:
+        return CREATED
+    return UPDATED
+
+
+# ---- Signal handlers that write the log
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Published, unpublished, or an article changed"""
+    accepted = instance.status == SubmissionStatuses.ACCEPTED
+    was_accepted = instance.loaded_status == SubmissionStatuses.ACCEPTED
+    if accepted or was_accepted:
+        record(
+            instance.pk,
+            published=accepted and not was_accepted,
+            unpublished=not accepted,
+            using=using,
+        )
+
+
+@receiver(post_delete, sender=Submission)
+def submission_deleted(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """A deleted article is unpublished"""
+    if instance.status == SubmissionStatuses.ACCEPTED:
+        record(instance.pk, unpublished=True, using=using)
+
+
+@receiver(post_save, sender=Retrieval)
+@receiver(post_save, sender=Moderation)
+def stage_saved(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Titles/descriptions/thumbnails of an article changed"""
+    if instance.submission.status == SubmissionStatuses.ACCEPTED:
+        record(instance.submission_id, using=using)
+
+
+@receiver(submissions_changed)
+def batch_changed(sender, ids=(), previous=None, statuses=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Same as submission_saved for a batch"""
+    entries = []
+    for submission_id in ids:
+        accepted = statuses.get(submission_id) == SubmissionStatuses.ACCEPTED
+        was_accepted = previous.get(submission_id) == SubmissionStatuses.ACCEPTED
+        if accepted or was_accepted:
+            entries.append((submission_id, accepted and not was_accepted, not accepted))
+    record_many(entries, using)
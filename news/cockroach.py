@@ -0,0 +1,102 @@
+"""
+Schema for CockroachDB without write hotspots (NEWS_COCKROACH_SCHEMA).
+
+CockroachDB keeps each table and index sorted by key in ranges, each served
+by a node. Keys that grow with time (ids from a sequence or unique_rowid(),
+date_created) send every insert to the last range of the table and of its
+indexes: one node takes all the writes however many there are. With
+`USING HASH` the key is prefixed with a bucket computed from a hash of the
+columns, so consecutive rows land in different ranges.
+
+In this mode:
+
+* the primary keys of submissions, votes and the stage tables (retrievals,
+  analyses, moderations) are hash-sharded, and new ids come from
+  unique_rowid() instead of a sequence (a single row every insert updates).
+  They are still integers in the API, but around 2^59: above 2^53, the largest
+  integer a JavaScript number (and many other JSON parsers, that read numbers as
+  doubles) holds exactly. Such clients round them and then ask for the wrong
+  submission, so only turn the mode on if every client reads ids as 64-bit
+  integers or as text
+* the indexes that start with date_created (news_sub_created) or are ordered
+  by it within a few values (news_sub_status) are hash-sharded. CockroachDB
+  still reads them in order, merging the buckets
+
+It's applied by migration 0009 when the database is CockroachDB and the
+setting is on; on other databases nothing changes. To switch it afterwards,
+migrate news back to 0008 and forward again.
+"""
+from typing import List, Tuple
+
+from django.conf import settings
+from django.db.models.fields import AutoFieldMixin
+
+from .models import Analysis, Moderation, Retrieval, Submission, Vote
+
+# tables whose primary key is hash-sharded
+SHARDED_TABLES = [Submission, Vote, Retrieval, Analysis, Moderation]
+# indexes (of Submission) that are hash-sharded
+SHARDED_INDEXES = ["news_sub_created", "news_sub_status"]
+
+
+def enabled(connection) -> bool:
+    """Whether the schema mode applies to the database"""
+    return connection.vendor == "cockroachdb" and getattr(
+        settings, "NEWS_COCKROACH_SCHEMA", False
+    )
+
+
+def statements(connection) -> List[Tuple[str, str]]:
+    """SQL that applies the mode, and what reverts each step"""
+    quote = connection.ops.quote_name
+    found = []
+    for model in SHARDED_TABLES:
+        table = quote(model._meta.db_table)
+        pk = quote(model._meta.pk.column)
+        if isinstance(model._meta.pk, AutoFieldMixin):
+            # (the previous default isn't restored: unique_rowid() is what
+            # CockroachDB uses for serial columns, INT8, unless
+            # serial_normalization says otherwise)
+            found.append(
+                (
+                    f"ALTER TABLE {table} ALTER COLUMN {pk} SET DEFAULT unique_rowid()",
+                    "",
+                )
+            )
+        found.append(
+            (
+                f"ALTER TABLE {table} ALTER PRIMARY KEY USING COLUMNS ({pk}) USING HASH",
+                f"ALTER TABLE {table} ALTER PRIMARY KEY USING COLUMNS ({pk})",
+            )
+        )
+    table = quote(Submission._meta.db_table)
+    for index in Submission._meta.indexes:
+        if index.name not in SHARDED_INDEXES:
+            continue
+        name = quote(index.name)
+        columns = ", ".join(
+            quote(Submission._meta.get_field(field).column) for field in index.fields
+        )
+        create = f"CREATE INDEX {name} ON {table} ({columns})"
+        drop = f"DROP INDEX {table}@{name}"
+        found += [(drop, create), (f"{create} USING HASH", drop)]
+    return found
+
+
+def apply(connection):
+    """Applies the mode, if enabled"""
+    if not enabled(connection):
+        return
+    with connection.cursor() as cursor:
+        for forward, _ in statements(connection):
+            cursor.execute(forward)
+
+
+def revert(connection):
+    """Undoes `apply`"""
+    if not enabled(connection):
+        return
+    with connection.cursor() as cursor:
+        for _, backward in reversed(statements(connection)):
+            if backward:
+                cursor.execute(backward)
@@ -0,0 +1,317 @@
+"""
+Lifecycle events of submissions (created, fetched, analysed, moderated) for
+moderators and bots, so they don't have to poll `/submissions`.
+
+Events are appended to SubmissionEvent in the same transaction as the change
+that causes them, and once it commits the in-process `broadcaster` wakes up the
+clients waiting in this worker. Clients waiting in other workers find them in
+the database: they check it every NEWS_EVENTS_POLL_INTERVAL seconds, an index
+range scan after the last event they got (the same query serves reconnects,
+with `Last-Event-ID`). Events are sent once they are NEWS_LOG_SETTLE_SECONDS old
+(news/sequences.py), so neither skips one whose transaction commits late.
+
+`/moderation/events` with `Accept: text/event-stream` answers with an
+EventStreamResponse:
+
+* under ASGI (dognews/asgi.py) the connection stays open and events are sent as
+  they happen
+* under WSGI each connection waits up to NEWS_EVENTS_LONG_POLL seconds for
+  events, sends them and ends, and EventSource reconnects from the last one:
+  long-polling, with a worker busy while a client waits
+
+Without it the same endpoint returns JSON (long-polling with `?wait=`).
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from functools import partial
+from operator import itemgetter
+from typing import Iterable, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import sequences
+from .models import (
+    Analysis,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    Submission,
+    SubmissionEvent,
+    SubmissionEventKinds,
+)
+from .signals import submissions_changed
+
+# every this many events older ones are pruned
+_PRUNE_EVERY = 500
+# events read at once
+_BATCH = 100
+
+_COLUMNS = ["sequence", "submission_id", "kind", "status", "date_created"]
+
+
+def _setting(name: str, default: int) -> int:
+    return getattr(settings, name, default)
+
+
+class Broadcaster:
+    """
+    Wakes up the threads and coroutines of this process waiting for events
+    after a given sequence
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._latest = 0
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, sequence: int):
+        """An event with this sequence was committed"""
+        with self._condition:
+            self._latest = max(self._latest, sequence)
+            self._condition.notify_all()
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def wait(self, after: int, timeout: float) -> bool:
+        """Blocks until there is an event after the sequence or the timeout
+        passes. True if there is one"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._latest > after, timeout)
+
+    async def wait_async(self, after: int, timeout: float) -> bool:
+        """Same as `wait`, without blocking the event loop"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            if self._latest > after:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                self._waiters.discard(waiter)
+
+
+broadcaster = Broadcaster()
+
+
+def latest() -> int:
+    """Sequence of the last event that can be read, 0 if there are none"""
+    return (
+        SubmissionEvent.objects.filter(date_created__lte=sequences.cutoff())
+        .order_by("-sequence")
+        .values_list("sequence", flat=True)
+        .first()
+        or 0
+    )
+
+
+def _since(
+    sequence: int, limit: Optional[int] = None
+) -> Tuple[List[dict], Optional[float]]:
+    """Events after the sequence that can be read, and in how many seconds the
+    next one can be (None if there are no more)"""
+    rows = SubmissionEvent.objects.filter(sequence__gt=sequence).order_by("sequence")
+    found, settles_in = sequences.settled(
+        rows.values(*_COLUMNS)[: limit or _BATCH], itemgetter("date_created")
+    )
+    events = [
+        {
+            "id": row["sequence"],
+            "event": row["kind"],
+            "submission": row["submission_id"],
+            "status": row["status"],
+            "date": row["date_created"].isoformat(),
+        }
+        for row in found
+    ]
+    return events, settles_in
+
+
+def since(sequence: int, limit: Optional[int] = None) -> List[dict]:
+    """Events after the sequence, in order, up to the first that is too recent"""
+    return _since(sequence, limit)[0]
+
+
+def wait_for(sequence: int, timeout: float) -> List[dict]:
+    """Events after the sequence, waiting up to `timeout` seconds for some"""
+    deadline = time.monotonic() + timeout
+    poll = _setting("NEWS_EVENTS_POLL_INTERVAL", 5)
+    while True:
+        events, settles_in = _since(sequence)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            return events
+        if settles_in is not None:
+            time.sleep(min(settles_in, remaining))
+        else:
+            # (events of other workers are only seen in the database)
+            broadcaster.wait(sequence, min(poll, remaining))
+
+
+def format_event(event: dict) -> bytes:
+    """An event as server-sent event"""
+    data = json.dumps(
+        {key: event[key] for key in ["submission", "status", "date"]},
+        separators=(",", ":"),
+    )
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n".encode()
+
+
+async def _disconnected(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """
+    text/event-stream of the events after a sequence. Iterated (WSGI) it's a
+    long poll; the ASGI handler in dognews/asgi.py calls `stream` instead, which
+    keeps sending events until the client goes away
+    """
+
+    streams_async = True
+
+    def __init__(self, sequence: int, **kwargs):
+        self.sequence = sequence
+        super().__init__(self._long_poll(), content_type="text/event-stream", **kwargs)
+        self["Cache-Control"] = "no-cache"
+        # nginx: don't buffer the stream
+        self["X-Accel-Buffering"] = "no"
+
+    def _retry(self) -> bytes:
+        return f"retry: {_setting('NEWS_EVENTS_RETRY', 1000)}\n\n".encode()
+
+    def _long_poll(self):
+        yield self._retry()
+        events = wait_for(self.sequence, _setting("NEWS_EVENTS_LONG_POLL", 20))
+        yield b"".join(format_event(event) for event in events) or b": nothing\n\n"
+
+    async def stream(self, send, receive):
+        """Sends events as they happen until the client disconnects"""
+        disconnected = asyncio.ensure_future(_disconnected(receive))
+        poll = _setting("NEWS_EVENTS_POLL_INTERVAL", 5)
+        sequence = self.sequence
+        load = sync_to_async(_since)
+
+        async def body(content: bytes):
+            await send(
+                {"type": "http.response.body", "body": content, "more_body": True}
+            )
+
+        try:
+            await body(self._retry())
+            while not disconnected.done():
+                events, settles_in = await load(sequence)
+                if events:
+                    sequence = events[-1]["id"]
+                    await body(b"".join(format_event(event) for event in events))
+                    continue
+                if settles_in is not None:
+                    waiting = asyncio.ensure_future(asyncio.sleep(settles_in))
+                    await asyncio.wait(
+                        [waiting, disconnected], return_when=asyncio.FIRST_COMPLETED
+                    )
+                    waiting.cancel()
+                    continue
+                waiting = asyncio.ensure_future(broadcaster.wait_async(sequence, poll))
+                await asyncio.wait(
+                    [waiting, disconnected], return_when=asyncio.FIRST_COMPLETED
+                )
+                if waiting.done() and not waiting.result():
+                    # keeps proxies from closing an idle connection
+                    await body(b": ping\n\n")
+                waiting.cancel()
+        finally:
+            disconnected.cancel()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+# ---- Signal handlers that record the events
+
+
+def record(
+    submission_id: int, kind: str, status: str, using: Optional[str] = None
+) -> SubmissionEvent:
+    """Appends an event, subscribers are woken up when the transaction commits"""
+    return record_many([(submission_id, kind, status)], using)[0]
+
+
+def record_many(
+    entries: Iterable[Tuple[int, str, str]], using: Optional[str] = None
+) -> List[SubmissionEvent]:
+    """Same as `record` for many events, given as (submission id, kind, status),
+    inserted at once"""
+    rows = SubmissionEvent.objects.using(using).bulk_create(
+        [
+            SubmissionEvent(submission_id=submission_id, kind=kind, status=status)
+            for submission_id, kind, status in entries
+        ]
+    )
+    if not rows:
+        return rows
+    last = max(row.sequence for row in rows)
+    transaction.on_commit(partial(broadcaster.publish, last), using=using)
+    if any(row.sequence % _PRUNE_EVERY == 0 for row in rows):
+        retention = timedelta(seconds=_setting("NEWS_EVENTS_RETENTION", 24 * 3600))
+        SubmissionEvent.objects.using(using).filter(
+            date_created__lt=timezone.now() - retention
+        ).delete()
+    return rows
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance=None, created=False, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """created"""
+    if created:
+        record(instance.pk, SubmissionEventKinds.CREATED, instance.status, using)
+
+
+_KINDS = {
+    Retrieval: SubmissionEventKinds.FETCHED,
+    Analysis: SubmissionEventKinds.ANALYSED,
+    Moderation: SubmissionEventKinds.MODERATED,
+}
+
+
+@receiver(post_save, sender=Retrieval)
+@receiver(post_save, sender=Analysis)
+@receiver(post_save, sender=Moderation)
+def stage_saved(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """fetched, analysed, moderated (not while the moderation is pending)"""
+    if sender is Moderation and instance.status == ModerationStatuses.PENDING:
+        return
+    record(
+        instance.submission_id,
+        _KINDS[sender],
+        instance.submission.status,
+        using,
+    )
+
+
+@receiver(submissions_changed)
+def batch_changed(sender, ids=(), statuses=None, kind=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """An event for each submission of a batch"""
+    if kind is not None:
+        record_many(
+            [(submission_id, kind, statuses[submission_id]) for submission_id in ids],
+            using,
+        )
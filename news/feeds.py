@@ -0,0 +1,266 @@
+"""
+Feeds of published articles: RSS 2.0, Atom and JSON Feed 1.1.
+
+The documents are generated ahead of time from the same data as
+ArticleSerializer (through the fast serializer) and stored in FeedDocument.
+They are regenerated, after the transaction commits, only when a submission
+enters or leaves the accepted state or an accepted one is edited or deleted.
+
+Serving a feed returns the stored bytes with an ETag (304 if the client has
+them): each worker keeps the documents in memory for NEWS_FEED_MAX_AGE seconds,
+so there are no database queries except to refresh them, the same staleness
+/articles already has with its page cache.
+"""
+import json
+import time
+from hashlib import sha1
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified, Http404
+from django.utils import feedgenerator
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .models import (
+    FeedDocument,
+    Moderation,
+    Retrieval,
+    Submission,
+    SubmissionStatuses,
+)
+from .signals import submissions_changed
+
+TITLE = "Only Dog News"
+DESCRIPTION = "Dog news from around the world, selected by our moderators"
+
+
+class Feed(NamedTuple):
+    """A generated document"""
+
+    body: bytes
+    content_type: str
+    etag: str
+    last_updated: float
+
+
+_memory: Dict[str, tuple] = {}
+
+
+def _base_url() -> str:
+    return getattr(settings, "NEWS_FEED_BASE_URL", "https://dognewsserver.gatillos.com")
+
+
+def public_request() -> HttpRequest:
+    """A request for NEWS_FEED_BASE_URL, to build the absolute links of documents
+    generated outside of a request (feeds, static export)"""
+    base = urlsplit(_base_url())
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = "/"
+    # links use the public scheme and host, which needn't be in ALLOWED_HOSTS
+    # of the worker
+    request._get_scheme = lambda: base.scheme  # pylint: disable=protected-access
+    request.get_host = lambda: base.netloc
+    return request
+
+
+def _articles() -> List[dict]:
+    """Latest articles, same representation as ArticleSerializer"""
+    # pylint: disable=import-outside-toplevel
+    from .rest.fastpath import ArticleFastSerializer
+
+    fast = ArticleFastSerializer({"request": public_request()})
+    queryset = Submission.objects.filter(status=SubmissionStatuses.ACCEPTED).order_by(
+        "-date_created"
+    )[: getattr(settings, "NEWS_FEED_ITEMS", 50)]
+    return fast.serialize(fast.project(queryset))
+
+
+def _syndication(feed_class, articles: List[dict], feed_url: str) -> bytes:
+    feed = feed_class(
+        title=TITLE,
+        link=_base_url(),
+        description=DESCRIPTION,
+        language="en",
+        feed_url=feed_url,
+    )
+    for article in articles:
+        feed.add_item(
+            title=article.get("title", ""),
+            link=article["target_url"],
+            description=article.get("description", ""),
+            author_name=article["submitter"],
+            pubdate=parse_datetime(article["date_created"]),
+            updateddate=parse_datetime(article["last_updated"]),
+            unique_id=article["url"],
+        )
+    return feed.writeString("utf-8").encode()
+
+
+def _json_feed(articles: List[dict], feed_url: str) -> bytes:
+    document = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": TITLE,
+        "home_page_url": _base_url(),
+        "feed_url": feed_url,
+        "description": DESCRIPTION,
+        "language": "en",
+        "items": [
+            {
+                "id": article["url"],
+                "url": article["target_url"],
+                "title": article.get("title", ""),
+                "summary": article.get("description", ""),
+                "image": article["thumbnail"],
+                "date_published": article["date_created"],
+                "date_modified": article["last_updated"],
+                "authors": [{"name": article["submitter"]}],
+            }
+            for article in articles
+        ],
+    }
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+FORMATS = {
+    "rss": "application/rss+xml; charset=utf-8",
+    "atom": "application/atom+xml; charset=utf-8",
+    "json": "application/feed+json; charset=utf-8",
+}
+
+
+def regenerate() -> Dict[str, Feed]:
+    """Generates and stores all the feeds"""
+    articles = _articles()
+    feeds = {}
+    for name, content_type in FORMATS.items():
+        feed_url = f"{_base_url()}/feeds/articles.{name}"
+        if name == "json":
+            body = _json_feed(articles, feed_url)
+        else:
+            feed_class = (
+                feedgenerator.Atom1Feed
+                if name == "atom"
+                else feedgenerator.Rss201rev2Feed
+            )
+            body = _syndication(feed_class, articles, feed_url)
+        document, _ = FeedDocument.objects.update_or_create(
+            name=name,
+            defaults={
+                "content_type": content_type,
+                "body": body,
+                "etag": sha1(body).hexdigest(),
+            },
+        )
+        feeds[name] = _remember(document)
+    return feeds
+
+
+def _remember(document: FeedDocument) -> Feed:
+    feed = Feed(
+        bytes(document.body),
+        document.content_type,
+        document.etag,
+        document.last_updated.timestamp(),
+    )
+    _memory[document.name] = (time.monotonic(), feed)
+    return feed
+
+
+def get_feed(name: str) -> Feed:
+    """The stored feed, from memory if it was read less than NEWS_FEED_MAX_AGE
+    seconds ago. Generated if there isn't one yet"""
+    remembered = _memory.get(name)
+    max_age = getattr(settings, "NEWS_FEED_MAX_AGE", 120)
+    if remembered is not None and time.monotonic() - remembered[0] < max_age:
+        return remembered[1]
+    document = FeedDocument.objects.filter(name=name).first()
+    if document is None:
+        return regenerate()[name]
+    return _remember(document)
+
+
+def forget():
+    """Drops the documents kept in memory"""
+    _memory.clear()
+
+
+@require_safe
+def feed_view(request, name: str):
+    """/feeds/articles.<rss|atom|json>"""
+    if name not in FORMATS:
+        raise Http404()
+    feed = get_feed(name)
+    etag = quote_etag(feed.etag)
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(feed.body, content_type=feed.content_type)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(feed.last_updated)
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, "NEWS_FEED_MAX_AGE", 120)
+    )
+    return response
+
+
+# ---- Signal handlers that schedule the regeneration
+
+
+def _schedule(using: Optional[str]):
+    """Regenerates once after the current transaction commits"""
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    scheduled = getattr(connection, "_feed_regeneration", None)
+    if scheduled is not None and any(
+        entry[1] is scheduled for entry in connection.run_on_commit
+    ):
+        return
+
+    def regenerate_after_commit():
+        connection._feed_regeneration = None  # pylint: disable=protected-access
+        regenerate()
+
+    connection._feed_regeneration = (  # pylint: disable=protected-access
+        regenerate_after_commit
+    )
+    transaction.on_commit(regenerate_after_commit, using=using)
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Entered or left the accepted state, or an accepted one changed"""
+    if SubmissionStatuses.ACCEPTED in (instance.loaded_status, instance.status):
+        _schedule(using)
+
+
+@receiver(post_delete, sender=Submission)
+def submission_deleted(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """An accepted one was deleted"""
+    if instance.status == SubmissionStatuses.ACCEPTED:
+        _schedule(using)
+
+
+@receiver(post_save, sender=Retrieval)
+@receiver(post_save, sender=Moderation)
+def stage_saved(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Titles/descriptions/thumbnails of an accepted article changed"""
+    if instance.submission.status == SubmissionStatuses.ACCEPTED:
+        _schedule(using)
+
+
+@receiver(submissions_changed)
+def batch_changed(sender, previous=None, statuses=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Some of a batch entered or left the accepted state"""
+    if SubmissionStatuses.ACCEPTED in {*previous.values(), *statuses.values()}:
+        _schedule(using)
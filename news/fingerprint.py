@@ -0,0 +1,167 @@
+"""
+Near-duplicate detection of fetched pages with SimHash.
+
+The same story is often syndicated by several outlets under different urls.
+When a retrieval is saved a 64-bit SimHash of the text of the page (word
+3-grams, hashed with blake2b) is stored in `Retrieval.simhash`, and split in
+four 16-bit bands stored in indexed columns.
+
+Two pages are near-duplicates if their fingerprints differ in at most
+NEWS_DUPLICATE_DISTANCE bits (3 by default). With at most 3 differing bits at
+least one of the four bands is identical, so candidates are found with an
+index lookup per band and only those are compared.
+
+With NEWS_DUPLICATES_AUTO_REJECT a retrieval that duplicates an earlier
+submission (not rejected) gets `duplicate_of` set, which rejects its
+submission unless a moderator accepts it.
+"""
+import re
+from collections import Counter
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+
+from .models import Retrieval
+
+BANDS = 4
+BAND_BITS = 16
+
+# pages with fewer words aren't fingerprinted, they would all look alike
+_MIN_WORDS = 8
+# only the beginning of long pages is used
+_MAX_WORDS = 5000
+_SHINGLE = 3
+
+_BAND_FIELDS = [f"simhash_band_{band}" for band in range(BANDS)]
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of a text (as a signed integer, to fit in a BigIntegerField).
+    None if the text is too short"""
+    words = re.findall(r"\w+", text.lower())[:_MAX_WORDS]
+    if len(words) < _MIN_WORDS:
+        return None
+    shingles = Counter(
+        " ".join(words[start : start + _SHINGLE])
+        for start in range(len(words) - _SHINGLE + 1)
+    )
+    hashes = [(_hash(shingle), weight) for shingle, weight in shingles.items()]
+    total = sum(shingles.values())
+    value = 0
+    for bit in range(64):
+        mask = 1 << bit
+        if 2 * sum(weight for hashed, weight in hashes if hashed & mask) > total:
+            value |= mask
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def bands(value: int) -> List[int]:
+    """The 16-bit bands of a fingerprint"""
+    unsigned = value & 0xFFFFFFFFFFFFFFFF
+    return [(unsigned >> (band * BAND_BITS)) & 0xFFFF for band in range(BANDS)]
+
+
+def distance(first: int, second: int) -> int:
+    """Number of different bits"""
+    return bin((first ^ second) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+def text_of(retrieval: Retrieval) -> str:
+    """What is fingerprinted: the text of the page or, if not fetched, the
+    title and description"""
+    text = strip_tags(retrieval.fetched_page or "")
+    if not text.strip():
+        text = " ".join(filter(None, [retrieval.title, retrieval.description]))
+    return text
+
+
+def _max_distance() -> int:
+    return getattr(settings, "NEWS_DUPLICATE_DISTANCE", 3)
+
+
+def _candidates(fingerprints: Iterable[int], using: str = DEFAULT_DB_ALIAS):
+    """Retrievals sharing at least one band with any of the fingerprints"""
+    values: List[set] = [set() for _ in range(BANDS)]
+    for value in fingerprints:
+        for band, band_value in enumerate(bands(value)):
+            values[band].add(band_value)
+    query = Q()
+    for field, band_values in zip(_BAND_FIELDS, values):
+        if band_values:
+            query |= Q(**{f"{field}__in": band_values})
+    if not query:
+        return []
+    return (
+        Retrieval.objects.using(using)
+        .filter(query)
+        .values_list("submission_id", "simhash")
+    )
+
+
+def near_duplicates(
+    submission_ids: Iterable[int], using: str = DEFAULT_DB_ALIAS
+) -> Dict[int, List[int]]:
+    """Ids of the near-duplicates of each of the given submissions (by id)"""
+    fingerprints = dict(
+        Retrieval.objects.using(using)
+        .filter(submission_id__in=list(submission_ids), simhash__isnull=False)
+        .values_list("submission_id", "simhash")
+    )
+    result: Dict[int, List[int]] = {pk: [] for pk in submission_ids}
+    if not fingerprints:
+        return result
+    limit = _max_distance()
+    for candidate, value in sorted(_candidates(fingerprints.values(), using)):
+        for pk, fingerprint in fingerprints.items():
+            if candidate != pk and distance(value, fingerprint) <= limit:
+                result[pk].append(candidate)
+    return result
+
+
+def _original_of(retrieval: Retrieval) -> Optional[int]:
+    """Earliest submission (not rejected) this one duplicates"""
+    limit = _max_distance()
+    candidates = (
+        _candidates([retrieval.simhash])
+        .filter(submission_id__lt=retrieval.submission_id)
+        .exclude(submission__status__startswith="rej_")
+        .order_by("submission_id")
+    )
+    for candidate, value in candidates:
+        if distance(value, retrieval.simhash) <= limit:
+            return candidate
+    return None
+
+
+# ---- Signal handlers
+
+
+@receiver(pre_save, sender=Retrieval)
+def fingerprint_retrieval(sender, instance=None, update_fields=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Stores the fingerprint (and the duplicate it matches, with auto-reject)
+    in the same write. Partial saves (update_fields) don't write them"""
+    if update_fields is not None:
+        return
+    instance.simhash = simhash(text_of(instance))
+    for field, value in zip(
+        _BAND_FIELDS,
+        bands(instance.simhash) if instance.simhash is not None else [None] * BANDS,
+    ):
+        setattr(instance, field, value)
+
+    if getattr(settings, "NEWS_DUPLICATES_AUTO_REJECT", False):
+        instance.duplicate_of_id = (
+            _original_of(instance) if instance.simhash is not None else None
+        )
+
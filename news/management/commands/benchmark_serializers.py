@@ -0,0 +1,123 @@
+"""
+Measures rows per second of the regular serializers against the fast path
+(news/rest/fastpath.py) for the article and submission lists, and checks that
+both render the same bytes.
+
+Rows are created inside a transaction that is rolled back at the end, so it can
+be run against any database:
+
+    ./manage.py benchmark_serializers --rows 2000
+"""
+import time
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from news import models
+from news.rest.fastpath import ArticleFastSerializer, SubmissionFastSerializer
+from news.rest.serializers import ArticleSerializer, SubmissionSerializer
+
+# pylint: disable=missing-class-docstring
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compares rows/second of the regular and fast-path list serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options["rows"], options["repeat"])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _seed(self, rows: int):
+        user = models.User.objects.create(username="benchmark-serializers")
+        group, _ = Group.objects.get_or_create(name="Moderators")
+        user.groups.add(group)
+        submissions = models.Submission.objects.bulk_create(
+            models.Submission(
+                target_url=f"https://benchmark.example.com/{num}",
+                title=f"title {num}",
+                description=f"description {num}",
+                status=models.SubmissionStatuses.ACCEPTED,
+                owner=user,
+            )
+            for num in range(rows)
+        )
+        models.Retrieval.objects.bulk_create(
+            models.Retrieval(
+                submission=submission,
+                status=models.RetrievalStatuses.FETCHED,
+                title=f"fetched {submission.pk}",
+                thumbnail_from_page=f"uploaded_images/{submission.pk}.png",
+                owner=user,
+            )
+            for submission in submissions
+        )
+        models.Moderation.objects.bulk_create(
+            models.Moderation(
+                submission=submission,
+                status=models.ModerationStatuses.ACCEPTED,
+                owner=user,
+            )
+            for submission in submissions
+        )
+        models.Vote.objects.bulk_create(
+            models.Vote(submission=submission, owner=user)
+            for submission in submissions
+        )
+        return user
+
+    def _run(self, rows: int, repeat: int):
+        user = self._seed(rows)
+        request = Request(APIRequestFactory().get("/"))
+        request.user = user
+        context = {"request": request}
+        queryset = models.Submission.objects.filter(
+            target_url__startswith="https://benchmark.example.com/"
+        ).order_by("-date_created")
+        renderer = JSONRenderer()
+
+        for name, serializer_class, fast_class in [
+            ("articles", ArticleSerializer, ArticleFastSerializer),
+            ("submissions", SubmissionSerializer, SubmissionFastSerializer),
+        ]:
+
+            def regular():
+                return renderer.render(
+                    serializer_class(queryset, many=True, context=context).data
+                )
+
+            def fast():
+                serializer = fast_class(context)  # pylint: disable=cell-var-from-loop
+                projected = serializer.project(queryset)
+                return renderer.render(serializer.serialize(projected))
+
+            if regular() != fast():
+                raise CommandError(f"{name}: fast path output differs")
+
+            results = {}
+            for label, function in [("regular", regular), ("fast", fast)]:
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    function()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                results[label] = rows / best
+            self.stdout.write(
+                f"{name:12} regular {results['regular']:10.0f} rows/s   "
+                f"fast {results['fast']:10.0f} rows/s   "
+                f"x{results['fast'] / results['regular']:.1f}"
+            )
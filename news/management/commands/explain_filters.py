@@ -0,0 +1,56 @@
+"""
+Runs EXPLAIN for every filter and ordering of the submission list endpoints and
+flags the plans that scan a whole table (news/queryplans.py).
+
+The plans depend on the statistics of the tables: on an empty or small database
+use --seed to add submissions first (they are rolled back afterwards).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from news import queryplans
+
+# pylint: disable=missing-class-docstring
+
+
+class Command(BaseCommand):
+    help = "Flags the submission filters whose query plan scans a table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Submissions added (and rolled back) before explaining",
+        )
+        parser.add_argument("--verbose-plans", action="store_true")
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="Exit with an error if a plan is flagged",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        with transaction.atomic(using=using):
+            if options["seed"]:
+                queryplans.seed(options["seed"], using)
+            results = queryplans.audit(using)
+            transaction.set_rollback(True, using=using)
+        flagged = 0
+        for result in results:
+            if result.flagged:
+                flagged += 1
+                mark = "SCAN"
+            elif result.case.unindexable and result.scans:
+                mark = "unindexable"
+            elif result.sorts:
+                mark = "sort"
+            else:
+                mark = "ok"
+            self.stdout.write(f"{mark:12} {result.case.label}")
+            if result.flagged or options["verbose_plans"]:
+                self.stdout.write(f"    {result.plan}".replace("\n", "\n    "))
+        self.stdout.write(f"{flagged} of {len(results)} plans scan a table")
+        if flagged and options["fail_on_scan"]:
+            raise CommandError("Some filters scan a table")
@@ -0,0 +1,31 @@
+"""
+Exports the published articles as static JSON and HTML files
+(news/static_export.py), to NEWS_EXPORT_ROOT or NEWS_EXPORT_STORAGE. Only what
+changed since the last export is written, `--full` rewrites everything:
+
+    ./manage.py export_static
+"""
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from news import static_export
+
+# pylint: disable=missing-class-docstring
+
+
+class Command(BaseCommand):
+    help = "Writes static pages of the published articles, incrementally"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", help="Directory to export to instead of the configured one"
+        )
+        parser.add_argument(
+            "--full", action="store_true", help="Ignore the manifest, rewrite all"
+        )
+
+    def handle(self, *args, **options):
+        storage = None
+        if options["output"]:
+            storage = FileSystemStorage(location=options["output"])
+        exporter = static_export.export(storage, full=options["full"])
+        self.stdout.write(f"Wrote {exporter.written} files, deleted {exporter.deleted}")
@@ -0,0 +1,22 @@
+"""
+Rewrites the full text index of submissions (news/search.py). It's kept up to
+date on every save, this is only needed after importing data bypassing the
+models or to recover from a damaged index.
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from news import search
+
+# pylint: disable=missing-class-docstring
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full text search index of submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options["database"]):
+            count = search.rebuild(options["database"])
+        self.stdout.write(f"Indexed {count} submissions")
@@ -0,0 +1,22 @@
+"""
+Recomputes the priority of every submission in the moderation queue
+(news/priority.py). They are kept up to date on every change, this is only
+needed after changing NEWS_PRIORITY_WEIGHTS or NEWS_PRIORITY_HOURS_PER_POINT.
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from news import priority
+
+# pylint: disable=missing-class-docstring
+
+
+class Command(BaseCommand):
+    help = "Recomputes the priorities of the moderation queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options["database"]):
+            count = priority.refresh_all(options["database"])
+        self.stdout.write(f"{count} submissions in the queue")
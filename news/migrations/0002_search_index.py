@@ -0,0 +1,30 @@
+# Full text index (see news/search.py), created for the database vendor in use
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    # pylint: disable=import-outside-toplevel
+    from news import search
+
+    search.create_index(
+        schema_editor.connection, submissions=apps.get_model("news", "Submission")
+    )
+
+
+def drop_index(apps, schema_editor):  # pylint: disable=unused-argument
+    # pylint: disable=import-outside-toplevel
+    from news import search
+
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.1.6 on 2026-10-19 02:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fingerprint_existing(apps, schema_editor):
+    # pylint: disable=import-outside-toplevel
+    from news.fingerprint import BANDS, bands, simhash, text_of
+
+    retrievals = apps.get_model("news", "Retrieval").objects.using(
+        schema_editor.connection.alias
+    )
+    for retrieval in retrievals.iterator():
+        retrieval.simhash = simhash(text_of(retrieval))
+        values = bands(retrieval.simhash) if retrieval.simhash is not None else []
+        for band in range(BANDS):
+            setattr(retrieval, f"simhash_band_{band}", values[band] if values else None)
+        retrieval.save(
+            update_fields=["simhash"]
+            + [f"simhash_band_{band}" for band in range(BANDS)]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0002_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="retrieval",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="news.submission",
+            ),
+        ),
+        migrations.AddField(
+            model_name="retrieval",
+            name="simhash",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="retrieval",
+            name="simhash_band_0",
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="retrieval",
+            name="simhash_band_1",
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="retrieval",
+            name="simhash_band_2",
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="retrieval",
+            name="simhash_band_3",
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="submission",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("accepted", "A moderator accepted"),
+                    ("rej_mod", "Rejected: A moderator rejected it"),
+                    ("rej_fetch", "Rejected: Could not be fetched"),
+                    ("rej_banned", "Rejected: Domain is blocklisted"),
+                    ("rej_sentim", "Rejected: Sentiment analysis"),
+                    ("rej_dup", "Rejected: Duplicate of another submission"),
+                ],
+                default="pending",
+                editable=False,
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(fingerprint_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.6 on 2026-10-19 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0003_retrieval_simhash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedDocument",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=20, primary_key=True, serialize=False),
+                ),
+                ("content_type", models.CharField(max_length=80)),
+                ("body", models.BinaryField()),
+                ("etag", models.CharField(max_length=64)),
+                ("last_updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.1.6 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+def log_published(apps, schema_editor):
+    """Existing articles are in the log, so a client without a cursor gets all"""
+    alias = schema_editor.connection.alias
+    changes = apps.get_model("news", "ArticleChange").objects.using(alias)
+    accepted = (
+        apps.get_model("news", "Submission")
+        .objects.using(alias)
+        .filter(status="accepted")
+        .order_by("date_created", "id")
+        .values_list("id", flat=True)
+    )
+    changes.bulk_create(
+        [changes.model(submission_id=pk) for pk in accepted.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0004_feeddocument"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArticleChange",
+            fields=[
+                ("sequence", models.BigAutoField(primary_key=True, serialize=False)),
+                ("submission_id", models.IntegerField(unique=True)),
+                ("published_sequence", models.BigIntegerField(null=True)),
+                ("unpublished", models.BooleanField(default=False)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(log_published, migrations.RunPython.noop),
+    ]
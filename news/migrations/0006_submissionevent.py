@@ -0,0 +1,51 @@
+# Generated by Django 4.1.6 on 2026-10-19 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0005_articlechange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubmissionEvent",
+            fields=[
+                ("sequence", models.BigAutoField(primary_key=True, serialize=False)),
+                ("submission_id", models.IntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("fetched", "Fetched"),
+                            ("analysed", "Analysed"),
+                            ("moderated", "Moderated"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("accepted", "A moderator accepted"),
+                            ("rej_mod", "Rejected: A moderator rejected it"),
+                            ("rej_fetch", "Rejected: Could not be fetched"),
+                            ("rej_banned", "Rejected: Domain is blocklisted"),
+                            ("rej_sentim", "Rejected: Sentiment analysis"),
+                            ("rej_dup", "Rejected: Duplicate of another submission"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "date_created",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+            ],
+        ),
+    ]
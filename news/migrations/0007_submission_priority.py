@@ -0,0 +1,34 @@
+# Generated by Django 4.1.6 on 2026-10-19 02:57
+
+from django.db import migrations, models
+
+
+def prioritize_pending(apps, schema_editor):
+    # pylint: disable=import-outside-toplevel
+    from news.priority import refresh_all
+
+    refresh_all(schema_editor.connection.alias, apps.get_model("news", "Submission"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0006_submissionevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="priority",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                condition=models.Q(("priority__isnull", False)),
+                fields=["-priority"],
+                name="news_submission_queue",
+            ),
+        ),
+        migrations.RunPython(prioritize_pending, migrations.RunPython.noop),
+    ]
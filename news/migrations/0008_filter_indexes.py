@@ -0,0 +1,39 @@
+# Generated by Django 4.1.6 on 2026-10-19 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0007_submission_priority"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="analysis",
+            index=models.Index(fields=["status"], name="news_ana_status"),
+        ),
+        migrations.AddIndex(
+            model_name="moderation",
+            index=models.Index(fields=["status"], name="news_mod_status"),
+        ),
+        migrations.AddIndex(
+            model_name="retrieval",
+            index=models.Index(fields=["status"], name="news_ret_status"),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(fields=["date_created"], name="news_sub_created"),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                fields=["status", "date_created"], name="news_sub_status"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(fields=["owner", "date_created"], name="news_sub_owner"),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Hash-sharded keys and indexes on CockroachDB with NEWS_COCKROACH_SCHEMA (see
+# news/cockroach.py). Nothing changes on other databases
+
+from django.db import migrations
+
+
+def apply(apps, schema_editor):  # pylint: disable=unused-argument
+    # pylint: disable=import-outside-toplevel
+    from news import cockroach
+
+    cockroach.apply(schema_editor.connection)
+
+
+def revert(apps, schema_editor):  # pylint: disable=unused-argument
+    # pylint: disable=import-outside-toplevel
+    from news import cockroach
+
+    cockroach.revert(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    # (CockroachDB doesn't run schema changes like these in a transaction)
+    atomic = False
+
+    dependencies = [
+        ("news", "0008_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(apply, revert),
+    ]
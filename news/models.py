@@ -5,10 +5,12 @@ Models to handle new submissions and their lifecycle to becoming Articles
 import os
 from datetime import datetime
 from hashlib import sha1
+from typing import List, Optional
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 # from rest_framework.authtoken.models import Token
 import tldextract
@@ -57,6 +59,7 @@ class SubmissionStatuses(models.TextChoices):
     REJECTED_FETCH = "rej_fetch", "Rejected: Could not be fetched"
     REJECTED_BANNED = "rej_banned", "Rejected: Domain is blocklisted"
     REJECTED_SENTIMENT = "rej_sentim", "Rejected: Sentiment analysis"
+    REJECTED_DUPLICATE = "rej_dup", "Rejected: Duplicate of another submission"
 
 
 class ModerationStatuses(models.TextChoices):
@@ -84,6 +87,15 @@ class AnalysisStatuses(models.TextChoices):
     PASSED = "passed", "Passed"
 
 
+class SubmissionEventKinds(models.TextChoices):
+    """What happened to a submission"""
+
+    CREATED = "created", "Created"
+    FETCHED = "fetched", "Fetched"
+    ANALYSED = "analysed", "Analysed"
+    MODERATED = "moderated", "Moderated"
+
+
 # ----
 
 
@@ -117,6 +129,22 @@ class Submission(models.Model):
     date = models.DateTimeField(null=True, editable=True)
     date_created = models.DateTimeField(auto_now_add=True, editable=False)
     last_updated = models.DateTimeField(auto_now=True, editable=False)
+    # position in the moderation queue, None if not in it (news/priority.py)
+    priority = models.FloatField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-priority"],
+                name="news_submission_queue",
+                condition=models.Q(priority__isnull=False),
+            ),
+            # the filters and orderings of /submissions and /articles, see
+            # news/queryplans.py (./manage.py explain_filters)
+            models.Index(fields=["date_created"], name="news_sub_created"),
+            models.Index(fields=["status", "date_created"], name="news_sub_status"),
+            models.Index(fields=["owner", "date_created"], name="news_sub_owner"),
+        ]
 
     @property
     def domain(self):
@@ -130,6 +158,11 @@ class Submission(models.Model):
                 pass
         return ""
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save handlers compare it with the new status
+        self.loaded_status = self.status
+
     def __str__(self):
         return f"{self.domain}({self.owner}:{self.id})"
 
@@ -180,6 +213,24 @@ class Retrieval(models.Model):
 
     fetched_page = models.TextField(max_length=60 * 1024, blank=True, editable=True)
 
+    # near-duplicate detection, see fingerprint.py
+    simhash = models.BigIntegerField(null=True, blank=True, editable=False)
+    simhash_band_0 = models.IntegerField(null=True, editable=False, db_index=True)
+    simhash_band_1 = models.IntegerField(null=True, editable=False, db_index=True)
+    simhash_band_2 = models.IntegerField(null=True, editable=False, db_index=True)
+    simhash_band_3 = models.IntegerField(null=True, editable=False, db_index=True)
+    duplicate_of = models.ForeignKey(
+        to=Submission,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["status"], name="news_ret_status")]
+
     def __str__(self):
         return f"Retrieval:{self.status}"
 
@@ -207,6 +258,9 @@ class Analysis(models.Model):
     summary = models.TextField(null=True, blank=True, default=None, editable=True)
     sentiment = models.TextField(null=True, blank=True, default=None, editable=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["status"], name="news_ana_status")]
+
     def __str__(self) -> str:
         return f"Analysis:{self.status} ({self.owner})"
 
@@ -239,6 +293,9 @@ class Moderation(models.Model):
     last_updated = models.DateTimeField(auto_now=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True, editable=False)
 
+    class Meta:
+        indexes = [models.Index(fields=["status"], name="news_mod_status")]
+
     def __str__(self) -> str:
         return f"Mod:{self.status} ({self.owner})"
 
@@ -280,9 +337,69 @@ class Vote(models.Model):
         unique_together = [("owner", "submission")]
 
 
+class FeedDocument(models.Model):
+    """A feed of published articles (rss, atom, json), generated ahead of time
+    by news/feeds.py"""
+
+    name = models.CharField(max_length=20, primary_key=True)
+    content_type = models.CharField(max_length=80)
+    body = models.BinaryField()
+    etag = models.CharField(max_length=64)
+    last_updated = models.DateTimeField(auto_now=True, editable=False)
+
+    def __str__(self) -> str:
+        return f"Feed:{self.name} ({self.etag})"
+
+
+class ArticleChange(models.Model):
+    """
+    Latest change of an article (a submission that is or was accepted), for
+    /articles/changes. There is one row per article, replaced on every change,
+    so the sequence is the one of its latest change
+    """
+
+    sequence = models.BigAutoField(primary_key=True)
+    # not a foreign key: rows of deleted submissions are kept
+    submission_id = models.IntegerField(unique=True)
+    # sequence of the change that published the article, None if it's this one
+    published_sequence = models.BigIntegerField(null=True)
+    unpublished = models.BooleanField(default=False)
+    date_created = models.DateTimeField(auto_now_add=True, editable=False)
+
+    def __str__(self) -> str:
+        return f"ArticleChange:{self.sequence}({self.submission_id})"
+
+
+class SubmissionEvent(models.Model):
+    """
+    A step in the lifecycle of a submission, for /moderation/events. Rows are
+    only appended (and pruned after NEWS_EVENTS_RETENTION seconds); the
+    sequence is the id of the event in the stream
+    """
+
+    sequence = models.BigAutoField(primary_key=True)
+    submission_id = models.IntegerField()
+    kind = models.CharField(max_length=10, choices=SubmissionEventKinds.choices)
+    # of the submission, after the event
+    status = models.CharField(max_length=10, choices=SubmissionStatuses.choices)
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"SubmissionEvent:{self.sequence}({self.kind} {self.submission_id})"
+
+
 # ---- Signal handlers that affect submission status
 
 
+@receiver(post_init, sender=Submission)
+def remember_loaded_status(
+    sender, instance=None, **kwargs  # pylint: disable=unused-argument
+):
+    """Status as loaded (or last saved), so handlers know if a save changes it"""
+    # (__dict__: a deferred status must not be loaded)
+    instance.loaded_status = instance.__dict__.get("status")
+
+
 def set_status(submission: Submission, new_status: SubmissionStatuses):
     """Updates the status of a submission to the given one if it's needed and saves the model"""
     if submission.status != new_status:
@@ -290,36 +407,63 @@ def set_status(submission: Submission, new_status: SubmissionStatuses):
         submission.save()
 
 
-def calculate_status(submission: Submission):
-    """Calculates the status of a submission based on all the related models that affect it.
-    This will be called every time there is a relevant change (using signals)"""
+def status_for(submission: Submission) -> Optional[str]:
+    """Status a submission should have based on all the related models that affect
+    it, None if they don't decide it"""
+    status = None
     if hasattr(submission, "moderation"):
         moderation: Moderation = submission.moderation
         if moderation.status == ModerationStatuses.ACCEPTED:
-            set_status(submission, SubmissionStatuses.ACCEPTED)
-            return
+            return SubmissionStatuses.ACCEPTED
         if moderation.status == ModerationStatuses.REJECTED:
-            set_status(submission, SubmissionStatuses.REJECTED_MOD)
-            return
+            return SubmissionStatuses.REJECTED_MOD
         # set this as basis unless others have more detail
-        set_status(submission, SubmissionStatuses.PENDING)
+        status = SubmissionStatuses.PENDING
 
     if hasattr(submission, "retrieval"):
         retrieval: Retrieval = submission.retrieval
         # only rejections change the main status
         if retrieval.status == RetrievalStatuses.REJECTED_BANNED:
-            set_status(submission, SubmissionStatuses.REJECTED_BANNED)
-            return
+            return SubmissionStatuses.REJECTED_BANNED
         if retrieval.status == RetrievalStatuses.REJECTED_ERROR:
-            set_status(submission, SubmissionStatuses.REJECTED_FETCH)
-            return
+            return SubmissionStatuses.REJECTED_FETCH
+        if retrieval.duplicate_of_id is not None:
+            return SubmissionStatuses.REJECTED_DUPLICATE
 
     if hasattr(submission, "analysis"):
         analysis: Analysis = submission.analysis
         # only rejections change the main status
         if analysis.status == AnalysisStatuses.FAILED:
-            set_status(submission, SubmissionStatuses.REJECTED_SENTIMENT)
-            return
+            return SubmissionStatuses.REJECTED_SENTIMENT
+    return status
+
+
+def calculate_status(submission: Submission):
+    """Calculates the status of a submission based on all the related models that affect it.
+    This will be called every time there is a relevant change (using signals)"""
+    status = status_for(submission)
+    if status is not None:
+        set_status(submission, status)
+
+
+def calculate_statuses(
+    submissions: List[Submission], using: str = DEFAULT_DB_ALIAS
+) -> List[Submission]:
+    """Same as calculate_status for many submissions (with their related models
+    loaded), saved with a single query and without post_save: whoever calls it
+    sends `submissions_changed` (news/signals.py). Returns the ones that changed"""
+    changed = []
+    now = timezone.now()
+    for submission in submissions:
+        status = status_for(submission)
+        if status is not None and submission.status != status:
+            submission.status = status
+            # (bulk_update doesn't set auto_now fields)
+            submission.last_updated = now
+            changed.append(submission)
+    if changed:
+        Submission.objects.using(using).bulk_update(changed, ["status", "last_updated"])
+    return changed
 
 
 @receiver(post_save, sender=Moderation)
@@ -0,0 +1,187 @@
+"""
+Priority of the submissions waiting for a moderator (/moderation/queue).
+
+A submission is in the queue while it's pending, fetched and not moderated.
+Its priority combines:
+
+* the tally of its votes (a flag is -100)
+* the analysis: +1 passed, -1 failed
+* the history of the submitter: from -1 (all their moderated submissions were
+  rejected) to +1 (all accepted), 0 for new submitters
+* its age: one point every NEWS_PRIORITY_HOURS_PER_POINT hours waiting
+
+each multiplied by its weight in NEWS_PRIORITY_WEIGHTS. The age is counted
+from a fixed date instead of from now, which changes the score of every queued
+submission by the same amount and so keeps the order, so the score doesn't go
+stale: it's stored in `Submission.priority` (None when not queued, with a
+partial index on the rest) and refreshed only for the submissions affected by a
+change, and the queue is read from the index in order.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    Analysis,
+    AnalysisStatuses,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    SubmissionStatuses,
+    Vote,
+)
+from .signals import submissions_changed
+
+DEFAULT_WEIGHTS = {"votes": 1.0, "analysis": 2.0, "history": 2.0, "age": 1.0}
+
+_ANALYSIS = {AnalysisStatuses.PASSED: 1, AnalysisStatuses.FAILED: -1}
+
+# statuses of submissions a moderator decided on
+_MODERATED = [SubmissionStatuses.ACCEPTED, SubmissionStatuses.REJECTED_MOD]
+
+
+def _weights() -> Dict[str, float]:
+    return {**DEFAULT_WEIGHTS, **getattr(settings, "NEWS_PRIORITY_WEIGHTS", {})}
+
+
+def _queued(row: dict) -> bool:
+    return (
+        row["status"] == SubmissionStatuses.PENDING
+        and row["retrieval__status"] == RetrievalStatuses.FETCHED
+        and row["moderation__status"] in (None, ModerationStatuses.PENDING)
+    )
+
+
+def _histories(owner_ids: Iterable[int], submissions) -> Dict[int, float]:
+    """-1 to 1 for each submitter, from their accepted/rejected submissions"""
+    histories = {}
+    rows = (
+        submissions.objects.filter(owner_id__in=set(owner_ids))
+        .values("owner_id")
+        .annotate(
+            accepted=Count("id", filter=Q(status=SubmissionStatuses.ACCEPTED)),
+            rejected=Count("id", filter=Q(status=SubmissionStatuses.REJECTED_MOD)),
+        )
+    )
+    for row in rows:
+        accepted, rejected = row["accepted"], row["rejected"]
+        # (smoothed, a single decision doesn't count as a full record)
+        histories[row["owner_id"]] = (accepted - rejected) / (accepted + rejected + 2)
+    return histories
+
+
+def compute(ids: Iterable[int], submissions=Submission) -> Dict[int, Optional[float]]:
+    """Priority of each of the given submissions, None if it's not queued"""
+    rows = [
+        row
+        for row in submissions.objects.filter(id__in=list(ids))
+        .annotate(tally=Coalesce(Sum("votes__value"), 0))
+        .values(
+            "id",
+            "status",
+            "owner_id",
+            "date_created",
+            "retrieval__status",
+            "moderation__status",
+            "analysis__status",
+            "tally",
+        )
+    ]
+    weights = _weights()
+    age_scale = 3600 * getattr(settings, "NEWS_PRIORITY_HOURS_PER_POINT", 6)
+    histories = _histories(
+        [row["owner_id"] for row in rows if _queued(row)], submissions
+    )
+    priorities: Dict[int, Optional[float]] = {}
+    for row in rows:
+        if not _queued(row):
+            priorities[row["id"]] = None
+            continue
+        priorities[row["id"]] = (
+            weights["votes"] * row["tally"]
+            + weights["analysis"] * _ANALYSIS.get(row["analysis__status"], 0)
+            + weights["history"] * histories.get(row["owner_id"], 0.0)
+            - weights["age"] * row["date_created"].timestamp() / age_scale
+        )
+    return priorities
+
+
+def refresh(ids: Iterable[int], using: Optional[str] = None, submissions=Submission):
+    """Recomputes and stores the priority of the given submissions"""
+    priorities = compute(ids, submissions)
+    if priorities:
+        submissions.objects.using(using).bulk_update(
+            [submissions(id=pk, priority=value) for pk, value in priorities.items()],
+            ["priority"],
+        )
+
+
+def refresh_all(using: Optional[str] = None, submissions=Submission, batch=500) -> int:
+    """Recomputes the whole queue (after changing the weights), returns its size"""
+    ids: List[int] = list(
+        submissions.objects.using(using)
+        .filter(Q(status=SubmissionStatuses.PENDING) | Q(priority__isnull=False))
+        .values_list("id", flat=True)
+    )
+    for start in range(0, len(ids), batch):
+        refresh(ids[start : start + batch], using, submissions)
+    return submissions.objects.using(using).filter(priority__isnull=False).count()
+
+
+# ---- Signal handlers that keep the priorities up to date
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Its status may have changed, and with a moderation the history of its
+    submitter"""
+    refresh([instance.pk], using)
+    moderated = {instance.loaded_status, instance.status} & set(_MODERATED)
+    if moderated and instance.loaded_status != instance.status and instance.owner_id:
+        queued = Submission.objects.using(using).filter(
+            owner_id=instance.owner_id, priority__isnull=False
+        )
+        refresh(queued.values_list("id", flat=True), using)
+
+
+@receiver(post_save, sender=Retrieval)
+@receiver(post_save, sender=Analysis)
+@receiver(post_save, sender=Moderation)
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Retrieval)
+@receiver(post_delete, sender=Analysis)
+@receiver(post_delete, sender=Moderation)
+@receiver(post_delete, sender=Vote)
+def stage_changed(sender, instance=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Fetched, analysed, moderated or voted"""
+    refresh([instance.submission_id], using)
+
+
+@receiver(submissions_changed)
+def batch_changed(sender, ids=(), previous=None, statuses=None, using=None, **kwargs):
+    # pylint: disable=unused-argument
+    """Same as submission_saved for a batch"""
+    moderated = set(_MODERATED)
+    decided = [
+        submission_id
+        for submission_id in ids
+        if previous.get(submission_id) != statuses.get(submission_id)
+        and {previous.get(submission_id), statuses.get(submission_id)} & moderated
+    ]
+    ids = set(ids)
+    if decided:
+        # (their submitters' history changed)
+        ids.update(
+            Submission.objects.using(using)
+            .filter(owner__submissions__id__in=decided, priority__isnull=False)
+            .values_list("id", flat=True)
+        )
+    refresh(ids, using)
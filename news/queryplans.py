@@ -0,0 +1,215 @@
+"""
+Query plans of the submission filters of the API (`./manage.py explain_filters`).
+
+Every filter declared in `SubmissionViewSet.filterset_fields`, alone and with
+each ordering of `ordering_fields`, plus the fixed querysets of the other list
+endpoints, is run through EXPLAIN as the page of results the API would read.
+Plans that read a whole table (a sequential scan) are flagged: those are the
+requests that get slower as the archive grows.
+
+A table scan is recognised per database:
+
+* sqlite: `SCAN <table>` without an index (`SCAN <table> USING INDEX` reads an
+  index in order, which stops after a page)
+* postgresql: `Seq Scan on <table>`; the audit runs with `enable_seqscan` off,
+  so one still in the plan means there is no index it could use
+* cockroachdb: `FULL SCAN` of a table
+
+Plans that sort the matching rows (instead of reading an index in order) are
+marked, not flagged: a sort after an index search is as large as the filter.
+
+`isnull=True` filters ask for submissions without a related row, which no index
+can answer directly; unordered they are reported as `unindexable` instead of
+flagged (they read until a page is found).
+"""
+import random
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import (
+    Analysis,
+    AnalysisStatuses,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    SubmissionStatuses,
+)
+
+# rows read by a list request (the default page size)
+PAGE = 50
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)$", re.MULTILINE)
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+_COCKROACH_SCAN = re.compile(r"table: (\w+)@\w+\s*\n\s*spans: FULL SCAN")
+_SORTS = re.compile(r"TEMP B-TREE FOR ORDER BY|\bSort\b|• sort")
+
+
+class Case(NamedTuple):
+    """A queryset whose plan is audited"""
+
+    label: str
+    queryset: QuerySet
+    # it can't avoid reading until a page is found
+    unindexable: bool = False
+
+
+class Result(NamedTuple):
+    """Plan of a case and the tables it reads in full"""
+
+    case: Case
+    plan: str
+    scans: List[str]
+
+    @property
+    def flagged(self) -> bool:
+        """Scans a table and could use an index instead"""
+        return bool(self.scans) and not self.case.unindexable
+
+    @property
+    def sorts(self) -> bool:
+        """Sorts the matching rows"""
+        return bool(_SORTS.search(self.plan))
+
+
+def _sample(field: str, lookup: str):
+    if lookup == "isnull":
+        return [True, False]
+    model = {
+        "status": Submission,
+        "moderation__status": Moderation,
+        "retrieval__status": Retrieval,
+        "analysis__status": Analysis,
+    }[field]
+    # (the value doesn't change the plan, only the estimates)
+    return [model._meta.get_field("status").choices[0][0]]
+
+
+def cases(filterset_fields: Dict[str, List[str]], ordering_fields: Iterable[str]):
+    """The filters of an API list endpoint, alone and with each ordering"""
+    orderings: List[Optional[str]] = [None]
+    for field in ordering_fields:
+        orderings += [field, f"-{field}"]
+    found = []
+    for field, lookups in filterset_fields.items():
+        for lookup in lookups:
+            for value in _sample(field, lookup):
+                for ordering in orderings:
+                    queryset = Submission.objects.filter(
+                        **{f"{field}__{lookup}": value}
+                    )
+                    label = f"{field}__{lookup}={value}"
+                    if ordering:
+                        queryset = queryset.order_by(ordering)
+                        label += f" ordering={ordering}"
+                    found.append(
+                        Case(
+                            label,
+                            queryset[:PAGE],
+                            unindexable=value is True and ordering is None,
+                        )
+                    )
+    return found
+
+
+def endpoint_cases() -> List[Case]:
+    """The declared filters of /submissions, and the fixed querysets of the
+    other lists"""
+    # pylint: disable=import-outside-toplevel
+    from .rest.views import ArticleViewSet, SubmissionViewSet
+
+    found = cases(SubmissionViewSet.filterset_fields, SubmissionViewSet.ordering_fields)
+    found += [
+        Case(f"ordering={ordering}", Submission.objects.order_by(ordering)[:PAGE])
+        for ordering in ["date_created", "-date_created"]
+    ]
+    found += [
+        Case("/articles", ArticleViewSet.queryset[:PAGE]),
+        Case(
+            "/submissions of a user",
+            Submission.objects.filter(owner_id=1).order_by("-date_created")[:PAGE],
+        ),
+        Case(
+            "/moderation/queue",
+            Submission.objects.filter(priority__isnull=False).order_by("-priority")[
+                :PAGE
+            ],
+        ),
+    ]
+    return found
+
+
+def full_scans(plan: str, vendor: str) -> List[str]:
+    """Tables the plan reads in full"""
+    pattern = {
+        "sqlite": _SQLITE_SCAN,
+        "postgresql": _POSTGRES_SCAN,
+        "cockroachdb": _COCKROACH_SCAN,
+    }.get(vendor)
+    return pattern.findall(plan) if pattern else []
+
+
+def explain(case: Case) -> Result:
+    """Plan of a case"""
+    queryset = case.queryset
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            # (only for the transaction the audit runs in)
+            cursor.execute("SET LOCAL enable_seqscan = off")
+    plan = queryset.explain()
+    return Result(case, plan, full_scans(plan, connection.vendor))
+
+
+def audit(using: str = "default") -> List[Result]:
+    """Plans of every case, run in a transaction that the caller rolls back"""
+    return [
+        explain(case._replace(queryset=case.queryset.using(using)))
+        for case in endpoint_cases()
+    ]
+
+
+def seed(count: int, using: str = "default"):
+    """Adds `count` submissions in every stage, so the planner sees a realistic
+    distribution, and refreshes the statistics of the tables"""
+    batch = timezone.now().timestamp()
+    submissions = Submission.objects.using(using).bulk_create(
+        [
+            Submission(
+                target_url=f"https://seed.example.com/{batch}/{num}",
+                status=random.choice(SubmissionStatuses.values),
+            )
+            for num in range(count)
+        ]
+    )
+    for model, statuses, share in [
+        (Retrieval, RetrievalStatuses.values, 0.9),
+        (Analysis, AnalysisStatuses.values, 0.7),
+        (Moderation, ModerationStatuses.values, 0.5),
+    ]:
+        model.objects.using(using).bulk_create(
+            [
+                model(submission=submission, status=random.choice(statuses))
+                for submission in submissions[: int(count * share)]
+            ]
+        )
+    analyze(using)
+
+
+def analyze(using: str = "default"):
+    """Refreshes the statistics the planner uses"""
+    connection = connections[using]
+    tables = [
+        model._meta.db_table for model in [Submission, Retrieval, Analysis, Moderation]
+    ]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("ANALYZE")
+            return
+        for table in tables:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
@@ -0,0 +1,114 @@
+"""
+Faster JSON rendering and parsing for the API.
+
+When `orjson` is installed it is used to render and parse request/response
+bodies; the output is the same as DRF's JSONRenderer (compact, utf-8, dates
+formatted by DRF's encoder). Without it, or for anything orjson can't handle
+(indented output, integers over 64 bits, other charsets) the stdlib versions
+are used.
+
+`StreamingJSONRenderer` is selected with `?format=json-stream`: list endpoints
+using FastListMixin then write the page in chunks of rows as they are read from
+the database, instead of building the whole page and its JSON string in memory.
+"""
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # pylint: disable=invalid-name
+
+_UTF8 = {"utf-8", "utf8"}
+_LS = "\u2028".encode()
+_PS = "\u2029".encode()
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """Same output as JSONRenderer, rendered with orjson when available"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                # dates are left to DRF's encoder, which formats them differently
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # same as JSONRenderer: strict javascript subset
+        return ret.replace(_LS, b"\\u2028").replace(_PS, b"\\u2029")
+
+
+class FastJSONParser(parsers.JSONParser):
+    """Same as JSONParser, parsed with orjson when available"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower() not in _UTF8:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
+
+
+class StreamingJSONRenderer(FastJSONRenderer):
+    """
+    Same output as FastJSONRenderer. Views that know about it (`streaming = True`)
+    can use `stream_list` to produce the response body in chunks.
+    """
+
+    format = "json-stream"
+    streaming = True
+    # rows per chunk, also the chunk size used when reading from the database
+    chunk_size = 100
+
+    def _fragment(self, data: Any, renderer_context) -> bytes:
+        return self.render(data, self.media_type, renderer_context)
+
+    def stream_list(
+        self,
+        rows: Iterable[Any],
+        serialize,
+        envelope: Optional[Dict[str, Any]] = None,
+        renderer_context=None,
+    ) -> Iterator[bytes]:
+        """
+        Yields the JSON of `serialize(chunk)` for each chunk of `rows`, as one
+        array. If an `envelope` is given (eg. count/next/previous of a page) the
+        array goes in its "results" key.
+        """
+        if envelope is not None:
+            head = self._fragment(envelope, renderer_context)
+            # '{"count":1}' -> '{"count":1,"results":['
+            yield head[:-1] + (b',"results":[' if len(head) > 2 else b'"results":[')
+        else:
+            yield b"["
+
+        iterator = iter(rows)
+        first = True
+        while True:
+            chunk: List[Any] = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                break
+            items = self._fragment(serialize(chunk), renderer_context)[1:-1]
+            if items:
+                yield items if first else b"," + items
+                first = False
+
+        yield b"]}" if envelope is not None else b"]"
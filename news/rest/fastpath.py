@@ -0,0 +1,408 @@
+""" Fast-path serialization for the list endpoints
+
+Regular serializers build a full DRF representation per row, then NonNullModelSerializer
+rebuilds it to drop nulls, and ArticleSerializer adds six method fields on top.
+For list responses we don't need any of the machinery: rows are projected with
+`.values()` and turned into plain dicts by a list of accessors that is prepared
+once per request (hyperlinks are reversed once and then only formatted).
+
+The output must be byte-identical to the one of the regular serializers, see
+test_fastpath.py and `./manage.py benchmark_serializers`.
+
+With `?format=json-stream` (fastjson.StreamingJSONRenderer) the page is streamed:
+rows are read and serialized in chunks while the response is being sent.
+"""
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from dogauth import permissions
+from ..fingerprint import near_duplicates
+from ..models import Retrieval, Vote
+from ..urlcache import url_for_name
+
+Accessor = Callable[[Dict[str, Any]], Any]
+
+# a pk that can't appear anywhere else in a url
+_SENTINEL = "918273645091827364"
+
+# same as ArticleSerializer.get_thumbnail
+DEFAULT_THUMBNAIL = "https://onlydognews.com/gfx/site/onlydognews-logo-main.png"
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+def _link(request, view_name: str, lookup_url_kwarg: str) -> Callable[[Any], str]:
+    """Returns a function that gives the same urls as a HyperlinkedIdentityField
+    for the view, reversing it only once"""
+    url = reverse(view_name, kwargs={lookup_url_kwarg: _SENTINEL}, request=request)
+    prefix, suffix = url.rsplit(_SENTINEL, 1)
+    return lambda pk: f"{prefix}{pk}{suffix}"
+
+
+def _username_masking_admins(username: Optional[str], is_superuser: bool) -> str:
+    """Same as serializers._username_masking_admins for projected rows"""
+    if username is None or is_superuser:
+        return "admin"
+    return username
+
+
+def _first(*values: Optional[str]) -> Optional[str]:
+    for value in values:
+        if value:
+            return value
+    return None
+
+
+def _non_null(fields: List[Tuple[str, Accessor]], row: Dict[str, Any]) -> dict:
+    """Same filtering as NonNullModelSerializer"""
+    result = {}
+    for name, accessor in fields:
+        value = accessor(row)
+        if value is not None and value != "":
+            result[name] = value
+    return result
+
+
+def _datetime_of(column: str) -> Accessor:
+    get = itemgetter(column)
+    return lambda row: _datetime(get(row))
+
+
+class FastSerializer:
+    """Base class: `columns` are projected with .values(), `compile` returns the
+    list of (field name, accessor) for the current request"""
+
+    columns: List[str] = []
+    # database of the projected queryset, for the extra queries of a page
+    using = DEFAULT_DB_ALIAS
+
+    def __init__(self, context: dict):
+        self.context = context
+        self.request = context.get("request")
+        self.fields = self.compile()
+
+    def compile(self) -> List[Tuple[str, Accessor]]:
+        """Prepares the accessors of the output fields, in order"""
+        raise NotImplementedError()
+
+    def project(self, queryset):
+        """Projects a queryset of models into the columns needed"""
+        self.using = queryset.db
+        return queryset.values(*self.columns)
+
+    def serialize(self, rows: Iterable[Dict[str, Any]]) -> List[dict]:
+        """Representation of a list (page) of projected rows"""
+        fields = self.fields
+        return [_non_null(fields, row) for row in rows]
+
+    def _image(self, column: str, field_name: str) -> Accessor:
+        """Same as CachedImageField for a projected column"""
+        storage = Retrieval._meta.get_field(field_name).storage
+        get = itemgetter(column)
+        request = self.request
+
+        def accessor(row):
+            url = url_for_name(storage, get(row))
+            if url and request is not None:
+                return request.build_absolute_uri(url)
+            return url or None
+
+        return accessor
+
+
+_THUMBNAIL_FIELDS = [
+    "thumbnail_processed",
+    "thumbnail_submitted",
+    "thumbnail_from_page",
+]
+
+
+class ArticleFastSerializer(FastSerializer):
+    """Same output as ArticleSerializer"""
+
+    columns = [
+        "id",
+        "status",
+        "target_url",
+        "title",
+        "description",
+        "last_updated",
+        "date_created",
+        "owner__username",
+        "owner__is_superuser",
+        "moderation__title",
+        "moderation__description",
+        "moderation__owner__username",
+        "moderation__owner__is_superuser",
+        "retrieval__title",
+        "retrieval__description",
+    ] + [f"retrieval__{name}" for name in _THUMBNAIL_FIELDS]
+
+    def compile(self):
+        url = _link(self.request, "submission-detail", "pk")
+        thumbnails = [
+            self._image(f"retrieval__{name}", name) for name in _THUMBNAIL_FIELDS
+        ]
+        columns = [itemgetter(f"retrieval__{name}") for name in _THUMBNAIL_FIELDS]
+
+        def thumbnail(row):
+            for column, image in zip(columns, thumbnails):
+                if column(row):
+                    return image(row)
+            return DEFAULT_THUMBNAIL
+
+        return [
+            ("url", lambda row: url(row["id"])),
+            ("status", itemgetter("status")),
+            ("target_url", itemgetter("target_url")),
+            (
+                "title",
+                lambda row: _first(
+                    row["moderation__title"], row["retrieval__title"], row["title"]
+                ),
+            ),
+            (
+                "description",
+                lambda row: _first(
+                    row["moderation__description"],
+                    row["retrieval__description"],
+                    row["description"],
+                ),
+            ),
+            ("thumbnail", thumbnail),
+            ("last_updated", _datetime_of("last_updated")),
+            ("date_created", _datetime_of("date_created")),
+            (
+                "submitter",
+                lambda row: _username_masking_admins(
+                    row["owner__username"], row["owner__is_superuser"]
+                ),
+            ),
+            (
+                "approver",
+                lambda row: _username_masking_admins(
+                    row["moderation__owner__username"],
+                    row["moderation__owner__is_superuser"],
+                ),
+            ),
+        ]
+
+
+class SubmissionFastSerializer(FastSerializer):
+    """Same output as SubmissionSerializer, including nested retrieval, moderation,
+    votes and duplicates (fetched with a few extra queries per page)"""
+
+    columns = [
+        "id",
+        "target_url",
+        "status",
+        "owner_id",
+        "title",
+        "description",
+        "date",
+        "retrieval__submission_id",
+        "retrieval__status",
+        "retrieval__owner_id",
+        "retrieval__title",
+        "retrieval__description",
+        "retrieval__fetched_page",
+        "retrieval__last_updated",
+        "retrieval__date_created",
+        "moderation__submission_id",
+        "moderation__target_url",
+        "moderation__status",
+        "moderation__owner_id",
+        "moderation__title",
+        "moderation__description",
+        "moderation__last_updated",
+        "moderation__date_created",
+    ] + [f"retrieval__{name}" for name in _THUMBNAIL_FIELDS]
+
+    vote_columns = [
+        "id",
+        "submission_id",
+        "owner_id",
+        "value",
+        "last_updated",
+        "date_created",
+    ]
+
+    def compile(self):
+        url = _link(self.request, "submission-detail", "pk")
+        user_url = _link(self.request, "user-detail", "pk")
+        retrieval = self._compile_retrieval()
+        moderation = self._compile_moderation()
+
+        def owner(row):
+            return None if row["owner_id"] is None else user_url(row["owner_id"])
+
+        def nested(fields, key):
+            return lambda row: None if row[key] is None else _non_null(fields, row)
+
+        return [
+            ("id", itemgetter("id")),
+            ("url", lambda row: url(row["id"])),
+            ("target_url", itemgetter("target_url")),
+            ("status", itemgetter("status")),
+            ("owner", owner),
+            ("title", itemgetter("title")),
+            ("description", itemgetter("description")),
+            ("date", _datetime_of("date")),
+            ("retrieval", nested(retrieval, "retrieval__submission_id")),
+            ("moderation", nested(moderation, "moderation__submission_id")),
+            ("votes", itemgetter("votes")),
+            ("duplicates", itemgetter("duplicates")),
+        ]
+
+    def _compile_retrieval(self):
+        url = _link(self.request, "submission-fetch", "submission_pk")
+        images = {
+            name: self._image(f"retrieval__{name}", name) for name in _THUMBNAIL_FIELDS
+        }
+        columns = [itemgetter(f"retrieval__{name}") for name in _THUMBNAIL_FIELDS]
+
+        def thumbnail(row):
+            # RetrievalSerializer.get_thumbnail
+            for column, name in zip(columns, _THUMBNAIL_FIELDS):
+                if column(row):
+                    return images[name](row)
+            return ""
+
+        return [
+            ("url", lambda row: url(row["retrieval__submission_id"])),
+            ("status", itemgetter("retrieval__status")),
+            ("owner", itemgetter("retrieval__owner_id")),
+            ("title", itemgetter("retrieval__title")),
+            ("description", itemgetter("retrieval__description")),
+            ("thumbnail", thumbnail),
+            ("fetched_page", itemgetter("retrieval__fetched_page")),
+            ("last_updated", _datetime_of("retrieval__last_updated")),
+            ("date_created", _datetime_of("retrieval__date_created")),
+            ("thumbnail_from_page", images["thumbnail_from_page"]),
+            ("thumbnail_submitted", images["thumbnail_submitted"]),
+            ("thumbnail_processed", images["thumbnail_processed"]),
+        ]
+
+    def _compile_moderation(self):
+        url = _link(self.request, "submission-moderation", "submission_pk")
+        return [
+            ("url", lambda row: url(row["moderation__submission_id"])),
+            ("target_url", itemgetter("moderation__target_url")),
+            ("status", itemgetter("moderation__status")),
+            ("owner", itemgetter("moderation__owner_id")),
+            ("title", itemgetter("moderation__title")),
+            ("description", itemgetter("moderation__description")),
+            ("last_updated", _datetime_of("moderation__last_updated")),
+            ("date_created", _datetime_of("moderation__date_created")),
+        ]
+
+    def _compile_vote(self):
+        # VoteSerializer.get_fields: non moderators only see the value
+        if self.request is not None and not permissions.is_moderator(self.request):
+            return [("value", itemgetter("value"))]
+        # (ModelSerializer puts relations after the other fields)
+        return [
+            ("id", itemgetter("id")),
+            ("value", itemgetter("value")),
+            ("last_updated", _datetime_of("last_updated")),
+            ("date_created", _datetime_of("date_created")),
+            ("submission", itemgetter("submission_id")),
+            ("owner", itemgetter("owner_id")),
+        ]
+
+    def serialize(self, rows):
+        rows = list(rows)
+        votes: Dict[int, List[dict]] = {row["id"]: [] for row in rows}
+        if votes:
+            vote_fields = self._compile_vote()
+            for vote in (
+                Vote.objects.using(self.using)
+                .filter(submission_id__in=list(votes))
+                .order_by("id")
+                .values(*self.vote_columns)
+            ):
+                votes[vote["submission_id"]].append(_non_null(vote_fields, vote))
+        duplicates = near_duplicates(votes, self.using) if votes else {}
+        for row in rows:
+            row["votes"] = votes[row["id"]]
+            row["duplicates"] = duplicates[row["id"]]
+        return super().serialize(rows)
+
+
+class FastListMixin:
+    """Viewset mixin: list responses use `fast_serializer_class` instead of the
+    regular serializer, unless settings.NEWS_FAST_SERIALIZERS is False"""
+
+    fast_serializer_class = None
+
+    def get_fast_serializer(self) -> Optional[FastSerializer]:
+        """The fast serializer for this request, None if it's not enabled"""
+        if self.fast_serializer_class is None or not getattr(
+            settings, "NEWS_FAST_SERIALIZERS", True
+        ):
+            return None
+        return self.fast_serializer_class(self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        """Same as ListModelMixin.list, with the fast serializer"""
+        fast = self.get_fast_serializer()
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = fast.project(self.filter_queryset(self.get_queryset()))
+
+        if getattr(request.accepted_renderer, "streaming", False):
+            response = self._stream(fast, queryset)
+            if response is not None:
+                return response
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize(page))
+        return Response(fast.serialize(queryset))
+
+    def _stream(self, fast: FastSerializer, queryset):
+        """Same as `list` but the rows are read, serialized and sent in chunks.
+        Returns None for paginators it doesn't know about"""
+        request = self.request
+        paginator = self.paginator
+        envelope = None
+        if paginator is not None:
+            if not isinstance(paginator, LimitOffsetPagination):
+                return None
+            # LimitOffsetPagination.paginate_queryset without reading the page
+            paginator.request = request
+            paginator.limit = paginator.get_limit(request)
+            if paginator.limit is not None:
+                paginator.count = paginator.get_count(queryset)
+                paginator.offset = paginator.get_offset(request)
+                if paginator.count == 0 or paginator.offset > paginator.count:
+                    queryset = queryset.none()
+                else:
+                    queryset = queryset[
+                        paginator.offset : paginator.offset + paginator.limit
+                    ]
+                envelope = {
+                    "count": paginator.count,
+                    "next": paginator.get_next_link(),
+                    "previous": paginator.get_previous_link(),
+                }
+
+        renderer = request.accepted_renderer
+        return StreamingHttpResponse(
+            renderer.stream_list(
+                queryset.iterator(chunk_size=renderer.chunk_size),
+                fast.serialize,
+                envelope,
+                self.get_renderer_context(),
+            ),
+            content_type=renderer.media_type,
+        )
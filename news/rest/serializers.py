@@ -4,10 +4,14 @@ These transform models into various representations
 from collections import OrderedDict
 from dogauth.models import User
 from typing import Any, List
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.db import models
+from django.db.models.fields.files import FieldFile
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
+from rest_framework.settings import api_settings
 from rest_framework.validators import UniqueValidator
 from drf_spectacular.utils import (
     extend_schema,
@@ -16,7 +20,9 @@ from drf_spectacular.utils import (
 )
 from drf_spectacular.types import OpenApiTypes
 from dogauth import permissions
-from ..models import Retrieval, Moderation, Submission, Vote
+from ..fingerprint import near_duplicates
+from ..models import ModerationStatuses, Retrieval, Moderation, Submission, Vote
+from ..urlcache import storage_url
 
 # pylint: disable=missing-class-docstring
 
@@ -25,11 +31,38 @@ from ..models import Retrieval, Moderation, Submission, Vote
 # not remove them
 
 
+def _absolute_storage_url(file: FieldFile, request) -> str:
+    """Url of a stored file, made absolute if there's a request to take the host from"""
+    url = storage_url(file)
+    if url and request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class CachedImageField(serializers.ImageField):
+    """Same output as the default ImageField but urls are obtained through
+    the url cache instead of calling storage.url() for every row"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        if not getattr(self, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+            return value.name
+        url = _absolute_storage_url(value, self.context.get("request", None))
+        return url or None
+
+
 class NonNullModelSerializer(serializers.ModelSerializer):
     """Any field that has a value of null _or_ empty string in the output json
     will be removed
     """
 
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: CachedImageField,
+    }
+
     def to_representation(self, instance):
         result = super().to_representation(instance)
         #  see discussion https://stackoverflow.com/a/45569581
@@ -115,10 +148,54 @@ class ModerationSerializer(NonNullModelSerializer):
             "date_created",
         ]
 
+    # moderations are only exposed nested in their submission
+    url = serializers.HyperlinkedIdentityField(
+        view_name="submission-moderation",
+        lookup_field="submission_id",
+        lookup_url_kwarg="submission_pk",
+    )
+
 
 # --------------------------------------
 
 
+class BulkModerationItemSerializer(serializers.Serializer):
+    """Decision on one submission of a batch, with optional overrides of the
+    fetched title and description"""
+
+    # pylint: disable=abstract-method
+
+    submission = serializers.IntegerField()
+    status = serializers.ChoiceField(
+        choices=[ModerationStatuses.ACCEPTED, ModerationStatuses.REJECTED]
+    )
+    title = serializers.CharField(
+        max_length=Moderation._meta.get_field("title").max_length,
+        required=False,
+        allow_null=True,
+    )
+    description = serializers.CharField(
+        max_length=Moderation._meta.get_field("description").max_length,
+        required=False,
+        allow_null=True,
+    )
+
+
+class BulkModerationSerializer(serializers.Serializer):
+    """A batch of moderations, see news/bulk.py"""
+
+    # pylint: disable=abstract-method
+
+    items = BulkModerationItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        """At most NEWS_BULK_MODERATION_MAX items"""
+        limit = getattr(settings, "NEWS_BULK_MODERATION_MAX", 500)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} items per batch")
+        return value
+
+
 class RetrievalSerializer(NonNullModelSerializer):
     """The result of a bot retrieving the information"""
 
@@ -149,6 +226,12 @@ class RetrievalSerializer(NonNullModelSerializer):
             "date_created",
         ]
 
+    # retrievals are only exposed nested in their submission
+    url = serializers.HyperlinkedIdentityField(
+        view_name="submission-fetch",
+        lookup_field="submission_id",
+        lookup_url_kwarg="submission_pk",
+    )
     thumbnail = serializers.SerializerMethodField()
 
     # https://drf-spectacular.readthedocs.io/en/latest/customization.html#step-3-extend-schema-field-and-type-hints
@@ -162,10 +245,11 @@ class RetrievalSerializer(NonNullModelSerializer):
         """return the most specific thumbnail available: the one parsed by the system,
         the one submitted by the user or the one extracted from the page - depending on
         the state of the submission."""
-        return (
+        return _absolute_storage_url(
             obj.thumbnail_processed
             or obj.thumbnail_submitted
-            or obj.thumbnail_from_page
+            or obj.thumbnail_from_page,
+            self.context.get("request", None),
         )
 
 
@@ -226,13 +310,39 @@ class VoteSerializer(NonNullModelSerializer):
 # --------------------------------------
 
 
+class SubmissionListSerializer(serializers.ListSerializer):
+    """Lists of submissions: the near-duplicates of the whole page are looked
+    up at once, instead of with a query per submission"""
+
+    def to_representation(self, data):
+        submissions = list(
+            data.all() if isinstance(data, models.manager.BaseManager) else data
+        )
+        self.child.duplicates_of_page = (
+            near_duplicates(
+                [submission.pk for submission in submissions],
+                submissions[0]._state.db,
+            )
+            if submissions
+            else {}
+        )
+        try:
+            return super().to_representation(submissions)
+        finally:
+            self.child.duplicates_of_page = None
+
+
 class SubmissionSerializer(
     NonNullModelSerializer, serializers.HyperlinkedModelSerializer
 ):
     """A submission object that is in initial processing"""
 
+    # (set by SubmissionListSerializer)
+    duplicates_of_page = None
+
     class Meta:
         model = Submission
+        list_serializer_class = SubmissionListSerializer
         fields = [
             "id",
             "url",
@@ -245,6 +355,7 @@ class SubmissionSerializer(
             "retrieval",
             "moderation",
             "votes",
+            "duplicates",
         ]
         read_only_fields = [
             "owner",
@@ -266,6 +377,13 @@ class SubmissionSerializer(
     votes = serializers.ListSerializer(
         child=VoteSerializer(), required=False, allow_empty=True, allow_null=True
     )
+    duplicates = SerializerMethodField()
+
+    def get_duplicates(self, obj: Submission) -> List[int]:
+        """Ids of near-duplicate submissions (news/fingerprint.py)"""
+        if self.duplicates_of_page is not None and obj.pk in self.duplicates_of_page:
+            return self.duplicates_of_page[obj.pk]
+        return near_duplicates([obj.pk], obj._state.db)[obj.pk]
 
 
 # --------------------------------------
@@ -314,14 +432,17 @@ class ArticleSerializer(NonNullModelSerializer):
 
     def get_thumbnail(self, sub: Submission) -> str:
         retrieval: Retrieval = sub.retrieval
-        return _first(
+        thumbnail = _first(
             [
                 retrieval.thumbnail_processed,
                 retrieval.thumbnail_submitted,
                 retrieval.thumbnail_from_page,
             ],
-            "https://onlydognews.com/gfx/site/onlydognews-logo-main.png",
+            None,
         )
+        if thumbnail:
+            return _absolute_storage_url(thumbnail, self.context.get("request", None))
+        return "https://onlydognews.com/gfx/site/onlydognews-logo-main.png"
 
     def get_description(self, sub: Submission) -> str:
         values = [
@@ -2,22 +2,29 @@
 Exposed API for handling news, publicly published, restricted
 by auth
 """
+from contextlib import ExitStack
 from typing import Any
 
 from PIL import Image
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.db import transaction
 from django.http.response import JsonResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_cookie, vary_on_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from dogauth.permissions import (
+    DjangoModelPermissions,
+    has_perm,
+    is_moderator_or_staff,
     IsAuthenticated,
     IsOwnerOrModeratorOrStaff,
     IsOwnerOrStaff,
 )
+from dogauth.roles import roles_for
 from rest_framework import (
     filters,
     mixins,
@@ -25,12 +32,15 @@ from rest_framework import (
     viewsets,
     views,
     parsers,
+    renderers,
     status,
 )
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.generics import GenericAPIView
+from rest_framework.settings import api_settings
 from drf_spectacular.utils import (
     extend_schema,
     extend_schema_field,
@@ -38,10 +48,22 @@ from drf_spectacular.utils import (
     OpenApiParameter,
 )
 from drf_spectacular.types import OpenApiTypes
-
-from ..models import User, Retrieval, Moderation, Submission, Vote
+from dognews import replicas
+
+from .. import bulk, changes, events, search
+from ..models import (
+    User,
+    Retrieval,
+    Moderation,
+    Submission,
+    SubmissionStatuses,
+    Vote,
+)
+from .fastjson import FastJSONParser
+from .fastpath import ArticleFastSerializer, FastListMixin, SubmissionFastSerializer
 from .serializers import (
     ArticleSerializer,
+    BulkModerationSerializer,
     RetrievalSerializer,
     RetrievalThumbnailImageSerializer,
     GroupSerializer,
@@ -57,15 +79,72 @@ from .serializers import (
 # --------------------------
 
 
+class ReplicaReadMixin:
+    """
+    Viewset mixin: the querysets of `replica_actions` are read from a replica of
+    the database (dognews/replicas.py), unless the user changed something
+    recently. Viewsets that override get_queryset must start from super()'s.
+
+    The reads of `follower_read_actions` are also follower reads, on
+    CockroachDB with DATABASE_FOLLOWER_READS: the view runs in a transaction as
+    of a few seconds ago. (Streamed lists read their rows after it ends, as
+    usual)
+    """
+
+    replica_actions = ("list", "search")
+    follower_read_actions = ()
+
+    def read_alias(self) -> str:
+        """Database the reads of this request use (chosen once per request)"""
+        if getattr(self, "_read_alias", None) is None:
+            self._read_alias = replicas.read_alias(self.request)
+        return self._read_alias
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.replica_actions:
+            return queryset.using(self.read_alias())
+        return queryset
+
+    def dispatch(self, request, *args, **kwargs):
+        # (the follower read transaction, if `initial` opens one, ends with the
+        # request however it ends)
+        with ExitStack() as self._follower_reads:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._follower_read = False
+        if (
+            self.action in self.follower_read_actions
+            and request.method in permissions.SAFE_METHODS
+            and not replicas.wrote_recently(request.user)
+        ):
+            self._follower_read = self._follower_reads.enter_context(
+                replicas.follower_reads(self.read_alias())
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, "_follower_read", False) and response.exception:
+            transaction.set_rollback(True, using=self.read_alias())
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
 class UserViewSet(
-    mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = get_user_model().objects.filter(is_staff=True).order_by("-date_joined")
     serializer_class = UserSerializer
 
 
 class GroupViewSet(
-    mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Group.objects.filter(name__startswith="news_")
     serializer_class = GroupSerializer
@@ -74,7 +153,58 @@ class GroupViewSet(
 # ---------------------------
 
 
-class SubmissionViewSet(viewsets.ModelViewSet):
+class SearchMixin:
+    """
+    Adds `<list url>/search?q=words` to a FastListMixin viewset: results from the
+    full text index (news/search.py), best matches first, paginated as the list
+    """
+
+    # only submissions in this status are searched (None: all of them)
+    search_status = None
+
+    def search_allowed(self, request) -> bool:
+        """Whether the user of the request can search"""
+        return True
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("q", OpenApiTypes.STR, required=True),
+        ]
+    )
+    @action(detail=False, methods=["get"])
+    def search(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """Full text search, prefix matching of each word"""
+        if not self.search_allowed(request):
+            raise PermissionDenied()
+        queryset = self.get_queryset()
+        ids = search.search(
+            request.query_params.get("q", ""),
+            status=self.search_status,
+            limit=getattr(settings, "NEWS_SEARCH_MAX_RESULTS", 500),
+            using=queryset.db,
+        )
+        page = self.paginate_queryset(ids)
+        if page is not None:
+            ids = page
+        position = {pk: num for num, pk in enumerate(ids)}
+        queryset = queryset.filter(id__in=ids)
+
+        fast = self.get_fast_serializer()
+        if fast is not None:
+            rows = sorted(fast.project(queryset), key=lambda row: position[row["id"]])
+            data = fast.serialize(rows)
+        else:
+            items = sorted(queryset, key=lambda item: position[item.id])
+            data = self.get_serializer(items, many=True).data
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class SubmissionViewSet(
+    ReplicaReadMixin, SearchMixin, FastListMixin, viewsets.ModelViewSet
+):
     """
     Submitted articles for review
     """
@@ -82,11 +212,12 @@ class SubmissionViewSet(viewsets.ModelViewSet):
     permission_classes = [
         IsAuthenticated,
         IsOwnerOrStaff,
-        permissions.DjangoModelPermissions,
+        DjangoModelPermissions,
     ]
 
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
+    fast_serializer_class = SubmissionFastSerializer
 
     def get_queryset(self):
         """
@@ -94,15 +225,18 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         or staff or an admin then it returns for all users
         """
         user = self.request.user
+        roles = roles_for(self.request)
+        queryset = super().get_queryset()
         if (
-            user.is_staff
-            or user.is_superuser
-            or user.has_perm(
+            roles.is_staff
+            or roles.is_superuser
+            or roles.has_perm(
                 f"{Moderation._meta.app_label}.view_{Moderation._meta.model_name}"
             )
         ):
-            return Submission.objects.all()
-        return Submission.objects.filter(owner=user)
+            return queryset
+        # by id: for read-only requests user may be a lightweight token user
+        return queryset.filter(owner_id=user.pk)
 
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     # Allow /submissions?ordering=date_created
@@ -117,6 +251,10 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         "analysis__status": ["exact", "isnull"],
     }
 
+    def search_allowed(self, request) -> bool:
+        # the whole archive, including rejected submissions
+        return is_moderator_or_staff(request)
+
     def perform_create(self, serializer):
         # add current user if missing
         serializer.save(owner=self.request.user)
@@ -128,7 +266,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
 # ---------------------------
 
 
-class ModerationViewSet(viewsets.ModelViewSet):
+class ModerationViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     Moderation attached to a submission
     """
@@ -136,11 +274,13 @@ class ModerationViewSet(viewsets.ModelViewSet):
     permission_classes = [
         IsAuthenticated,
         IsOwnerOrStaff,
-        permissions.DjangoModelPermissions,
+        DjangoModelPermissions,
     ]
 
     queryset = Moderation.objects.all()
     serializer_class = ModerationSerializer
+    # get_object can create the moderation owned by the user
+    requires_db_user = True
 
     def get_queryset(self):
         """
@@ -148,9 +288,11 @@ class ModerationViewSet(viewsets.ModelViewSet):
         them it returns for all users
         """
         user = self.request.user
-        if user.is_staff or user.is_superuser:
-            return Moderation.objects.all()
-        return Moderation.objects.filter(owner=user)
+        roles = roles_for(self.request)
+        queryset = super().get_queryset()
+        if roles.is_staff or roles.is_superuser:
+            return queryset
+        return queryset.filter(owner_id=user.pk)
 
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     # Allow /submissions?ordering=date_created
@@ -178,7 +320,104 @@ class ModerationViewSet(viewsets.ModelViewSet):
         return super().get_object()
 
 
-class RetrievalViewSet(viewsets.ModelViewSet):
+class ModerationBulkView(GenericAPIView):
+    """
+    Accepts or rejects many submissions in one transaction, optionally
+    overriding their titles and descriptions: see news/bulk.py. For moderators
+    and staff. Returns the new status of each submission, or why it couldn't be
+    moderated
+    """
+
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    queryset = Moderation.objects.all()
+    serializer_class = BulkModerationSerializer
+    # moderations are created owned by the user
+    requires_db_user = True
+
+    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """Moderate a batch"""
+        if not is_moderator_or_staff(request) or not has_perm(
+            request, "news.change_moderation"
+        ):
+            raise PermissionDenied()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk.moderate(serializer.validated_data["items"], request.user)
+        return Response({"results": results})
+
+
+class ModerationQueueViewSet(
+    ReplicaReadMixin, FastListMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
+    """
+    Submissions waiting for a moderator (pending, fetched, not moderated), most
+    urgent first: see news/priority.py. For moderators and staff
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = SubmissionSerializer
+    fast_serializer_class = SubmissionFastSerializer
+    # (read in the order of the partial index on priority)
+    queryset = Submission.objects.filter(priority__isnull=False).order_by("-priority")
+
+    def get_queryset(self):
+        if not is_moderator_or_staff(self.request):
+            raise PermissionDenied()
+        return super().get_queryset()
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """Accepts `text/event-stream`, for views that return their own stream. Other
+    responses (errors) are rendered as JSON"""
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return renderers.JSONRenderer().render(data)
+
+
+class ModerationEventsView(views.APIView):
+    """
+    Lifecycle events of submissions (created, fetched, analysed, moderated), for
+    moderators and staff. With `Accept: text/event-stream` they are sent as
+    server-sent events; otherwise as JSON, waiting up to `wait` seconds for some.
+    Without a cursor (`Last-Event-ID` or `since`) only new events are sent.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("since", OpenApiTypes.INT),
+            OpenApiParameter("wait", OpenApiTypes.NUMBER),
+        ]
+    )
+    def get(self, request: Request, *args: Any, **kwargs: Any):
+        """Events after a cursor"""
+        if not is_moderator_or_staff(request):
+            raise PermissionDenied()
+        cursor = request.headers.get("Last-Event-ID") or request.query_params.get(
+            "since"
+        )
+        try:
+            sequence = events.latest() if cursor is None else int(cursor)
+            wait = float(request.query_params.get("wait", 0))
+        except ValueError as exc:
+            raise ValidationError("Invalid since/wait") from exc
+
+        if request.accepted_renderer.format == EventStreamRenderer.format:
+            return events.EventStreamResponse(sequence)
+        found = events.wait_for(
+            sequence, min(wait, getattr(settings, "NEWS_EVENTS_LONG_POLL", 20))
+        )
+        return Response(
+            {"cursor": found[-1]["id"] if found else sequence, "events": found}
+        )
+
+
+class RetrievalViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     Retrieve results attached to a submission
     """
@@ -186,17 +425,19 @@ class RetrievalViewSet(viewsets.ModelViewSet):
     parser_classes = [
         parsers.MultiPartParser,
         parsers.FormParser,
-        parsers.JSONParser,
+        FastJSONParser,
         parsers.FileUploadParser,
     ]
     permission_classes = [
         IsAuthenticated,
         IsOwnerOrStaff,
-        permissions.DjangoModelPermissions,
+        DjangoModelPermissions,
     ]
 
     queryset = Retrieval.objects.all()
     serializer_class = RetrievalSerializer
+    # get_object can create the retrieval owned by the user
+    requires_db_user = True
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     ordering_fields = ["date_created"]
     filterset_fields = ["status"]
@@ -253,10 +494,11 @@ class RetrievalThumbnailUploadView(GenericAPIView):
     permission_classes = [
         IsAuthenticated,
         IsOwnerOrStaff,
-        permissions.DjangoModelPermissions,
+        DjangoModelPermissions,
     ]
     queryset = Retrieval.objects.all()
     serializer_class = RetrievalThumbnailImageSerializer
+    requires_db_user = True
 
     def get_object(self) -> Retrieval:
         if "pk" not in self.kwargs:
@@ -292,7 +534,10 @@ class RetrievalThumbnailUploadView(GenericAPIView):
 
 
 class SubmissionVoteViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     """
     Vote management /submissions/(id)/votes (get, post)
@@ -303,7 +548,7 @@ class SubmissionVoteViewSet(
     permission_classes = [
         IsAuthenticated,
         IsOwnerOrModeratorOrStaff,
-        permissions.DjangoModelPermissions,
+        DjangoModelPermissions,
     ]
 
     def perform_create(self, serializer):
@@ -323,7 +568,12 @@ class SubmissionVoteViewSet(
 
 
 class ArticleViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin,
+    SearchMixin,
+    FastListMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     """
     Final accepted articles, read only view.
@@ -331,8 +581,14 @@ class ArticleViewSet(
     """
 
     serializer_class = ArticleSerializer
+    fast_serializer_class = ArticleFastSerializer
 
     queryset = Submission.objects.filter(status="accepted").order_by("-date_created")
+    search_status = SubmissionStatuses.ACCEPTED
+    # (not changes: its log is read from the primary, and so are its articles)
+    replica_actions = ("list", "retrieve", "search")
+    # (public and cached for two minutes anyway: a few seconds stale is fine)
+    follower_read_actions = ("list", "retrieve", "search")
 
     @method_decorator(cache_page(60 * 2))
     @method_decorator(vary_on_cookie)
@@ -353,3 +609,72 @@ class ArticleViewSet(
     )
     def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         return super().retrieve(request, *args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("since", OpenApiTypes.STR),
+            OpenApiParameter("limit", OpenApiTypes.INT),
+        ]
+    )
+    @action(detail=False, methods=["get"])
+    def changes(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Articles created, updated or unpublished after a cursor (all of them
+        without one), in the order they changed. Each article appears once,
+        with its current contents unless it was unpublished. Pass the returned
+        `cursor` next time; `more` means there are changes after it.
+        """
+        try:
+            sequence = changes.decode_cursor(request.query_params.get("since"))
+        except ValueError as exc:
+            raise ValidationError({"since": str(exc)}) from exc
+        maximum = getattr(settings, "NEWS_CHANGES_MAX_RESULTS", 500)
+        try:
+            limit = min(int(request.query_params.get("limit", maximum)), maximum)
+        except ValueError as exc:
+            raise ValidationError({"limit": "Must be a number"}) from exc
+        if limit < 1:
+            raise ValidationError({"limit": "Must be positive"})
+
+        log = changes.since(sequence, limit + 1)
+        more = len(log) > limit
+        log = log[:limit]
+
+        queryset = self.get_queryset().filter(
+            id__in=[change.submission_id for change in log if not change.unpublished]
+        )
+        fast = self.get_fast_serializer()
+        if fast is not None:
+            rows = list(fast.project(queryset))
+            articles = dict(zip([row["id"] for row in rows], fast.serialize(rows)))
+        else:
+            articles = dict(
+                zip(
+                    [item.id for item in queryset],
+                    self.get_serializer(queryset, many=True).data,
+                )
+            )
+
+        results = []
+        for change in log:
+            article = articles.get(change.submission_id)
+            if article is None:
+                # unpublished after the log was read
+                results.append(
+                    {"id": change.submission_id, "change": changes.UNPUBLISHED}
+                )
+            else:
+                results.append(
+                    {
+                        "id": change.submission_id,
+                        "change": changes.kind(change, sequence),
+                        "article": article,
+                    }
+                )
+        return Response(
+            {
+                "cursor": changes.encode_cursor(log[-1].sequence if log else sequence),
+                "more": more,
+                "results": results,
+            }
+        )
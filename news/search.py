@@ -0,0 +1,292 @@
+"""
+Full-text search over submissions.
+
+Each submission has one document in an inverted index with four weighted parts:
+titles, descriptions, the url and the text of the fetched page. Which index
+depends on the database:
+
+* sqlite: an FTS5 virtual table (`news_search`), ranked with bm25
+* postgresql/cockroachdb: a table with a weighted tsvector and a GIN (inverted)
+  index, ranked with ts_rank
+* anything else: no index, `icontains` over the submission columns, newest first
+
+Every term of a query matches as a prefix ("dog" finds "doggo"), all terms must
+match. Documents are updated as part of the same transaction whenever a
+submission, its retrieval or its moderation are saved; `./manage.py
+rebuild_search_index` rebuilds the whole index.
+"""
+import re
+from typing import Iterable, List, Optional
+
+from django.db import connections, models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+
+from .models import Moderation, Retrieval, Submission
+from .signals import submissions_changed
+
+TABLE = "news_search"
+
+# query terms beyond this are ignored
+_MAX_TERMS = 10
+
+# text search configuration for tsvector
+_PG_CONFIG = "english"
+
+_DOCUMENT_COLUMNS = [
+    "id",
+    "title",
+    "description",
+    "target_url",
+    "moderation__title",
+    "moderation__description",
+    "retrieval__title",
+    "retrieval__description",
+    "retrieval__fetched_page",
+]
+
+
+def _join(*values: Optional[str]) -> str:
+    return " ".join(value for value in values if value)
+
+
+def _documents(submissions, ids: List[int], using: str) -> Iterable[tuple]:
+    """(id, titles, descriptions, url, body) of each submission"""
+    queryset = submissions.objects.using(using).filter(id__in=ids)
+    for row in queryset.values(*_DOCUMENT_COLUMNS).iterator():
+        yield (
+            row["id"],
+            _join(row["moderation__title"], row["retrieval__title"], row["title"]),
+            _join(
+                row["moderation__description"],
+                row["retrieval__description"],
+                row["description"],
+            ),
+            row["target_url"],
+            strip_tags(row["retrieval__fetched_page"] or ""),
+        )
+
+
+def terms(query: str) -> List[str]:
+    """Words of a query, as they are matched"""
+    return re.findall(r"\w+", query.lower())[:_MAX_TERMS]
+
+
+class _SQLiteIndex:
+    """FTS5, the rowid is the id of the submission"""
+
+    @staticmethod
+    def create(cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "title, description, url, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    @staticmethod
+    def drop(cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    @staticmethod
+    def delete(cursor, ids: List[int]):
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", ids)
+
+    @staticmethod
+    def insert(cursor, documents: List[tuple]):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, title, description, url, body) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            documents,
+        )
+
+    @staticmethod
+    def search(cursor, words: List[str], status: Optional[str], limit: int):
+        match = " ".join(f'"{word}"*' for word in words)
+        status_filter = "AND s.status = %s" if status else ""
+        cursor.execute(
+            f"SELECT {TABLE}.rowid FROM {TABLE} "
+            f"JOIN {Submission._meta.db_table} s ON s.id = {TABLE}.rowid "
+            f"WHERE {TABLE} MATCH %s {status_filter} "
+            f"ORDER BY bm25({TABLE}, 10.0, 5.0, 2.0, 1.0) LIMIT %s",
+            [match] + ([status] if status else []) + [limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class _PostgresIndex:
+    """tsvector with weights A (titles) to D (page text) and a GIN index"""
+
+    @staticmethod
+    def create(cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            f"submission_id integer PRIMARY KEY REFERENCES "
+            f"{Submission._meta.db_table} (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} "
+            "USING GIN (document)"
+        )
+
+    @staticmethod
+    def drop(cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    @staticmethod
+    def delete(cursor, ids: List[int]):
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE submission_id IN ({placeholders})", ids
+        )
+
+    @staticmethod
+    def insert(cursor, documents: List[tuple]):
+        vector = " || ".join(
+            f"setweight(to_tsvector('{_PG_CONFIG}', %s), '{weight}')"
+            for weight in "ABCD"
+        )
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (submission_id, document) VALUES (%s, {vector})",
+            documents,
+        )
+
+    @staticmethod
+    def search(cursor, words: List[str], status: Optional[str], limit: int):
+        query = " & ".join(f"{word}:*" for word in words)
+        status_filter = "AND s.status = %s" if status else ""
+        cursor.execute(
+            f"SELECT t.submission_id FROM {TABLE} t "
+            f"JOIN {Submission._meta.db_table} s ON s.id = t.submission_id, "
+            f"to_tsquery('{_PG_CONFIG}', %s) query "
+            f"WHERE t.document @@ query {status_filter} "
+            "ORDER BY ts_rank(t.document, query) DESC, t.submission_id DESC LIMIT %s",
+            [query] + ([status] if status else []) + [limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+_INDEXES = {
+    "sqlite": _SQLiteIndex,
+    "postgresql": _PostgresIndex,
+    "cockroachdb": _PostgresIndex,
+}
+
+
+def _index_for(connection):
+    return _INDEXES.get(connection.vendor)
+
+
+def create_index(connection, submissions=Submission):
+    """Creates the index for the database of the connection and fills it"""
+    index = _index_for(connection)
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        index.create(cursor)
+    rebuild(connection.alias, submissions)
+
+
+def drop_index(connection):
+    """Drops the index, if there is one for the database"""
+    index = _index_for(connection)
+    if index is not None:
+        with connection.cursor() as cursor:
+            index.drop(cursor)
+
+
+def update(ids: Iterable[int], using: str = "default", submissions=Submission):
+    """Rewrites the documents of the given submissions (deleted ones are removed)"""
+    connection = connections[using]
+    index = _index_for(connection)
+    ids = list(ids)
+    if index is None or not ids:
+        return
+    documents = list(_documents(submissions, ids, using))
+    with connection.cursor() as cursor:
+        index.delete(cursor, ids)
+        if documents:
+            index.insert(cursor, documents)
+
+
+def rebuild(using: str = "default", submissions=Submission, batch: int = 500) -> int:
+    """Rewrites the whole index, returns the number of documents"""
+    ids = list(
+        submissions.objects.using(using).order_by("id").values_list("id", flat=True)
+    )
+    connection = connections[using]
+    index = _index_for(connection)
+    if index is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    for start in range(0, len(ids), batch):
+        update(ids[start : start + batch], using, submissions)
+    return len(ids)
+
+
+def search(
+    query: str,
+    status: Optional[str] = None,
+    limit: int = 500,
+    using: str = "default",
+) -> List[int]:
+    """Ids of the submissions that match the query, best matches first. If a
+    status is given only submissions in it are returned"""
+    words = terms(query)
+    if not words:
+        return []
+    connection = connections[using]
+    index = _index_for(connection)
+    if index is None:
+        return _search_without_index(words, status, limit, using)
+    with connection.cursor() as cursor:
+        return index.search(cursor, words, status, limit)
+
+
+def _search_without_index(words, status, limit, using) -> List[int]:
+    queryset = Submission.objects.using(using)
+    if status:
+        queryset = queryset.filter(status=status)
+    for word in words:
+        queryset = queryset.filter(
+            models.Q(title__icontains=word)
+            | models.Q(description__icontains=word)
+            | models.Q(target_url__icontains=word)
+            | models.Q(moderation__title__icontains=word)
+            | models.Q(retrieval__title__icontains=word)
+            | models.Q(retrieval__fetched_page__icontains=word)
+        )
+    return list(
+        queryset.order_by("-date_created").values_list("id", flat=True)[:limit]
+    )
+
+
+# ---- Signal handlers that keep the index up to date
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def submission_changed(sender, instance=None, using="default", **kwargs):
+    # pylint: disable=unused-argument
+    """The document is rewritten (or removed) in the same transaction"""
+    update([instance.pk], using)
+
+
+@receiver(post_save, sender=Retrieval)
+@receiver(post_save, sender=Moderation)
+@receiver(post_delete, sender=Retrieval)
+@receiver(post_delete, sender=Moderation)
+def stage_changed(sender, instance=None, using="default", **kwargs):
+    # pylint: disable=unused-argument
+    """Titles/descriptions/page text of the retrieval or moderation changed"""
+    update([instance.submission_id], using)
+
+
+@receiver(submissions_changed)
+def batch_changed(sender, ids=(), using="default", **kwargs):
+    # pylint: disable=unused-argument
+    """The documents of a batch are rewritten at once"""
+    update(ids, using)
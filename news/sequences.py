@@ -0,0 +1,41 @@
+"""
+Reading logs by sequence (ArticleChange, SubmissionEvent) without skipping
+rows that commit late.
+
+A sequence is assigned when the row is inserted, not when its transaction
+commits: a transaction holding sequence 41 can commit after another one that got
+42, and a client that read 42 and asks for what comes after it never sees 41.
+
+So logs are only read up to the first row inserted less than
+NEWS_LOG_SETTLE_SECONDS ago. Rows before it were inserted earlier, and have
+committed (or never will), as long as no transaction writing to a log takes
+longer than that to commit. Recent rows are served a few seconds later instead.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.timezone import now
+
+
+def settle_seconds() -> float:
+    """Seconds after which a row of a log can be read"""
+    return getattr(settings, "NEWS_LOG_SETTLE_SECONDS", 5)
+
+
+def cutoff() -> datetime:
+    """Rows inserted after this are too recent to be read"""
+    return now() - timedelta(seconds=settle_seconds())
+
+
+def settled(rows: Iterable, date_of) -> Tuple[List, Optional[float]]:
+    """The rows (in order of sequence) before the first that is too recent to be
+    read, and in how many seconds that one can be (None if there is none)"""
+    limit = cutoff()
+    found = []
+    for row in rows:
+        date = date_of(row)
+        if date > limit:
+            return found, (date - limit).total_seconds()
+        found.append(row)
+    return found, None
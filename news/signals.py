@@ -0,0 +1,20 @@
+"""
+Signals of the news app.
+
+Changes made in bulk (bulk_create, bulk_update, queryset.update) don't send
+post_save, so the code making them sends `submissions_changed` once per batch
+instead, after the statuses are recalculated (models.calculate_statuses). The
+modules that keep data derived from submissions (search index, feeds, change
+log, events, moderation queue) update it for the whole batch at once.
+
+Arguments:
+
+* ids: the submissions changed
+* previous: their status before the change, by id
+* statuses: their status after it, by id
+* kind: the SubmissionEventKinds of the change, None if it's not an event
+* using: the database
+"""
+from django.dispatch import Signal
+
+submissions_changed = Signal()
@@ -0,0 +1,76 @@
+/*
+ * Loads the heavy parts of the submission change page when their button is
+ * clicked: the fetched page, the thumbnail previews and the votes, a page at a
+ * time (SubmissionAdmin.lazy_view in news/admin.py)
+ */
+"use strict";
+{
+    const render = {
+        page(data, target) {
+            const page = document.createElement("textarea");
+            page.readOnly = true;
+            page.rows = 20;
+            page.cols = 120;
+            page.value = data.fetched_page || "";
+            target.replaceChildren(page);
+        },
+        thumbnails(data, target) {
+            target.replaceChildren(...data.thumbnails.map((thumbnail) => {
+                const link = document.createElement("a");
+                link.rel = "noreferrer";
+                link.href = thumbnail.url;
+                link.title = thumbnail.name;
+                const image = document.createElement("img");
+                image.src = thumbnail.url;
+                image.width = 128;
+                link.append(image);
+                return link;
+            }));
+            if (!data.thumbnails.length) {
+                target.textContent = "-";
+            }
+        },
+        votes(data, target) {
+            let list = target.querySelector("ul");
+            if (!list) {
+                list = document.createElement("ul");
+                target.replaceChildren(`${data.count} votes`, list);
+            }
+            for (const vote of data.results) {
+                const item = document.createElement("li");
+                item.textContent = `${vote.label} ${vote.owner || "-"} (${vote.date_created})`;
+                list.append(item);
+            }
+            return data.next;
+        },
+    };
+
+    document.addEventListener("click", async (event) => {
+        const button = event.target.closest("button[data-lazy-url]");
+        if (!button) {
+            return;
+        }
+        event.preventDefault();
+        button.disabled = true;
+        const response = await fetch(button.dataset.lazyUrl, {
+            credentials: "same-origin",
+            headers: {Accept: "application/json"},
+        });
+        if (!response.ok) {
+            button.disabled = false;
+            return;
+        }
+        const part = button.dataset.lazyPart;
+        const next = render[part](
+            await response.json(),
+            document.getElementById(`lazy-${part}`)
+        );
+        if (next) {
+            button.dataset.lazyUrl = next;
+            button.textContent = "More";
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    });
+}
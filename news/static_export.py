@@ -0,0 +1,229 @@
+"""
+Static export of the published articles, so the public site can be served by a
+web server or CDN without Django (`./manage.py export_static`).
+
+Layout, in NEWS_EXPORT_ROOT or the storage in NEWS_EXPORT_STORAGE:
+
+* `articles/<id>.json|html`: one article, same representation as /articles
+* `page/<n>.json|html`: NEWS_EXPORT_PAGE_SIZE articles per page. Page 1 has the
+  oldest ones, so adding articles only changes the last pages. Each page lists
+  its articles newest first and links to the next (older) and previous (newer)
+* `index.json|html`: number of articles and pages, and the newest page
+* `manifest.json`: what was exported
+
+The export is incremental: the manifest keeps a version of every article (the
+latest change of the submission, its retrieval or its moderation) and the
+articles of every page, and only the files of articles and pages that changed
+are rewritten. Files of articles that are no longer published are deleted.
+"""
+import json
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .feeds import public_request
+from .models import Submission, SubmissionStatuses
+from .rest.fastjson import FastJSONRenderer
+
+MANIFEST = "manifest.json"
+# a manifest of another version (or page size) means a full export
+_VERSION = 1
+
+_BATCH = 500
+
+
+def get_storage() -> Storage:
+    """NEWS_EXPORT_STORAGE (dotted path of a storage class) if set, otherwise the
+    directory NEWS_EXPORT_ROOT"""
+    dotted_path = getattr(settings, "NEWS_EXPORT_STORAGE", None)
+    if dotted_path:
+        return import_string(dotted_path)()
+    return FileSystemStorage(
+        location=getattr(settings, "NEWS_EXPORT_ROOT", "public/site/")
+    )
+
+
+def _page_size() -> int:
+    return getattr(settings, "NEWS_EXPORT_PAGE_SIZE", 50)
+
+
+def _versions() -> List[tuple]:
+    """(id, version) of the published articles, oldest first"""
+    submission = F("last_updated")
+    version = Greatest(
+        submission,
+        Coalesce("retrieval__last_updated", submission),
+        Coalesce("moderation__last_updated", submission),
+    )
+    return [
+        (pk, value.isoformat())
+        for pk, value in Submission.objects.filter(status=SubmissionStatuses.ACCEPTED)
+        .order_by("date_created", "id")
+        .values_list("id", version)
+    ]
+
+
+def _read_manifest(storage: Storage) -> Optional[dict]:
+    if not storage.exists(MANIFEST):
+        return None
+    with storage.open(MANIFEST) as source:
+        manifest = json.loads(source.read())
+    if manifest.get("version") != _VERSION or manifest.get("page_size") != _page_size():
+        return None
+    return manifest
+
+
+def _write(storage: Storage, name: str, content: bytes):
+    # storages don't overwrite, they rename
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def _delete(storage: Storage, name: str) -> bool:
+    """Whether there was something to delete"""
+    if not storage.exists(name):
+        return False
+    storage.delete(name)
+    return True
+
+
+class Exporter:
+    """Writes the files that changed since the manifest in the storage"""
+
+    def __init__(self, storage: Storage, full: bool = False):
+        self.storage = storage
+        self.previous = None if full else _read_manifest(storage)
+        self.renderer = FastJSONRenderer()
+        self.written = 0
+        self.deleted = 0
+        self._articles: Dict[int, dict] = {}
+
+    def _json(self, data) -> bytes:
+        return self.renderer.render(data)
+
+    def _load(self, ids: Iterable[int]):
+        """Representations of the given articles, as the /articles endpoint"""
+        # pylint: disable=import-outside-toplevel
+        from .rest.fastpath import ArticleFastSerializer
+
+        missing = [pk for pk in ids if pk not in self._articles]
+        fast = ArticleFastSerializer({"request": public_request()})
+        for start in range(0, len(missing), _BATCH):
+            queryset = Submission.objects.filter(id__in=missing[start : start + _BATCH])
+            rows = list(fast.project(queryset))
+            for row, article in zip(rows, fast.serialize(rows)):
+                self._articles[row["id"]] = article
+
+    def _save(self, name: str, template: str, data: dict, context: dict):
+        _write(self.storage, f"{name}.json", self._json(data))
+        _write(
+            self.storage,
+            f"{name}.html",
+            render_to_string(f"news/export/{template}", context).encode(),
+        )
+        self.written += 2
+
+    def _remove(self, name: str):
+        for extension in ["json", "html"]:
+            if _delete(self.storage, f"{name}.{extension}"):
+                self.deleted += 1
+
+    def _page(self, number: int, ids: List[int], last: int, root: str) -> tuple:
+        """JSON and template context of a page"""
+        articles = [self._articles[pk] for pk in reversed(ids)]
+        data = {
+            "page": number,
+            "next": f"{root}page/{number - 1}.json" if number > 1 else None,
+            "previous": f"{root}page/{number + 1}.json" if number < last else None,
+            "results": articles,
+        }
+        context = {
+            "root": root,
+            "number": number,
+            "older": number - 1 if number > 1 else None,
+            "newer": number + 1 if number < last else None,
+            # (the id, for the links to the pages of the articles)
+            "articles": [
+                {"id": pk, **article} for pk, article in zip(reversed(ids), articles)
+            ],
+        }
+        return data, context
+
+    def export(self) -> dict:
+        """Writes what changed and the new manifest, which is returned"""
+        versions = _versions()
+        previous_articles = self.previous["articles"] if self.previous else {}
+        previous_pages = self.previous["pages"] if self.previous else {}
+        articles = {str(pk): version for pk, version in versions}
+
+        changed = [
+            pk for pk, version in versions if previous_articles.get(str(pk)) != version
+        ]
+        size = _page_size()
+        ids = [pk for pk, _ in versions]
+        chunks = [ids[start : start + size] for start in range(0, len(ids), size)]
+        last = len(chunks)
+        pages = {}
+        changed_pages = []
+        for number, chunk in enumerate(chunks, start=1):
+            # links to the newer page change when one is added
+            signature = [[articles[str(pk)] for pk in chunk], chunk, number < last]
+            pages[str(number)] = signature
+            if previous_pages.get(str(number)) != signature:
+                changed_pages.append(number)
+
+        self._load(
+            changed + [pk for number in changed_pages for pk in chunks[number - 1]]
+        )
+
+        for pk in changed:
+            article = self._articles[pk]
+            context = {"root": "../", "article": article}
+            self._save(f"articles/{pk}", "article.html", article, context)
+        for pk in previous_articles.keys() - articles.keys():
+            self._remove(f"articles/{pk}")
+
+        for number in changed_pages:
+            data, context = self._page(number, chunks[number - 1], last, "../")
+            self._save(f"page/{number}", "page.html", data, context)
+        for number in range(last + 1, len(previous_pages) + 1):
+            self._remove(f"page/{number}")
+
+        if changed or changed_pages or self.previous is None or self.deleted:
+            if last:
+                self._load(chunks[-1])
+                _, context = self._page(last, chunks[-1], last, "")
+            else:
+                context = {"root": "", "articles": []}
+            data = {
+                "count": len(ids),
+                "pages": last,
+                "latest": f"page/{last}.json" if last else None,
+            }
+            self._save("index", "page.html", data, context)
+
+        manifest = {
+            "version": _VERSION,
+            "page_size": size,
+            "exported": timezone.now().isoformat(),
+            "articles": articles,
+            "pages": pages,
+        }
+        _write(self.storage, MANIFEST, json.dumps(manifest).encode())
+        return manifest
+
+
+def export(storage: Optional[Storage] = None, full: bool = False) -> Exporter:
+    """Exports the published articles, returns the exporter (with counts of
+    files written and deleted)"""
+    exporter = Exporter(storage or get_storage(), full)
+    exporter.export()
+    return exporter
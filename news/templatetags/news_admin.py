@@ -0,0 +1,14 @@
+"""
+Template tags of the scalable admin changelist (news/adminlist.py)
+"""
+from django import template
+
+from ..adminlist import cached_date_hierarchy as _cached_date_hierarchy
+
+register = template.Library()
+
+
+@register.inclusion_tag("admin/date_hierarchy.html")
+def cached_date_hierarchy(changelist):
+    """Same as the admin's date_hierarchy, without querying the dates every time"""
+    return _cached_date_hierarchy(changelist)
@@ -0,0 +1,396 @@
+""" Test cases for the admin pages of submissions """
+from datetime import timedelta
+from io import StringIO
+from custom_admin_actions import jobs
+from custom_admin_actions.models import AdminActionJob, JobStatuses
+from django.contrib import admin
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .adminlist import EstimatedCountPaginator
+from .models import (
+    Moderation,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    SubmissionStatuses,
+    Vote,
+)
+
+# pylint: disable=missing-function-docstring
+
+CHANGELIST = "/adminpanel/news/submission/"
+
+
+class SubmissionChangelistTests(TestCase):
+    """
+    /adminpanel/news/submission/
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = get_user_model().objects.create_superuser(
+            "changelistadmin", "nothing@example.com", "x"
+        )
+        self.client.force_login(self.admin)
+        self.count = 0
+
+    def _add(self, number):
+        for _ in range(number):
+            self.count += 1
+            submission = Submission.objects.create(
+                target_url=f"https://example.com/{self.count}", owner=self.admin
+            )
+            Retrieval.objects.create(
+                submission=submission,
+                status=RetrievalStatuses.FETCHED,
+                fetched_page="<p>long</p>",
+            )
+            Moderation.objects.create(submission=submission, owner=self.admin)
+
+    def _queries(self, url=CHANGELIST):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries
+
+    def test_queries_dont_grow_with_rows(self):
+        self._add(3)
+        # (the first load also fills the date hierarchy cache)
+        self._queries()
+        few = len(self._queries())
+        self._add(30)
+        queries = self._queries()
+        self.assertEqual(len(queries), few)
+        self.assertFalse(
+            [query for query in queries if "fetched_page" in query["sql"]],
+        )
+
+    def test_date_hierarchy_cached(self):
+        self._add(2)
+        first = len(self._queries())
+        self.assertLess(len(self._queries()), first)
+
+    def test_owner_filter(self):
+        self._add(2)
+        other = get_user_model().objects.create_user("changelistother")
+        Submission.objects.create(target_url="https://example.com/other", owner=other)
+        response = self.client.get(f"{CHANGELIST}?owner__id__exact={other.pk}")
+        self.assertContains(response, "https://example.com/other")
+        self.assertNotContains(response, "https://example.com/1")
+        # only the selected owner is loaded, the rest come from the search box
+        self.assertContains(response, "admin-autocomplete")
+        self.assertContains(response, 'data-field-name="owner"')
+        self.assertContains(response, f'<option value="{other.pk}" selected>')
+
+    def test_estimated_count(self):
+        self._add(5)
+        with self.settings(NEWS_ADMIN_COUNT_LIMIT=3):
+            paginator = EstimatedCountPaginator(Submission.objects.order_by("id"), 2)
+            self.assertEqual(paginator.count, 3)
+            self.assertEqual(paginator.num_pages, 2)
+        paginator = EstimatedCountPaginator(Submission.objects.order_by("id"), 2)
+        self.assertEqual(paginator.count, 5)
+
+
+class SubmissionSearchTests(TestCase):
+    """
+    The search box of /adminpanel/news/submission/
+    """
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            "searchadmin", "nothing@example.com", "x"
+        )
+        self.client.force_login(self.admin)
+        self.other = get_user_model().objects.create_user("searchother")
+        self.dog = Submission.objects.create(
+            target_url="https://www.example.com/dog", owner=self.admin
+        )
+        Retrieval.objects.create(
+            submission=self.dog,
+            status=RetrievalStatuses.FETCHED,
+            title="A very good dog",
+            fetched_page="<p>Retrievers everywhere</p>",
+        )
+        self.cat = Submission.objects.create(
+            target_url="https://example.org/cat", owner=self.other
+        )
+
+    def _found(self, term):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(CHANGELIST, {"q": term})
+        self.assertEqual(response.status_code, 200)
+        # no scans of the columns
+        self.assertFalse([query for query in queries if "LIKE '%" in query["sql"]])
+        return {item.pk for item in response.context["cl"].result_list}
+
+    def test_words(self):
+        self.assertEqual(self._found("retriev"), {self.dog.pk})
+        self.assertEqual(self._found("good dog"), {self.dog.pk})
+        self.assertEqual(self._found("nothing"), set())
+
+    def test_shortcuts(self):
+        self.assertEqual(self._found("https://example.org/cat/"), {self.cat.pk})
+        self.assertEqual(self._found("example.com"), {self.dog.pk})
+        self.assertEqual(self._found("domain:www.example.org"), {self.cat.pk})
+        self.assertEqual(self._found("owner:searchother"), {self.cat.pk})
+        self.assertEqual(self._found(f"#{self.dog.pk}"), {self.dog.pk})
+
+
+class SubmissionChangePageTests(TestCase):
+    """
+    /adminpanel/news/submission/<id>/change/ and the parts it loads on demand
+    """
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            "changeadmin", "nothing@example.com", "x"
+        )
+        self.client.force_login(self.admin)
+        self.submission = Submission.objects.create(
+            target_url="https://example.com/heavy", owner=self.admin
+        )
+        Retrieval.objects.create(
+            submission=self.submission,
+            status=RetrievalStatuses.FETCHED,
+            fetched_page="<p>a very long page</p>",
+        )
+        for num in range(3):
+            Vote.objects.create(
+                submission=self.submission,
+                owner=get_user_model().objects.create_user(f"changevoter{num}"),
+                value=Vote.Values.UP,
+            )
+        self.url = f"{CHANGELIST}{self.submission.pk}/"
+
+    def test_change_page_is_light(self):
+        response = self.client.get(f"{self.url}change/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "a very long page")
+        self.assertNotContains(response, "changevoter")
+        self.assertContains(response, f'data-lazy-url="{self.url}lazy/page/"')
+        self.assertContains(response, f'data-lazy-url="{self.url}lazy/votes/"')
+        self.assertContains(response, "news/admin/lazy.js")
+
+    def test_lazy_parts(self):
+        response = self.client.get(f"{self.url}lazy/page/")
+        self.assertEqual(response.json(), {"fetched_page": "<p>a very long page</p>"})
+        response = self.client.get(f"{self.url}lazy/thumbnails/")
+        self.assertEqual(response.json(), {"thumbnails": []})
+
+        with self.settings(NEWS_ADMIN_VOTES_PER_PAGE=2):
+            votes = self.client.get(f"{self.url}lazy/votes/").json()
+            self.assertEqual(votes["count"], 3)
+            self.assertEqual(len(votes["results"]), 2)
+            more = self.client.get(votes["next"]).json()
+        self.assertIsNone(more["next"])
+        self.assertEqual(
+            {vote["owner"] for vote in votes["results"] + more["results"]},
+            {f"changevoter{num}" for num in range(3)},
+        )
+        self.assertEqual(votes["results"][0]["label"], "👍")
+
+        self.assertEqual(self.client.get(f"{self.url}lazy/other/").status_code, 404)
+        self.assertEqual(
+            self.client.get(f"{CHANGELIST}999/lazy/page/").status_code, 404
+        )
+
+    def test_staff_only(self):
+        self.client.force_login(get_user_model().objects.create_user("changenobody"))
+        response = self.client.get(f"{self.url}lazy/page/")
+        self.assertEqual(response.status_code, 302)
+
+
+class SubmissionActionJobsTests(TestCase):
+    """
+    Custom actions of the submission change page, run in the background
+    """
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            "jobsadmin", "nothing@example.com", "x"
+        )
+        self.client.force_login(self.admin)
+        self.submission = Submission.objects.create(
+            target_url="https://example.com/jobs", owner=self.admin
+        )
+        Retrieval.objects.create(
+            submission=self.submission, status=RetrievalStatuses.FETCHED
+        )
+        self.url = f"{CHANGELIST}{self.submission.pk}/"
+
+    def _action(self, action):
+        request = RequestFactory().post(
+            f"{self.url}change/", {f"custom_admin_action_{action}": "1"}
+        )
+        request.user = self.admin
+        request._messages = CookieStorage(request)  # pylint: disable=protected-access
+        model_admin = admin.site._registry[
+            Submission
+        ]  # pylint: disable=protected-access
+        return model_admin.response_change(request, self.submission)
+
+    def test_queued_and_run(self):
+        response = self._action("refetch")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f"{self.url}change/")
+        job = AdminActionJob.objects.get()
+        self.assertEqual((job.action, job.status), ("refetch", JobStatuses.QUEUED))
+        # nothing ran in the request
+        self.assertEqual(
+            Retrieval.objects.get(pk=self.submission.pk).status,
+            RetrievalStatuses.FETCHED,
+        )
+
+        response = self.client.get(f"{self.url}change/")
+        self.assertContains(response, f'data-jobs-url="{self.url}custom_admin_jobs/"')
+        self.assertContains(response, '<tr data-status="queued">')
+
+        out = StringIO()
+        call_command("run_admin_jobs", "--once", stdout=out)
+        self.assertEqual(out.getvalue(), "Ran 1 jobs\n")
+        self.assertEqual(
+            Retrieval.objects.get(pk=self.submission.pk).status,
+            RetrievalStatuses.PENDING,
+        )
+        found = self.client.get(f"{self.url}custom_admin_jobs/").json()["jobs"]
+        self.assertEqual(
+            [(job["action"], job["status"], job["progress"]) for job in found],
+            [("refetch", "done", 100)],
+        )
+
+    def test_reject(self):
+        self._action("reject")
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(
+            Submission.objects.get(pk=self.submission.pk).status,
+            SubmissionStatuses.REJECTED_MOD,
+        )
+        job = AdminActionJob.objects.get()
+        self.assertEqual(job.message, "Status: rej_mod")
+        self.assertEqual(Moderation.objects.get().owner, self.admin)
+
+    def test_failed(self):
+        Moderation.objects.create(
+            submission=self.submission,
+            owner=get_user_model().objects.create_user("jobsother"),
+        )
+        self._action("reject")
+        jobs.run_pending()
+        job = AdminActionJob.objects.get()
+        self.assertEqual(job.status, JobStatuses.FAILED)
+        self.assertEqual(job.message, "Object already moderated by jobsother")
+        self.assertIsNotNone(job.date_finished)
+
+    def _abandon(self, job):
+        """As if its worker had been killed a while ago"""
+        AdminActionJob.objects.filter(pk=job.pk).update(
+            date_heartbeat=timezone.now() - timedelta(hours=1)
+        )
+
+    def test_abandoned_jobs_are_run_again(self):
+        self._action("refetch")
+        abandoned = jobs.claim()
+        self._abandon(abandoned)
+        self.assertEqual(jobs.run_pending(), 1)
+        job = AdminActionJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (JobStatuses.DONE, 2))
+        # the first worker can't overwrite what the second did
+        jobs.run(abandoned)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatuses.DONE, 2))
+
+    def test_abandoned_jobs_fail_after_the_last_attempt(self):
+        self._action("refetch")
+        with self.settings(CUSTOM_ADMIN_JOBS_ATTEMPTS=1):
+            self._abandon(jobs.claim())
+            self.assertEqual(jobs.run_pending(), 0)
+        job = AdminActionJob.objects.get()
+        self.assertEqual(job.status, JobStatuses.FAILED)
+        self.assertEqual(job.message, "The worker running it stopped")
+        self.assertIsNotNone(job.date_finished)
+
+
+class SubmissionModerationActionsTests(TestCase):
+    """
+    Accept/reject/requeue actions of /adminpanel/news/submission/
+    """
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            "actionsadmin", "nothing@example.com", "x"
+        )
+        self.client.force_login(self.admin)
+        self.count = 0
+
+    def _fetched(self, number):
+        submissions = []
+        for _ in range(number):
+            self.count += 1
+            submission = Submission.objects.create(
+                target_url=f"https://example.com/{self.count}", owner=self.admin
+            )
+            Retrieval.objects.create(
+                submission=submission, status=RetrievalStatuses.FETCHED
+            )
+            submissions.append(submission)
+        return submissions
+
+    def _act(self, action, submissions):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                CHANGELIST,
+                {
+                    "action": action,
+                    "_selected_action": [submission.pk for submission in submissions],
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def _statuses(self, submissions):
+        ids = [submission.pk for submission in submissions]
+        return set(
+            Submission.objects.filter(id__in=ids).values_list("status", flat=True)
+        )
+
+    def test_accept_reject_requeue(self):
+        accepted, rejected = self._fetched(3), self._fetched(2)
+        self._act("accept_selected", accepted)
+        self._act("reject_selected", rejected)
+        self.assertEqual(self._statuses(accepted), {SubmissionStatuses.ACCEPTED})
+        self.assertEqual(self._statuses(rejected), {SubmissionStatuses.REJECTED_MOD})
+        self.assertEqual(
+            set(Moderation.objects.values_list("owner", flat=True)), {self.admin.pk}
+        )
+        self.assertEqual(
+            list(
+                LogEntry.objects.filter(change_message="Accepted")
+                .order_by("object_id")
+                .values_list("object_id", flat=True)
+            ),
+            sorted(str(submission.pk) for submission in accepted),
+        )
+
+        self._act("requeue_selected", accepted[:2])
+        self.assertEqual(self._statuses(accepted[:2]), {SubmissionStatuses.PENDING})
+        self.assertEqual(Submission.objects.filter(priority__isnull=False).count(), 2)
+        self.assertEqual(
+            LogEntry.objects.filter(change_message="Back to moderation").count(), 2
+        )
+
+    def test_queries_per_selection(self):
+        self._act("accept_selected", self._fetched(1))
+        few = self._act("accept_selected", self._fetched(2))
+        self.assertEqual(self._act("accept_selected", self._fetched(20)), few)
+        few = self._act("requeue_selected", Submission.objects.all()[:2])
+        self.assertEqual(
+            self._act("requeue_selected", Submission.objects.all()[2:20]), few
+        )
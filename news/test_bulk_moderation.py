@@ -0,0 +1,155 @@
+""" Test cases for moderating submissions in bulk """
+from test.common import rw_for
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from . import bulk
+from .models import (
+    ArticleChange,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    SubmissionEvent,
+    SubmissionEventKinds,
+    SubmissionStatuses,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class BulkModerationTests(APITestCase):
+    """
+    /moderation/bulk
+    """
+
+    def setUp(self):
+        self.mod = rw_for([Submission, Moderation], "bulkmod")
+        group, _ = Group.objects.get_or_create(name="Moderators")
+        self.mod.groups.add(group)
+        self.client.force_authenticate(self.mod)  # pylint: disable=no-member
+
+    def _fetched(self, name):
+        submission = Submission.objects.create(target_url=f"https://example.com/{name}")
+        Retrieval.objects.create(
+            submission=submission, status=RetrievalStatuses.FETCHED, title=name
+        )
+        return submission
+
+    def _post(self, items):
+        return self.client.post("/moderation/bulk", {"items": items}, format="json")
+
+    def test_moderate(self):
+        accepted = self._fetched("accepted")
+        rejected = self._fetched("rejected")
+        pending = self._fetched("pending")
+        Moderation.objects.create(submission=pending)
+        taken = self._fetched("taken")
+        Moderation.objects.create(
+            submission=taken, owner=rw_for([Moderation], "othermod")
+        )
+        response = self._post(
+            [
+                {"submission": accepted.pk, "status": "accepted", "title": "Better"},
+                {"submission": rejected.pk, "status": "rejected"},
+                {"submission": pending.pk, "status": "accepted", "description": "d"},
+                {"submission": taken.pk, "status": "accepted"},
+                {"submission": accepted.pk, "status": "rejected"},
+                {"submission": 12345, "status": "accepted"},
+            ]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"submission": accepted.pk, "status": "accepted"},
+                {"submission": rejected.pk, "status": "rej_mod"},
+                {"submission": pending.pk, "status": "accepted"},
+                {
+                    "submission": taken.pk,
+                    "error": "Object already moderated by rw-othermoduser",
+                },
+                {"submission": accepted.pk, "error": bulk.REPEATED},
+                {"submission": 12345, "error": bulk.NOT_FOUND},
+            ],
+        )
+        statuses = dict(Submission.objects.values_list("id", "status"))
+        self.assertEqual(statuses[taken.pk], SubmissionStatuses.PENDING)
+        moderation = Moderation.objects.get(submission=accepted)
+        self.assertEqual(moderation.title, "Better")
+        self.assertEqual(moderation.owner, self.mod)
+        moderation = Moderation.objects.get(submission=pending)
+        self.assertEqual(moderation.status, ModerationStatuses.ACCEPTED)
+        self.assertEqual(moderation.description, "d")
+        self.assertEqual(moderation.owner, self.mod)
+
+        # what's derived from the statuses follows them
+        self.assertEqual(
+            set(ArticleChange.objects.values_list("submission_id", flat=True)),
+            {accepted.pk, pending.pk},
+        )
+        self.assertEqual(
+            set(
+                SubmissionEvent.objects.filter(
+                    kind=SubmissionEventKinds.MODERATED
+                ).values_list("submission_id", "status")
+            ),
+            {
+                (accepted.pk, "accepted"),
+                (rejected.pk, "rej_mod"),
+                (pending.pk, "accepted"),
+            },
+        )
+        self.assertEqual(
+            list(
+                Submission.objects.filter(priority__isnull=False).values_list(
+                    "id", flat=True
+                )
+            ),
+            [taken.pk],
+        )
+        response = self.client.get("/articles/search?q=better")
+        self.assertEqual(
+            [article["target_url"] for article in response.data["results"]],
+            [accepted.target_url],
+        )
+
+    def test_queries_per_batch(self):
+        def count(items):
+            with CaptureQueriesContext(connection) as queries:
+                response = self._post(items)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            return len(queries)
+
+        # (the first request also loads the permissions of the user)
+        count([{"submission": self._fetched("first").pk, "status": "accepted"}])
+        few = [self._fetched(f"few{num}") for num in range(2)]
+        many = [self._fetched(f"many{num}") for num in range(20)]
+        self.assertEqual(
+            count([{"submission": item.pk, "status": "accepted"} for item in few]),
+            count([{"submission": item.pk, "status": "accepted"} for item in many]),
+        )
+
+    def test_invalid(self):
+        submission = self._fetched("invalid")
+        response = self._post([{"submission": submission.pk, "status": "pending"}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._post([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(NEWS_BULK_MODERATION_MAX=1):
+            response = self._post(
+                [{"submission": submission.pk, "status": "accepted"}] * 2
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Moderation.objects.exists())
+
+    def test_moderators_only(self):
+        self.client.force_authenticate(  # pylint: disable=no-member
+            rw_for([Submission, Moderation], "notbulkmod")
+        )
+        submission = self._fetched("notmod")
+        response = self._post([{"submission": submission.pk, "status": "accepted"}])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
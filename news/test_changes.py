@@ -0,0 +1,133 @@
+""" Test cases for the change log of articles """
+from datetime import timedelta
+from unittest import mock
+from test.common import rw_for
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APITestCase
+from . import changes, sequences
+from .models import ArticleChange, Moderation, ModerationStatuses, Submission
+
+# pylint: disable=missing-function-docstring
+
+
+class ChangesAPITests(APITestCase):
+    """
+    /articles/changes
+    """
+
+    def setUp(self):
+        self.user = rw_for([Submission], "syncer")
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        self.first = self._accepted("first")
+        self.second = self._accepted("second")
+        Submission.objects.create(target_url="https://example.com/pending")
+
+    def _accepted(self, name):
+        submission = Submission.objects.create(
+            target_url=f"https://example.com/{name}", title=name
+        )
+        Moderation.objects.create(
+            submission=submission, status=ModerationStatuses.ACCEPTED
+        )
+        return submission
+
+    def _changes(self, cursor=None, **params):
+        if cursor:
+            params["since"] = cursor
+        response = self.client.get("/articles/changes", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def _summary(self, data):
+        return [(item["id"], item["change"]) for item in data["results"]]
+
+    def test_changes_since_cursor(self):
+        data = self._changes()
+        self.assertEqual(
+            self._summary(data),
+            [(self.first.pk, "created"), (self.second.pk, "created")],
+        )
+        self.assertEqual(data["results"][0]["article"]["title"], "first")
+        self.assertFalse(data["more"])
+        cursor = data["cursor"]
+        self.assertEqual(self._changes(cursor)["results"], [])
+        self.assertEqual(self._changes(cursor)["cursor"], cursor)
+
+        # edits, and a new article
+        self.first.moderation.title = "first edited"
+        self.first.moderation.save()
+        third = self._accepted("third")
+        self.first.moderation.description = "edited again"
+        self.first.moderation.save()
+        data = self._changes(cursor)
+        self.assertEqual(
+            self._summary(data),
+            [(third.pk, "created"), (self.first.pk, "updated")],
+        )
+        self.assertEqual(data["results"][1]["article"]["title"], "first edited")
+
+        cursor = data["cursor"]
+        self.second.moderation.status = ModerationStatuses.REJECTED
+        self.second.moderation.save()
+        third_pk = third.pk
+        third.delete()
+        self.assertEqual(
+            self._summary(self._changes(cursor)),
+            [(self.second.pk, "unpublished"), (third_pk, "unpublished")],
+        )
+
+        # a client that never saw it doesn't get an update of an article that
+        # was published after its cursor
+        self.assertEqual(
+            self._summary(self._changes()),
+            [
+                (self.first.pk, "created"),
+                (self.second.pk, "unpublished"),
+                (third_pk, "unpublished"),
+            ],
+        )
+
+    def test_limit(self):
+        data = self._changes(limit=1)
+        self.assertEqual(self._summary(data), [(self.first.pk, "created")])
+        self.assertTrue(data["more"])
+        data = self._changes(data["cursor"], limit=1)
+        self.assertEqual(self._summary(data), [(self.second.pk, "created")])
+        self.assertFalse(data["more"])
+
+    def test_invalid(self):
+        for params in [{"since": "nope"}, {"since": "c2VxOng="}, {"limit": "x"}]:
+            response = self.client.get("/articles/changes", params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_one_row_per_article(self):
+        for num in range(3):
+            self.first.moderation.title = f"edit {num}"
+            self.first.moderation.save()
+        self.assertEqual(ArticleChange.objects.count(), 2)
+        self.assertEqual(changes.decode_cursor(changes.encode_cursor(42)), 42)
+
+    def test_late_commits_are_not_skipped(self):
+        late = self._accepted("late")
+        early = self._accepted("early")
+        ArticleChange.objects.filter(submission_id__in=[late.pk, early.pk]).delete()
+        cursor = self._changes()["cursor"]
+        sequence = changes.decode_cursor(cursor)
+        start = now()
+
+        def read(seconds_later):
+            with self.settings(NEWS_LOG_SETTLE_SECONDS=5), mock.patch.object(
+                sequences, "now", return_value=start + timedelta(seconds=seconds_later)
+            ):
+                return self._changes(cursor)
+
+        # two transactions: the one that got the lower sequence commits last.
+        # What the other wrote isn't read until any transaction that started
+        # before it should have committed
+        ArticleChange.objects.create(sequence=sequence + 2, submission_id=early.pk)
+        self.assertEqual(self._summary(read(1)), [])
+        ArticleChange.objects.create(sequence=sequence + 1, submission_id=late.pk)
+        self.assertEqual(
+            self._summary(read(6)), [(late.pk, "created"), (early.pk, "created")]
+        )
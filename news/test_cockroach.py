@@ -0,0 +1,81 @@
+""" Test cases for the CockroachDB schema mode """
+from unittest import mock
+from django.db import connection
+from django.test import TestCase, override_settings
+from . import cockroach
+
+# pylint: disable=missing-function-docstring
+
+
+def cockroach_connection():
+    """A connection that says it's CockroachDB, and records what it runs"""
+    fake = mock.MagicMock(vendor="cockroachdb", ops=connection.ops)
+    return fake, fake.cursor.return_value.__enter__.return_value.execute
+
+
+class CockroachSchemaTests(TestCase):
+    """
+    news/cockroach.py, migration 0009
+    """
+
+    def test_only_on_cockroachdb(self):
+        with self.settings(NEWS_COCKROACH_SCHEMA=True):
+            self.assertFalse(cockroach.enabled(connection))
+        fake, execute = cockroach_connection()
+        cockroach.apply(fake)
+        execute.assert_not_called()
+        with self.settings(NEWS_COCKROACH_SCHEMA=True):
+            self.assertTrue(cockroach.enabled(fake))
+
+    def test_statements(self):
+        forward = [sql for sql, _ in cockroach.statements(connection)]
+        self.assertIn(
+            'ALTER TABLE "news_submission" ALTER COLUMN "id" SET DEFAULT unique_rowid()',
+            forward,
+        )
+        self.assertIn(
+            'ALTER TABLE "news_vote" ALTER PRIMARY KEY USING COLUMNS ("id") USING HASH',
+            forward,
+        )
+        # (stage tables: the submission is the key, its id comes from submissions)
+        self.assertIn(
+            'ALTER TABLE "news_moderation" ALTER PRIMARY KEY USING COLUMNS '
+            '("submission_id") USING HASH',
+            forward,
+        )
+        self.assertNotIn(
+            'ALTER TABLE "news_moderation" ALTER COLUMN "submission_id" '
+            "SET DEFAULT unique_rowid()",
+            forward,
+        )
+        self.assertEqual(
+            forward[-2:],
+            [
+                'DROP INDEX "news_submission"@"news_sub_status"',
+                'CREATE INDEX "news_sub_status" ON "news_submission" '
+                '("status", "date_created") USING HASH',
+            ],
+        )
+
+    @override_settings(NEWS_COCKROACH_SCHEMA=True)
+    def test_apply_and_revert(self):
+        fake, execute = cockroach_connection()
+        cockroach.apply(fake)
+        applied = [call.args[0] for call in execute.call_args_list]
+        self.assertEqual(applied, [sql for sql, _ in cockroach.statements(connection)])
+        execute.reset_mock()
+        cockroach.revert(fake)
+        reverted = [call.args[0] for call in execute.call_args_list]
+        self.assertEqual(
+            reverted[:2],
+            [
+                'DROP INDEX "news_submission"@"news_sub_status"',
+                'CREATE INDEX "news_sub_status" ON "news_submission" '
+                '("status", "date_created")',
+            ],
+        )
+        self.assertEqual(
+            reverted[-1],
+            'ALTER TABLE "news_submission" ALTER PRIMARY KEY USING COLUMNS ("id")',
+        )
+        self.assertNotIn("", reverted)
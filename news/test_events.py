@@ -0,0 +1,220 @@
+""" Test cases for the stream of submission events """
+import asyncio
+import base64
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from test.common import rw_for
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.test import SimpleTestCase
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APITestCase
+from dognews.asgi import application
+from . import events, sequences
+from .models import (
+    Analysis,
+    AnalysisStatuses,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    Submission,
+    SubmissionEvent,
+    SubmissionEventKinds,
+    SubmissionStatuses,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class BroadcasterTests(SimpleTestCase):
+    """
+    In-process wake ups
+    """
+
+    def test_wait(self):
+        broadcaster = events.Broadcaster()
+        self.assertFalse(broadcaster.wait(0, 0.01))
+        threading.Timer(0.05, broadcaster.publish, [3]).start()
+        self.assertTrue(broadcaster.wait(0, 5))
+        self.assertTrue(broadcaster.wait(2, 0))
+        self.assertFalse(broadcaster.wait(3, 0.01))
+
+    def test_wait_async(self):
+        broadcaster = events.Broadcaster()
+
+        async def run():
+            asyncio.get_running_loop().call_later(0.05, broadcaster.publish, 1)
+            woken = await broadcaster.wait_async(0, 5)
+            timed_out = await broadcaster.wait_async(1, 0.01)
+            return woken, timed_out
+
+        self.assertEqual(asyncio.run(run()), (True, False))
+
+
+class EventsAPITests(APITestCase):
+    """
+    /moderation/events
+    """
+
+    def setUp(self):
+        self.mod = rw_for([Submission], "eventsmod")
+        self.mod.set_password("secret")
+        self.mod.save()
+        group, _ = Group.objects.get_or_create(name="Moderators")
+        self.mod.groups.add(group)
+        self.client.force_authenticate(self.mod)  # pylint: disable=no-member
+
+    def _lifecycle(self):
+        submission = Submission.objects.create(target_url="https://example.com/a")
+        Retrieval.objects.create(submission=submission)
+        Analysis.objects.create(submission=submission, status=AnalysisStatuses.PASSED)
+        Moderation.objects.create(submission=submission)
+        # (pending moderations are not events)
+        Moderation.objects.filter(submission=submission).get().save()
+        moderation = submission.moderation
+        moderation.status = ModerationStatuses.ACCEPTED
+        moderation.save()
+        return submission
+
+    def test_json(self):
+        response = self.client.get("/moderation/events")
+        self.assertEqual(response.data, {"cursor": 0, "events": []})
+        submission = self._lifecycle()
+        # without a cursor only new events
+        self.assertEqual(self.client.get("/moderation/events").data["events"], [])
+
+        response = self.client.get("/moderation/events?since=0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        found = response.data["events"]
+        self.assertEqual(
+            [(event["event"], event["status"]) for event in found],
+            [
+                ("created", "pending"),
+                ("fetched", "pending"),
+                ("analysed", "pending"),
+                ("moderated", "accepted"),
+            ],
+        )
+        self.assertEqual({event["submission"] for event in found}, {submission.pk})
+        self.assertEqual(response.data["cursor"], found[-1]["id"])
+        response = self.client.get(f"/moderation/events?since={found[1]['id']}")
+        self.assertEqual(len(response.data["events"]), 2)
+
+    def test_late_commits_are_not_skipped(self):
+        start = now()
+
+        def event(sequence):
+            SubmissionEvent.objects.create(
+                sequence=sequence,
+                submission_id=1,
+                kind=SubmissionEventKinds.CREATED,
+                status=SubmissionStatuses.PENDING,
+            )
+
+        def read(seconds_later):
+            with self.settings(NEWS_LOG_SETTLE_SECONDS=5), mock.patch.object(
+                sequences, "now", return_value=start + timedelta(seconds=seconds_later)
+            ):
+                return [found["id"] for found in events.since(0)], events.latest()
+
+        # two transactions: the one that got the lower sequence commits last
+        event(12)
+        self.assertEqual(read(1), ([], 0))
+        event(11)
+        self.assertEqual(read(6), ([11, 12], 12))
+
+    def test_waits_for_recent_events(self):
+        self._lifecycle()
+        began = time.monotonic()
+        with self.settings(NEWS_LOG_SETTLE_SECONDS=0.2):
+            found = events.wait_for(0, 5)
+        # (returned as soon as the first one can be read)
+        self.assertEqual(found[0]["event"], "created")
+        self.assertGreater(time.monotonic() - began, 0.1)
+
+    def test_moderators_only(self):
+        self.client.force_authenticate(rw_for([Submission], "notmod"))
+        response = self.client.get("/moderation/events")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get("/moderation/events?since=x")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_long_poll_stream(self):
+        self._lifecycle()
+        first = SubmissionEvent.objects.order_by("sequence").first().sequence
+        response = self.client.get(
+            "/moderation/events",
+            HTTP_ACCEPT="text/event-stream",
+            HTTP_LAST_EVENT_ID=first,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode()
+        self.assertTrue(body.startswith("retry: 1000\n\n"))
+        self.assertNotIn("event: created", body)
+        self.assertIn(f"id: {first + 1}\nevent: fetched\ndata: {{", body)
+        self.assertIn('"status":"accepted"', body)
+
+        # nothing new: waits, then ends so the client reconnects
+        with self.settings(NEWS_EVENTS_LONG_POLL=0.01):
+            response = self.client.get(
+                f"/moderation/events?since={first + 3}", HTTP_ACCEPT="text/event-stream"
+            )
+            body = b"".join(response.streaming_content)
+        self.assertEqual(body, b"retry: 1000\n\n: nothing\n\n")
+
+    def test_asgi_stream(self):
+        self._lifecycle()
+        credentials = base64.b64encode(f"{self.mod.username}:secret".encode())
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/moderation/events",
+            "raw_path": b"/moderation/events",
+            "query_string": b"since=0",
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"accept", b"text/event-stream"),
+                (b"authorization", b"Basic " + credentials),
+            ],
+            "client": ("127.0.0.1", 1234),
+            "server": ("localhost", 80),
+        }
+        sent = []
+
+        async def run():
+            gone = asyncio.Event()
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await gone.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+                if b"event: moderated" in message.get("body", b""):
+                    gone.set()
+
+            await application(scope, receive, send)
+
+        async_to_sync(run)()
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn((b"Content-Type", b"text/event-stream"), sent[0]["headers"])
+        body = b"".join(message.get("body", b"") for message in sent[1:])
+        self.assertTrue(body.startswith(b"retry: 1000\n\n"))
+        self.assertEqual(body.count(b"\nevent: "), 4)
+        self.assertEqual(
+            sent[-1], {"type": "http.response.body", "body": b"", "more_body": False}
+        )
+        payload = body.rsplit(b"data: ", 1)[1].strip()
+        self.assertEqual(json.loads(payload)["status"], "accepted")
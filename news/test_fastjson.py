@@ -0,0 +1,104 @@
+""" Test cases for the orjson renderer/parser and the streaming list renderer """
+import datetime
+import decimal
+import io
+import json
+import uuid
+from unittest import mock
+from test.common import rw_for
+from django.test import SimpleTestCase
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from .models import Submission, Vote
+from .rest import fastjson
+from .rest.fastjson import FastJSONParser, FastJSONRenderer, StreamingJSONRenderer
+
+# pylint: disable=missing-function-docstring
+
+
+class FastJSONTests(SimpleTestCase):
+    """
+    Same bytes as JSONRenderer, with and without orjson
+    """
+
+    data = {
+        "text": "dogs 🐕 línea separada ",
+        "when": datetime.datetime(2023, 1, 2, 3, 4, 5, 678901, datetime.timezone.utc),
+        "day": datetime.date(2023, 1, 2),
+        "amount": decimal.Decimal("1.50"),
+        "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "nested": [{"a": None, "b": True, 1: 2.5}],
+        "big": 2**70,
+    }
+
+    def test_same_as_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+        with mock.patch.object(fastjson, "orjson", None):
+            self.assertEqual(FastJSONRenderer().render(self.data), expected)
+
+    def test_indent(self):
+        media_type = "application/json; indent=2"
+        self.assertEqual(
+            FastJSONRenderer().render({"a": [1]}, media_type),
+            JSONRenderer().render({"a": [1]}, media_type),
+        )
+
+    def test_stream_list(self):
+        rows = [{"n": num} for num in range(7)]
+        renderer = StreamingJSONRenderer()
+        renderer.chunk_size = 3
+        envelope = {"count": 7, "next": None}
+        streamed = b"".join(renderer.stream_list(rows, list, envelope))
+        self.assertEqual(streamed, JSONRenderer().render({**envelope, "results": rows}))
+        self.assertEqual(b"".join(renderer.stream_list([], list)), b"[]")
+
+    def test_parser(self):
+        body = json.dumps(self.data, default=str).encode()
+        for orjson in [fastjson.orjson, None]:
+            with mock.patch.object(fastjson, "orjson", orjson):
+                parsed = FastJSONParser().parse(io.BytesIO(body))
+                self.assertEqual(parsed["text"], self.data["text"])
+
+
+class StreamingAPITests(APITestCase):
+    """
+    Streamed list pages are the same as the regular ones
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = rw_for([Submission, Vote], "stream")
+        for num in range(7):
+            submission = Submission.objects.create(
+                target_url=f"https://example.com/{num}",
+                title=f"title {num}",
+                owner=self.user,
+            )
+            Vote.objects.create(submission=submission, owner=self.user, value=1)
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+
+    def test_streamed_submissions(self):
+        for query in ["", "&limit=3", "&limit=3&offset=3", "&offset=100"]:
+            url = f"/submissions?format=json-stream{query}"
+            # (links keep the format, so compare with the regular serializers)
+            with self.settings(NEWS_FAST_SERIALIZERS=False):
+                regular = self.client.get(url)
+            self.assertFalse(regular.streaming)
+            streamed = self.client.get(url)
+            self.assertEqual(streamed.status_code, 200)
+            self.assertTrue(streamed.streaming)
+            self.assertEqual(b"".join(streamed.streaming_content), regular.content)
+
+    def test_json_body(self):
+        response = self.client.post(
+            "/submissions",
+            data=json.dumps({"target_url": "https://example.com/posted"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        response = self.client.post(
+            "/submissions", data="{nope", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
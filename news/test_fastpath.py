@@ -0,0 +1,86 @@
+""" Test cases for the fast-path list serializers """
+from test.common import rw_for
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from .models import (
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    Vote,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class FastPathAPITests(APITestCase):
+    """
+    The fast path gives exactly the same bytes as the regular serializers
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = rw_for([Submission, Vote], "fast")
+        self.mod = rw_for([Submission, Vote, Moderation], "fastmod")
+        group, _ = Group.objects.get_or_create(name="Moderators")
+        self.mod.groups.add(group)
+        self.admin = rw_for([Submission], "fastadmin", admin=True)
+        self.admin.is_superuser = True
+        self.admin.save()
+
+        for num in range(12):
+            owner = [self.user, self.admin, None][num % 3]
+            submission = Submission.objects.create(
+                target_url=f"https://example.com/{num}",
+                title=f"title {num}" if num % 2 else "",
+                description="" if num % 4 else f"description {num}",
+                owner=owner,
+            )
+            # (ArticleSerializer needs a retrieval for accepted ones)
+            if num % 6:
+                Retrieval.objects.create(
+                    submission=submission,
+                    status=RetrievalStatuses.FETCHED,
+                    title=f"fetched {num}" if num % 3 else None,
+                    description=None if num % 2 else "",
+                    fetched_page=f"<html>{num}</html>" if num % 2 else "",
+                    thumbnail_submitted=f"sub{num}.png" if num % 3 == 1 else None,
+                    thumbnail_from_page=f"page{num}.png" if num % 2 else None,
+                    owner=owner,
+                )
+            Moderation.objects.create(
+                submission=submission,
+                status=ModerationStatuses.ACCEPTED
+                if num % 6
+                else ModerationStatuses.PENDING,
+                title=f"moderated {num}" if num % 4 == 1 else None,
+                owner=[self.mod, self.admin, None][num % 3],
+            )
+            for voter in [self.user, self.mod][: num % 3]:
+                Vote.objects.create(submission=submission, owner=voter, value=num % 2)
+
+    def assert_same_bytes(self, url):
+        with self.settings(NEWS_FAST_SERIALIZERS=False):
+            cache.clear()
+            regular = self.client.get(url)
+        cache.clear()
+        fast = self.client.get(url)
+        self.assertEqual(regular.status_code, 200, regular.content)
+        self.assertEqual(fast.content, regular.content)
+        return fast
+
+    def test_articles(self):
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        response = self.assert_same_bytes("/articles")
+        self.assertEqual(response.data["count"], 10)
+        self.assert_same_bytes("/articles?limit=3&offset=2")
+
+    def test_submissions(self):
+        for user in [self.mod, self.admin, self.user]:
+            self.client.force_authenticate(user)  # pylint: disable=no-member
+            response = self.assert_same_bytes("/submissions?ordering=-date_created")
+            self.assertTrue(response.data["count"] > 0)
+            self.assert_same_bytes("/submissions?status=accepted&limit=5")
+            self.assert_same_bytes("/submissions?retrieval__isnull=true")
@@ -0,0 +1,130 @@
+""" Test cases for the precomputed feeds of articles """
+import json
+from test.common import rw_for
+from django.test import TestCase
+from rest_framework import status
+from . import feeds
+from .models import (
+    FeedDocument,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class FeedTests(TestCase):
+    """
+    /feeds/articles.<rss|atom|json>
+    """
+
+    def setUp(self):
+        feeds.forget()
+        self.user = rw_for([Submission], "feeder")
+        self.submission = Submission.objects.create(
+            target_url="https://example.com/puppies", owner=self.user
+        )
+        Retrieval.objects.create(
+            submission=self.submission,
+            status=RetrievalStatuses.FETCHED,
+            title="Puppies rescued",
+            description="Forty puppies",
+        )
+
+    def _accept(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Moderation.objects.create(
+                submission=self.submission, status=ModerationStatuses.ACCEPTED
+            )
+        return callbacks
+
+    @staticmethod
+    def _regenerations(callbacks):
+        return [
+            callback
+            for callback in callbacks
+            if getattr(callback, "__name__", "") == "regenerate_after_commit"
+        ]
+
+    def _titles(self):
+        response = self.client.get("/feeds/articles.json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["title"] for item in json.loads(response.content)["items"]]
+
+    def test_regenerated_when_accepted(self):
+        self.assertEqual(self._titles(), [])
+        callbacks = self._accept()
+        # once per transaction, not per signal
+        self.assertEqual(len(self._regenerations(callbacks)), 1)
+        self.assertEqual(self._titles(), ["Puppies rescued"])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.submission.moderation.status = ModerationStatuses.REJECTED
+            self.submission.moderation.save()
+        self.assertEqual(len(self._regenerations(callbacks)), 1)
+        self.assertEqual(self._titles(), [])
+
+    def test_regenerated_when_deleted(self):
+        self._accept()
+        self.assertEqual(self._titles(), ["Puppies rescued"])
+        self.submission.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.submission.delete()
+        self.assertEqual(len(self._regenerations(callbacks)), 1)
+        self.assertEqual(self._titles(), [])
+
+    def test_not_regenerated_for_other_submissions(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Submission.objects.create(
+                target_url="https://example.com/other", owner=self.user
+            )
+        self.assertEqual(self._regenerations(callbacks), [])
+
+    def test_formats(self):
+        self._accept()
+        for name, content_type in [
+            ("rss", "application/rss+xml; charset=utf-8"),
+            ("atom", "application/atom+xml; charset=utf-8"),
+            ("json", "application/feed+json; charset=utf-8"),
+        ]:
+            response = self.client.get(f"/feeds/articles.{name}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response["Content-Type"], content_type)
+            self.assertIn(b"Puppies rescued", response.content)
+            self.assertIn(b"https://example.com/puppies", response.content)
+        # links to the public site, whatever host generated it
+        with self.settings(NEWS_FEED_BASE_URL="https://news.example.org"):
+            feeds.regenerate()
+        (item,) = json.loads(feeds.get_feed("json").body)["items"]
+        self.assertEqual(
+            item["id"], f"https://news.example.org/submissions/{self.submission.pk}"
+        )
+        self.assertEqual(self.client.get("/feeds/articles.xml").status_code, 404)
+        self.assertEqual(self.client.post("/feeds/articles.rss").status_code, 405)
+
+    def test_served_from_memory(self):
+        self._accept()
+        feeds.forget()
+        with self.assertNumQueries(1):
+            self.client.get("/feeds/articles.rss")
+        with self.assertNumQueries(0):
+            response = self.client.get("/feeds/articles.rss")
+        self.assertEqual(
+            response.content, bytes(FeedDocument.objects.get(name="rss").body)
+        )
+
+    def test_not_modified(self):
+        response = self.client.get("/feeds/articles.atom")
+        etag = response["ETag"]
+        self.assertIn("public", response["Cache-Control"])
+        response = self.client.get("/feeds/articles.atom", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        self._accept()
+        response = self.client.get("/feeds/articles.atom", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
@@ -0,0 +1,101 @@
+""" Test cases for near-duplicate detection """
+from test.common import rw_for
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from .fingerprint import distance, simhash
+from .models import (
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    SubmissionStatuses,
+)
+
+# pylint: disable=missing-function-docstring
+
+STORY = " ".join(
+    f"the rescue dog number {num} was found near the river bank by volunteers"
+    for num in range(30)
+)
+SYNDICATED = "<html><h1>Breaking</h1>" + STORY.replace("river", "lake", 1) + "</html>"
+OTHER = " ".join(
+    f"local council approves budget item {num} for road repairs next spring"
+    for num in range(30)
+)
+
+
+class FingerprintAPITests(APITestCase):
+    """
+    SimHash fingerprints of retrievals and the duplicates of submissions
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = rw_for([Submission, Moderation], "dupes", admin=True)
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+
+    def _submission(self, num, page):
+        submission = Submission.objects.create(
+            target_url=f"https://example.com/{num}", owner=self.user
+        )
+        Retrieval.objects.create(
+            submission=submission, status=RetrievalStatuses.FETCHED, fetched_page=page
+        )
+        submission.refresh_from_db()
+        return submission
+
+    def test_simhash(self):
+        self.assertIsNone(simhash("too short"))
+        self.assertEqual(simhash(STORY), simhash(STORY.upper()))
+        self.assertLessEqual(distance(simhash(STORY), simhash(SYNDICATED)), 3)
+        self.assertGreater(distance(simhash(STORY), simhash(OTHER)), 10)
+
+    def test_duplicates_field(self):
+        original = self._submission(1, STORY)
+        copy = self._submission(2, SYNDICATED)
+        other = self._submission(3, OTHER)
+        response = self.client.get(f"/submissions/{original.pk}")
+        self.assertEqual(response.data["duplicates"], [copy.pk])
+        response = self.client.get("/submissions?ordering=date_created")
+        self.assertEqual(
+            [item["duplicates"] for item in response.data["results"]],
+            [[copy.pk], [original.pk], []],
+        )
+        self.assertEqual(other.status, SubmissionStatuses.PENDING)
+        self.assertEqual(copy.status, SubmissionStatuses.PENDING)
+
+    def test_duplicates_of_a_page_are_read_at_once(self):
+        def queries():
+            with self.settings(NEWS_FAST_SERIALIZERS=False), CaptureQueriesContext(
+                connection
+            ) as captured:
+                response = self.client.get("/submissions")
+            self.assertEqual(response.status_code, 200)
+            # (the queries of news/fingerprint.py read only these columns)
+            columns = (
+                '"news_retrieval"."submission_id", "news_retrieval"."simhash" FROM'
+            )
+            return len([query for query in captured if columns in query["sql"]])
+
+        self._submission(1, STORY)
+        self._submission(2, OTHER)
+        few = queries()
+        self._submission(3, SYNDICATED)
+        self._submission(4, OTHER.upper())
+        self.assertEqual(queries(), few)
+        self.assertEqual(few, 2)
+
+    def test_auto_reject(self):
+        with self.settings(NEWS_DUPLICATES_AUTO_REJECT=True):
+            original = self._submission(1, STORY)
+            copy = self._submission(2, SYNDICATED)
+        self.assertEqual(original.status, SubmissionStatuses.PENDING)
+        self.assertEqual(copy.status, SubmissionStatuses.REJECTED_DUPLICATE)
+        self.assertEqual(copy.retrieval.duplicate_of, original)
+        # moderators can still accept it
+        Moderation.objects.create(submission=copy, status=ModerationStatuses.ACCEPTED)
+        copy.refresh_from_db()
+        self.assertEqual(copy.status, SubmissionStatuses.ACCEPTED)
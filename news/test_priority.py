@@ -0,0 +1,116 @@
+""" Test cases for the prioritized moderation queue """
+from datetime import timedelta
+from io import StringIO
+from test.common import rw_for
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from . import priority
+from .models import (
+    Analysis,
+    AnalysisStatuses,
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    Vote,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class PriorityTests(APITestCase):
+    """
+    /moderation/queue
+    """
+
+    def setUp(self):
+        self.user = rw_for([Submission], "queued")
+        self.other = rw_for([Submission], "queuedother")
+        self.mod = rw_for([Submission, Moderation], "queuemod")
+        group, _ = Group.objects.get_or_create(name="Moderators")
+        self.mod.groups.add(group)
+        self.client.force_authenticate(self.mod)  # pylint: disable=no-member
+
+    def _fetched(self, name, owner=None, hours_ago=0):
+        submission = Submission.objects.create(
+            target_url=f"https://example.com/{name}", owner=owner or self.user
+        )
+        if hours_ago:
+            Submission.objects.filter(id=submission.pk).update(
+                date_created=timezone.now() - timedelta(hours=hours_ago)
+            )
+        Retrieval.objects.create(
+            submission=submission, status=RetrievalStatuses.FETCHED
+        )
+        return submission
+
+    def _queue(self):
+        response = self.client.get("/moderation/queue")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [
+            item["target_url"].rsplit("/", 1)[1] for item in response.data["results"]
+        ]
+
+    def test_only_waiting_submissions(self):
+        self._fetched("fetched")
+        Submission.objects.create(target_url="https://example.com/unfetched")
+        moderated = self._fetched("moderated")
+        Moderation.objects.create(
+            submission=moderated, status=ModerationStatuses.REJECTED
+        )
+        pending = self._fetched("moderation-pending")
+        Moderation.objects.create(submission=pending)
+        self.assertEqual(sorted(self._queue()), ["fetched", "moderation-pending"])
+
+        pending.moderation.status = ModerationStatuses.ACCEPTED
+        pending.moderation.save()
+        self.assertEqual(self._queue(), ["fetched"])
+
+    def test_order(self):
+        self._fetched("new")
+        old = self._fetched("old", hours_ago=24)
+        self.assertEqual(self._queue(), ["old", "new"])
+
+        voted = self._fetched("voted")
+        for num in range(5):
+            Vote.objects.create(
+                submission=voted, owner=rw_for([Vote], f"voter{num}"), value=1
+            )
+        analysed = self._fetched("passed")
+        Analysis.objects.create(submission=analysed, status=AnalysisStatuses.PASSED)
+        self.assertEqual(self._queue(), ["voted", "old", "passed", "new"])
+
+        Vote.objects.create(submission=voted, owner=self.user, value=-100)
+        self.assertEqual(self._queue()[-1], "voted")
+        Vote.objects.filter(submission=voted, owner=self.user).delete()
+        self.assertEqual(self._queue()[0], "voted")
+
+        # the queue is the same after recomputing it from scratch
+        Submission.objects.update(priority=None)
+        out = StringIO()
+        call_command("refresh_priorities", stdout=out)
+        self.assertEqual(out.getvalue(), "4 submissions in the queue\n")
+        self.assertEqual(self._queue(), ["voted", "old", "passed", "new"])
+        self.assertIsNotNone(Submission.objects.get(pk=old.pk).priority)
+
+    def test_history_of_submitter(self):
+        mine = self._fetched("mine")
+        theirs = self._fetched("theirs", owner=self.other)
+        self.assertEqual(self._queue(), ["mine", "theirs"])
+        for num in range(2):
+            rejected = self._fetched(f"rejected{num}")
+            Moderation.objects.create(
+                submission=rejected, status=ModerationStatuses.REJECTED
+            )
+        self.assertEqual(self._queue(), ["theirs", "mine"])
+        computed = priority.compute([mine.pk, theirs.pk])
+        self.assertLess(computed[mine.pk], computed[theirs.pk])
+
+    def test_moderators_only(self):
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        response = self.client.get("/moderation/queue")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,96 @@
+""" Test cases for the query plans of the submission filters """
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from . import queryplans
+from .models import Submission
+
+# pylint: disable=missing-function-docstring
+
+
+class QueryPlanTests(TestCase):
+    """
+    news/queryplans.py, ./manage.py explain_filters
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        queryplans.seed(500)
+
+    def _results(self):
+        return {result.case.label: result for result in queryplans.audit()}
+
+    def test_every_filter_and_ordering(self):
+        labels = set(self._results())
+        self.assertIn("status__exact=pending", labels)
+        self.assertIn("moderation__status__isnull=False ordering=-date_created", labels)
+        self.assertIn("analysis__status__exact=pending ordering=date_created", labels)
+        self.assertIn("/articles", labels)
+
+    def test_no_table_scans(self):
+        flagged = {
+            label: result.plan
+            for label, result in self._results().items()
+            if result.flagged
+        }
+        self.assertEqual(flagged, {})
+
+    def test_plans_use_the_indexes(self):
+        results = self._results()
+        for label, index in [
+            ("status__exact=pending", "news_sub_status"),
+            ("status__exact=pending ordering=-date_created", "news_sub_status"),
+            ("ordering=-date_created", "news_sub_created"),
+            ("moderation__isnull=True ordering=-date_created", "news_sub_created"),
+            ("moderation__status__exact=pending", "news_mod_status"),
+            ("retrieval__status__exact=pending", "news_ret_status"),
+            ("analysis__status__exact=pending", "news_ana_status"),
+            ("/articles", "news_sub_status"),
+            ("/submissions of a user", "news_sub_owner"),
+            ("/moderation/queue", "news_submission_queue"),
+        ]:
+            self.assertIn(index, results[label].plan, label)
+        self.assertFalse(results["/articles"].sorts)
+
+    def test_full_scans(self):
+        self.assertEqual(
+            queryplans.full_scans(
+                "SCAN news_submission\nSCAN t USING INDEX i", "sqlite"
+            ),
+            ["news_submission"],
+        )
+        self.assertEqual(
+            queryplans.full_scans(
+                "Limit\n  ->  Seq Scan on news_submission  (cost=0.00..1.00)",
+                "postgresql",
+            ),
+            ["news_submission"],
+        )
+        self.assertEqual(
+            queryplans.full_scans(
+                "• scan\n  table: news_submission@primary\n  spans: FULL SCAN",
+                "cockroachdb",
+            ),
+            ["news_submission"],
+        )
+
+    def test_command(self):
+        out = StringIO()
+        count = Submission.objects.count()
+        call_command("explain_filters", "--seed", "10", "--fail-on-scan", stdout=out)
+        self.assertIn("0 of ", out.getvalue())
+        # the seeded submissions are rolled back
+        self.assertEqual(Submission.objects.count(), count)
+
+    def test_command_fails_on_scan(self):
+        scanning = queryplans.endpoint_cases() + [
+            # (not a declared filter, title has no index)
+            queryplans.Case("title", Submission.objects.filter(title="x"))
+        ]
+        with mock.patch.object(queryplans, "endpoint_cases", return_value=scanning):
+            out = StringIO()
+            with self.assertRaises(CommandError):
+                call_command("explain_filters", "--fail-on-scan", stdout=out)
+        self.assertIn("SCAN         title", out.getvalue())
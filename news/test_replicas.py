@@ -0,0 +1,289 @@
+""" Test cases for reading from replicas of the database """
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from dognews import replicas
+from . import search
+from .rest.views import ArticleViewSet
+from .models import (
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    SubmissionStatuses,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+def article(name):
+    """An accepted submission"""
+    submission = Submission.objects.create(target_url=f"https://example.com/{name}")
+    Retrieval.objects.create(
+        submission=submission, status=RetrievalStatuses.FETCHED, title=name
+    )
+    Moderation.objects.create(submission=submission, status=ModerationStatuses.ACCEPTED)
+    return submission
+
+
+def replicated_article(name):
+    """An accepted submission only in the replica. Without signals: what they
+    write goes to the primary"""
+    (submission,) = Submission.objects.using("replica").bulk_create(
+        [
+            Submission(
+                target_url=f"https://example.com/{name}",
+                status=SubmissionStatuses.ACCEPTED,
+            )
+        ]
+    )
+    Retrieval.objects.using("replica").bulk_create(
+        [Retrieval(submission=submission, status=RetrievalStatuses.FETCHED, title=name)]
+    )
+    Moderation.objects.using("replica").bulk_create(
+        [Moderation(submission=submission, status=ModerationStatuses.ACCEPTED)]
+    )
+    search.update([submission.pk], using="replica")
+    return submission
+
+
+@override_settings(DATABASE_READ_REPLICAS=["replica"])
+class ReplicaReadTests(APITestCase):
+    """
+    dognews/replicas.py: the "replica" database isn't a copy of "default" here,
+    so the results tell where they were read from
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.primary = article("primary")
+        self.replica = replicated_article("replica")
+        self.admin = get_user_model().objects.create_superuser(
+            "replicaadmin", "nothing@example.com", "x"
+        )
+
+    def _urls(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["target_url"] for item in response.data["results"]]
+
+    def test_articles(self):
+        self.client.force_authenticate(self.admin)  # pylint: disable=no-member
+        self.assertEqual(self._urls("/articles"), [self.replica.target_url])
+        self.assertEqual(
+            self._urls("/articles/search?q=replica"), [self.replica.target_url]
+        )
+        response = self.client.get(f"/articles/{self.replica.pk}")
+        self.assertEqual(response.data["target_url"], self.replica.target_url)
+        with override_settings(DATABASE_READ_REPLICAS=[]):
+            cache.clear()
+            self.assertEqual(self._urls("/articles"), [self.primary.target_url])
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.client.force_authenticate(self.admin)  # pylint: disable=no-member
+        self.assertEqual(self._urls("/submissions"), [self.replica.target_url])
+        response = self.client.post(
+            "/submissions", {"target_url": "https://example.com/new"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(self._urls("/submissions")),
+            ["https://example.com/new", self.primary.target_url],
+        )
+        # another user still reads from the replica
+        other = get_user_model().objects.create_superuser(
+            "replicaother", "nothing@example.com", "x"
+        )
+        self.client.force_authenticate(other)  # pylint: disable=no-member
+        self.assertEqual(self._urls("/submissions"), [self.replica.target_url])
+
+    def test_sticky_window(self):
+        self.client.force_authenticate(self.admin)  # pylint: disable=no-member
+        with self.settings(DATABASE_STICKY_SECONDS=0):
+            response = self.client.post(
+                "/submissions", {"target_url": "https://example.com/new"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._urls("/submissions"), [self.replica.target_url])
+
+    def test_admin_changelist(self):
+        self.client.force_login(self.admin)
+        response = self.client.get("/adminpanel/news/submission/")
+        self.assertContains(response, self.replica.target_url)
+        self.assertNotContains(response, self.primary.target_url)
+
+    def test_needs_a_shared_cache(self):
+        self.client.force_authenticate(self.admin)  # pylint: disable=no-member
+        with self.settings(DATABASE_STICKY_CACHE_ALIAS=None):
+            self.assertEqual(self._urls("/submissions"), [self.primary.target_url])
+            self.assertEqual(replicas.check_sticky_cache(None), [])
+        self.assertEqual(replicas.check_sticky_cache(None)[0].id, "dognews.W001")
+
+    def test_writes_go_to_the_primary(self):
+        submission = Submission.objects.using("replica").get()
+        self.assertEqual(
+            router.db_for_write(Submission, instance=submission), "default"
+        )
+        self.assertEqual(router.db_for_write(Submission), "default")
+        self.assertTrue(router.allow_relation(submission, self.admin))
+
+
+class NoReplicaTests(TestCase):
+    """
+    Without replicas everything is read from "default"
+    """
+
+    def test_default(self):
+        submission = article("noreplica")
+        self.assertEqual(router.db_for_read(Submission, instance=submission), "default")
+        self.assertEqual(
+            router.db_for_write(Submission, instance=submission), "default"
+        )
+
+
+@override_settings(DATABASE_FOLLOWER_READS=True)
+class FollowerReadTests(TransactionTestCase):
+    """
+    dognews/replicas.py: follower_reads, with a CockroachDB connection faked
+    (sqlite doesn't know AS OF SYSTEM TIME)
+    """
+
+    def _cockroach(self):
+        connection = connections["default"]
+        cursor = mock.MagicMock()
+        return (
+            mock.patch.object(connection, "vendor", "cockroachdb"),
+            mock.patch.object(connection, "cursor", return_value=cursor),
+            cursor.__enter__.return_value,
+        )
+
+    def test_cockroach(self):
+        vendor, cursor, fake = self._cockroach()
+        with vendor, cursor, replicas.follower_reads() as following:
+            self.assertTrue(following)
+            self.assertTrue(connections["default"].in_atomic_block)
+        fake.execute.assert_called_once_with(
+            "SET TRANSACTION AS OF SYSTEM TIME follower_read_timestamp()"
+        )
+        self.assertFalse(connections["default"].in_atomic_block)
+
+    def test_no_op(self):
+        vendor, cursor, fake = self._cockroach()
+        # other databases
+        with cursor, replicas.follower_reads() as following:
+            self.assertFalse(following)
+            self.assertFalse(connections["default"].in_atomic_block)
+        # not enabled
+        with self.settings(DATABASE_FOLLOWER_READS=False):
+            with vendor, cursor, replicas.follower_reads() as following:
+                self.assertFalse(following)
+        # inside another transaction
+        with (
+            vendor
+        ), cursor, transaction.atomic(), replicas.follower_reads() as following:
+            self.assertFalse(following)
+        fake.execute.assert_not_called()
+
+
+@override_settings(DATABASE_FOLLOWER_READS=True)
+class FollowerReadTransactionTests(TransactionTestCase):
+    """
+    The follower read transaction of a view ends with the request. sqlite runs
+    it without the AS OF SYSTEM TIME statement
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                "followertx", "nothing@example.com", "x"
+            )
+        )
+        self.statements = []
+
+    def _follower_read(self, execute, sql, params, many, context):
+        if "AS OF SYSTEM TIME" in sql:
+            self.statements.append(sql)
+            return None
+        return execute(sql, params, many, context)
+
+    def _get(self, url):
+        connection = connections["default"]
+        with mock.patch.object(
+            replicas, "follower_reads_enabled", return_value=True
+        ), connection.execute_wrapper(self._follower_read):
+            response = self.client.get(url)
+        self.assertFalse(connection.in_atomic_block)
+        return response
+
+    def test_ends(self):
+        submission = article("followertx")
+        response = self._get(f"/articles/{submission.pk}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(
+            self._get("/articles/0").status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_ends_when_the_view_raises(self):
+        with mock.patch.object(
+            ArticleViewSet, "get_object", side_effect=RuntimeError("boom")
+        ):
+            try:
+                self._get("/articles/1")
+            except RuntimeError:
+                # (checked while handling it: once the traceback is gone, so is
+                # the view, and garbage collection would end the transaction)
+                self.assertFalse(connections["default"].in_atomic_block)
+            else:
+                self.fail("RuntimeError not raised")
+        self.assertEqual(len(self.statements), 1)
+
+
+@override_settings(DATABASE_FOLLOWER_READS=True)
+class FollowerReadViewTests(APITestCase):
+    """
+    Which requests ask for follower reads
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.article = article("follower")
+        self.admin = get_user_model().objects.create_superuser(
+            "followeradmin", "nothing@example.com", "x"
+        )
+        self.client.force_authenticate(self.admin)  # pylint: disable=no-member
+
+    def _follower_reads(self, method, url, **kwargs):
+        with mock.patch.object(
+            replicas, "follower_reads", wraps=replicas.follower_reads
+        ) as follower_reads:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return [call.args for call in follower_reads.call_args_list]
+
+    def test_articles(self):
+        self.assertEqual(self._follower_reads("get", "/articles"), [("default",)])
+        self.assertEqual(
+            self._follower_reads("get", f"/articles/{self.article.pk}"),
+            [("default",)],
+        )
+        self.assertEqual(self._follower_reads("get", "/articles/changes"), [])
+        self.assertEqual(self._follower_reads("get", "/submissions"), [])
+
+    def test_not_after_a_write(self):
+        self.assertEqual(
+            self._follower_reads(
+                "post", "/submissions", data={"target_url": "https://example.com/new"}
+            ),
+            [],
+        )
+        self.assertEqual(self._follower_reads("get", "/articles"), [])
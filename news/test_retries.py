@@ -0,0 +1,175 @@
+""" Test cases for retrying transactions aborted by conflicts """
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, transaction
+from django.test import TransactionTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from dognews import transactions
+from . import bulk
+from .models import (
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+    Vote,
+)
+from .rest.views import SubmissionVoteViewSet
+
+# pylint: disable=missing-function-docstring
+
+
+class SerializationFailure(Exception):
+    """What the driver raises when CockroachDB aborts a transaction"""
+
+    pgcode = "40001"
+
+
+def retryable_error():
+    """A simulated conflict, as Django wraps it"""
+    error = OperationalError(
+        "restart transaction: TransactionRetryWithProtoRefreshError"
+    )
+    error.__cause__ = SerializationFailure()
+    return error
+
+
+def flaky(func, failures):
+    """Runs func and then raises a retryable error, the first `failures` times"""
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        result = func(*args, **kwargs)
+        if len(calls) <= failures:
+            raise retryable_error()
+        return result
+
+    wrapper.calls = calls
+    return wrapper
+
+
+@override_settings(DATABASE_RETRY_BACKOFF=0, DATABASE_RETRY_ATTEMPTS=3)
+class RunAtomicTests(TransactionTestCase):
+    """
+    dognews/transactions.py: run_atomic
+    """
+
+    def _create(self, name="retried"):
+        return Submission.objects.create(target_url=f"https://example.com/{name}")
+
+    def test_retried(self):
+        func = flaky(self._create, 2)
+        submission = transactions.run_atomic(func)
+        self.assertEqual(len(func.calls), 3)
+        # the aborted attempts were rolled back
+        self.assertEqual(list(Submission.objects.all()), [submission])
+
+    def test_attempts_run_out(self):
+        func = flaky(self._create, 3)
+        with self.assertRaises(OperationalError):
+            transactions.run_atomic(func)
+        self.assertEqual(len(func.calls), 3)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_other_errors(self):
+        def fails():
+            self._create()
+            raise OperationalError("no such table")
+
+        with self.assertRaises(OperationalError):
+            transactions.run_atomic(fails)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_inner_transactions_are_not_retried(self):
+        func = flaky(self._create, 1)
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                transactions.run_atomic(func)
+        self.assertEqual(len(func.calls), 1)
+
+    def test_bulk_moderation(self):
+        user = get_user_model().objects.create_superuser(
+            "retrymod", "nothing@example.com", "x"
+        )
+        submission = self._create()
+        Retrieval.objects.create(
+            submission=submission, status=RetrievalStatuses.FETCHED
+        )
+        recalculate = flaky(bulk._recalculate, 1)  # pylint: disable=protected-access
+        with mock.patch.object(bulk, "_recalculate", recalculate):
+            (result,) = bulk.moderate(
+                [{"submission": submission.pk, "status": ModerationStatuses.ACCEPTED}],
+                user,
+            )
+        self.assertEqual(len(recalculate.calls), 2)
+        self.assertEqual(result, {"submission": submission.pk, "status": "accepted"})
+
+    def test_backoff(self):
+        with self.settings(
+            DATABASE_RETRY_BACKOFF=0.1, DATABASE_RETRY_MAX_BACKOFF=0.5
+        ), mock.patch.object(
+            transactions.random, "uniform", side_effect=lambda low, high: high
+        ), mock.patch.object(
+            transactions.time, "sleep"
+        ) as sleep:
+            for attempt in range(4):
+                transactions.backoff(attempt)
+        self.assertEqual(
+            [call.args[0] for call in sleep.call_args_list],
+            [0.1, 0.2, 0.4, 0.5],
+        )
+
+
+@override_settings(DATABASE_RETRY_BACKOFF=0, DATABASE_RETRY_ATTEMPTS=3)
+class RetryMiddlewareTests(TransactionTestCase):
+    """
+    dognews/transactions.py: RetryMiddleware, with the vote upsert
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            "retryvoter", "nothing@example.com", "x"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.submission = Submission.objects.create(
+            target_url="https://example.com/voted"
+        )
+
+    def _vote(self, failures):
+        perform_create = flaky(SubmissionVoteViewSet.perform_create, failures)
+        with mock.patch.object(SubmissionVoteViewSet, "perform_create", perform_create):
+            response = self.client.post(
+                f"/submissions/{self.submission.pk}/votes", {"value": 1}, format="json"
+            )
+        return response, len(perform_create.calls)
+
+    def test_retried(self):
+        response, calls = self._vote(1)
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.content
+        )
+        self.assertEqual(calls, 2)
+        self.assertEqual(Vote.objects.filter(owner=self.user).count(), 1)
+
+    def test_attempts_run_out(self):
+        response, calls = self._vote(3)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(calls, 3)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_failed_requests_are_rolled_back(self):
+        self.client.raise_request_exception = False
+
+        def fails(view, serializer):
+            serializer.save(submission_id=self.submission.pk, owner=self.user)
+            raise ValueError("after saving")
+
+        with mock.patch.object(SubmissionVoteViewSet, "perform_create", fails):
+            response = self.client.post(
+                f"/submissions/{self.submission.pk}/votes", {"value": 1}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(Vote.objects.exists())
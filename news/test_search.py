@@ -0,0 +1,93 @@
+""" Test cases for the full text search """
+from io import StringIO
+from test.common import rw_for
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APITestCase
+from . import search
+from .models import (
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class SearchAPITests(APITestCase):
+    """
+    /articles/search and /submissions/search
+    """
+
+    def setUp(self):
+        self.user = rw_for([Submission], "searcher")
+        self.mod = rw_for([Submission, Moderation], "searchmod")
+        group, _ = Group.objects.get_or_create(name="Moderators")
+        self.mod.groups.add(group)
+
+        self.accepted = self._submission(
+            "https://example.com/puppies", "Puppies rescued", "<p>golden retriever</p>"
+        )
+        Moderation.objects.create(
+            submission=self.accepted, status=ModerationStatuses.ACCEPTED
+        )
+        self.pending = self._submission(
+            "https://example.com/retrievers", "Retrievers", "<b>retrievers swim</b>"
+        )
+        self.other = self._submission("https://example.com/cats", "Cats", "nope")
+
+    def _submission(self, url, title, page):
+        submission = Submission.objects.create(target_url=url, owner=self.user)
+        Retrieval.objects.create(
+            submission=submission,
+            status=RetrievalStatuses.FETCHED,
+            title=title,
+            fetched_page=page,
+        )
+        return submission
+
+    def _ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [item["url"].rsplit("/", 1)[1] for item in response.data["results"]]
+
+    def test_articles_only_accepted(self):
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        self.assertEqual(
+            self._ids("/articles/search?q=retriev"), [str(self.accepted.pk)]
+        )
+        self.assertEqual(self._ids("/articles/search?q=cats"), [])
+        self.assertEqual(self._ids("/articles/search?q="), [])
+
+    def test_submissions_for_moderators(self):
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        response = self.client.get("/submissions/search?q=retriev")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.mod)  # pylint: disable=no-member
+        # title matches rank above page text
+        self.assertEqual(
+            self._ids("/submissions/search?q=retriev"),
+            [str(self.pending.pk), str(self.accepted.pk)],
+        )
+        self.assertEqual(
+            self._ids("/submissions/search?q=retriev+swim"), [str(self.pending.pk)]
+        )
+
+    def test_index_follows_changes(self):
+        self.assertEqual(search.search("kittens"), [])
+        retrieval = self.other.retrieval
+        retrieval.title = "Kittens"
+        retrieval.save()
+        self.assertEqual(search.search("kittens"), [self.other.pk])
+        self.other.delete()
+        self.assertEqual(search.search("kittens"), [])
+
+    def test_rebuild(self):
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 3", out.getvalue())
+        self.assertEqual(search.search("puppies"), [self.accepted.pk])
@@ -0,0 +1,133 @@
+""" Test cases for the static export of articles """
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from test.common import rw_for
+from django.core.management import call_command
+from django.test import TestCase
+from .models import (
+    Moderation,
+    ModerationStatuses,
+    Retrieval,
+    RetrievalStatuses,
+    Submission,
+)
+
+# pylint: disable=missing-function-docstring
+
+
+class StaticExportTests(TestCase):
+    """
+    ./manage.py export_static
+    """
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+        self.user = rw_for([Submission], "exporter")
+        self.submissions = [self._accepted(num) for num in range(5)]
+
+    def _accepted(self, num):
+        submission = Submission.objects.create(
+            target_url=f"https://example.com/{num}",
+            title=f"dogs {num}",
+            owner=self.user,
+        )
+        Moderation.objects.create(
+            submission=submission, status=ModerationStatuses.ACCEPTED
+        )
+        return submission
+
+    def _export(self, *args):
+        out = StringIO()
+        with self.settings(NEWS_EXPORT_PAGE_SIZE=2):
+            call_command("export_static", "--output", self.output, *args, stdout=out)
+        return out.getvalue()
+
+    def _read(self, name):
+        with open(os.path.join(self.output, name), encoding="utf-8") as source:
+            return source.read()
+
+    def _mtimes(self):
+        return {
+            os.path.relpath(os.path.join(path, name), self.output): os.stat(
+                os.path.join(path, name)
+            ).st_mtime_ns
+            for path, _, names in os.walk(self.output)
+            for name in names
+        }
+
+    def test_layout(self):
+        self.assertEqual(self._export(), "Wrote 18 files, deleted 0\n")
+        index = json.loads(self._read("index.json"))
+        self.assertEqual(index, {"count": 5, "pages": 3, "latest": "page/3.json"})
+
+        page = json.loads(self._read("page/3.json"))
+        self.assertEqual([item["title"] for item in page["results"]], ["dogs 4"])
+        self.assertEqual(page["next"], "../page/2.json")
+        self.assertIsNone(page["previous"])
+        page = json.loads(self._read("page/1.json"))
+        self.assertEqual(
+            [item["title"] for item in page["results"]], ["dogs 1", "dogs 0"]
+        )
+
+        pk = self.submissions[0].pk
+        article = json.loads(self._read(f"articles/{pk}.json"))
+        self.assertEqual(article["target_url"], "https://example.com/0")
+        html = self._read(f"articles/{pk}.html")
+        self.assertIn("dogs 0", html)
+        self.assertIn('href="../index.html"', html)
+        self.assertIn(f'href="../articles/{pk}.html"', self._read("page/1.html"))
+        self.assertIn('href="page/2.html"', self._read("index.html"))
+
+    def test_same_as_the_api(self):
+        # (ArticleSerializer needs a retrieval)
+        for submission in self.submissions:
+            Retrieval.objects.create(
+                submission=submission,
+                status=RetrievalStatuses.FETCHED,
+                description=f"about {submission.title}",
+            )
+        with self.settings(NEWS_FEED_BASE_URL="http://testserver"):
+            self._export()
+        self.client.force_login(self.user)
+        for submission in self.submissions:
+            response = self.client.get(f"/articles/{submission.pk}")
+            self.assertEqual(
+                json.loads(self._read(f"articles/{submission.pk}.json")),
+                json.loads(response.content),
+            )
+
+    def test_incremental(self):
+        self._export()
+        self.assertEqual(self._export(), "Wrote 0 files, deleted 0\n")
+        before = self._mtimes()
+
+        # an edit rewrites the article and its page
+        moderation = self.submissions[1].moderation
+        moderation.title = "dogs edited"
+        moderation.save()
+        self._accepted(5)
+        self.assertEqual(self._export(), "Wrote 10 files, deleted 0\n")
+        after = self._mtimes()
+        unchanged = [name for name in before if before[name] == after[name]]
+        self.assertIn("page/2.json", unchanged)
+        self.assertIn(f"articles/{self.submissions[0].pk}.json", unchanged)
+        self.assertIn("edited", self._read("page/1.json"))
+        self.assertIn("dogs 5", self._read("page/3.json"))
+
+        # unpublishing removes the article and moves the later ones
+        moderation = self.submissions[4].moderation
+        moderation.status = ModerationStatuses.REJECTED
+        moderation.save()
+        self.assertEqual(self._export(), "Wrote 4 files, deleted 2\n")
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.output, f"articles/{self.submissions[4].pk}.json")
+            )
+        )
+        self.assertEqual(json.loads(self._read("index.json"))["count"], 5)
+
+        self.assertEqual(self._export("--full"), "Wrote 18 files, deleted 0\n")
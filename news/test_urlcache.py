@@ -0,0 +1,122 @@
+""" Test cases for the storage url cache """
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.test import TestCase, override_settings
+from test.common import rw_for
+from rest_framework.test import APITestCase
+from .models import Moderation, ModerationStatuses, Retrieval, Submission
+from . import urlcache
+
+# pylint: disable=missing-function-docstring, missing-class-docstring
+
+
+class SignedStorage(FileSystemStorage):
+    """Pretends to be an S3 storage with querystring auth, counting signatures"""
+
+    querystring_auth = True
+    querystring_expire = 3600
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signatures = 0
+
+    def url(self, name):
+        self.signatures += 1
+        return f"https://bucket.example.com/{name}?signature={self.signatures}"
+
+
+def _file(storage, name):
+    return FieldFile(instance=None, field=mock.Mock(storage=storage), name=name)
+
+
+class UrlCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        urlcache.clear_templates()
+
+    def test_empty_file_has_no_url(self):
+        storage = FileSystemStorage()
+        self.assertEqual(urlcache.storage_url(None), "")
+        self.assertEqual(urlcache.storage_url(_file(storage, "")), "")
+
+    def test_absolute_names_are_returned_as_is(self):
+        storage = SignedStorage()
+        url = "https://onlydognews.com/gfx/a.png"
+        self.assertEqual(urlcache.storage_url(_file(storage, url)), url)
+        self.assertEqual(storage.signatures, 0)
+
+    def test_public_urls_are_built_from_a_template(self):
+        storage = FileSystemStorage()
+        names = [f"uploaded_images/2022/{i}.png" for i in range(10)]
+        expected = [storage.url(name) for name in names]
+        with mock.patch.object(storage, "url", wraps=storage.url) as url:
+            self.assertEqual(
+                [urlcache.storage_url(_file(storage, name)) for name in names],
+                expected,
+            )
+            self.assertEqual(url.call_count, 1)
+
+    @override_settings(STORAGE_PUBLIC_URL_TEMPLATE="https://cdn.example.com/{name}")
+    def test_public_url_template_setting(self):
+        storage = FileSystemStorage()
+        with mock.patch.object(storage, "url") as url:
+            self.assertEqual(
+                urlcache.storage_url(_file(storage, "a b.png")),
+                "https://cdn.example.com/a%20b.png",
+            )
+            url.assert_not_called()
+
+    def test_signed_urls_are_reused(self):
+        storage = SignedStorage()
+        first = urlcache.storage_url(_file(storage, "a.png"))
+        for _ in range(3):
+            self.assertEqual(urlcache.storage_url(_file(storage, "a.png")), first)
+        self.assertEqual(storage.signatures, 1)
+        urlcache.storage_url(_file(storage, "b.png"))
+        self.assertEqual(storage.signatures, 2)
+
+    def test_signed_urls_are_not_kept_past_expiry(self):
+        storage = SignedStorage()
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            urlcache.storage_url(_file(storage, "a.png"))
+            self.assertEqual(cache_set.call_args.args[2], 3600 - 5 * 60)
+
+        # too short to be worth caching
+        storage.querystring_expire = 60
+        urlcache.storage_url(_file(storage, "c.png"))
+        urlcache.storage_url(_file(storage, "c.png"))
+        self.assertEqual(storage.signatures, 3)
+
+
+class UrlCacheAPITests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        urlcache.clear_templates()
+        self.user = rw_for([Submission])
+
+    def test_article_list_signs_each_thumbnail_once(self):
+        storage = SignedStorage()
+        for num in range(5):
+            submission = Submission.objects.create(
+                target_url=f"https://example.com/{num}", owner=self.user
+            )
+            Retrieval.objects.create(
+                submission=submission, thumbnail_processed=f"thumb{num}.png"
+            )
+            Moderation.objects.create(
+                submission=submission, status=ModerationStatuses.ACCEPTED
+            )
+
+        self.client.force_authenticate(self.user)  # pylint: disable=no-member
+        field = Retrieval._meta.get_field("thumbnail_processed")
+        with mock.patch.object(field, "storage", storage):
+            for _ in range(2):
+                response = self.client.get("/articles")
+                self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(storage.signatures, 5)
+        self.assertEqual(
+            response.data["results"][0]["thumbnail"],
+            "https://bucket.example.com/thumb4.png?signature=1",
+        )
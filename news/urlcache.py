@@ -0,0 +1,110 @@
+"""
+Cached url generation for files kept in storage backends.
+
+Every ImageField that is rendered ends up calling `storage.url()`. For the
+local filesystem that's cheap, but with S3 and querystring auth every call is
+a signing operation with all the boto3 overhead attached, and we do it
+several times per row (serializers, admin previews).
+
+Two strategies are used here:
+
+* public storages (no querystring auth): the url of a file only depends on its
+  name, so we ask the storage once for a template and build the rest by string
+  substitution. No signing, no boto3.
+* signed storages: the signed url is kept in the django cache until shortly
+  before it expires (`querystring_expire - STORAGE_URL_EXPIRY_MARGIN`)
+
+Settings (all optional):
+
+* STORAGE_URL_CACHE_ALIAS: django cache used for signed urls ("default")
+* STORAGE_URL_EXPIRY_MARGIN: seconds before expiry a signed url is discarded (300)
+* STORAGE_PUBLIC_URL_TEMPLATE: eg "https://cdn.example.com/prod/{name}" to build
+  public urls without asking the storage at all
+"""
+
+from hashlib import sha1
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import Storage
+from django.db.models.fields.files import FieldFile
+from django.utils.encoding import filepath_to_uri
+
+# the storage is asked for the url of this name and the result is used as template
+_PLACEHOLDER = "__dognews_url_placeholder__"
+
+_templates: Dict[str, str] = {}
+
+
+def _storage_key(storage: Storage) -> str:
+    """Identifies a storage configuration, so that different buckets/locations don't
+    share templates or cached urls"""
+    klass = type(getattr(storage, "_wrapped", storage))
+    return ":".join(
+        [
+            f"{klass.__module__}.{klass.__qualname__}",
+            str(getattr(storage, "bucket_name", "")),
+            str(getattr(storage, "location", "")),
+            str(getattr(storage, "base_url", "")),
+        ]
+    )
+
+
+def is_signed(storage: Storage) -> bool:
+    """True if the urls of this storage carry a signature (and expire)"""
+    return bool(getattr(storage, "querystring_auth", False))
+
+
+def _public_url(storage: Storage, name: str) -> str:
+    template = getattr(settings, "STORAGE_PUBLIC_URL_TEMPLATE", None)
+    if template:
+        return template.format(name=filepath_to_uri(name))
+
+    key = _storage_key(storage)
+    storage_template = _templates.get(key)
+    if storage_template is None:
+        storage_template = _templates[key] = storage.url(_PLACEHOLDER)
+    return storage_template.replace(_PLACEHOLDER, filepath_to_uri(name))
+
+
+def _signed_url(storage: Storage, name: str) -> str:
+    margin = getattr(settings, "STORAGE_URL_EXPIRY_MARGIN", 5 * 60)
+    timeout = int(getattr(storage, "querystring_expire", 0)) - margin
+    if timeout <= 0:
+        # would expire before we could reuse it
+        return storage.url(name)
+
+    cache = caches[getattr(settings, "STORAGE_URL_CACHE_ALIAS", "default")]
+    key = "storage-url:" + sha1(f"{_storage_key(storage)}:{name}".encode()).hexdigest()
+    url = cache.get(key)
+    if url is None:
+        url = storage.url(name)
+        cache.set(key, url, timeout)
+    return url
+
+
+def url_for_name(storage: Storage, name: Optional[str]) -> str:
+    """Returns the url of the file with the given name in the storage, reusing
+    previous results whenever possible. Returns an empty string if there is no name"""
+    if not name:
+        return ""
+    if name.startswith("http"):
+        # absolute links (eg imported from jekyll) are not in our storage
+        return name
+    if is_signed(storage):
+        return _signed_url(storage, name)
+    return _public_url(storage, name)
+
+
+def storage_url(file: Optional[FieldFile]) -> str:
+    """Returns the url of a file stored in a FileField/ImageField, reusing previous
+    results whenever possible. Returns an empty string if there is no file"""
+    if not file:
+        return ""
+    return url_for_name(file.storage, file.name)
+
+
+def clear_templates():
+    """Forget the public url templates (eg after changing storage settings)"""
+    _templates.clear()